@@ -1,19 +1,30 @@
-import boto3
 import logging
-from cfn_resource_provider import ResourceProvider
+from typing import Callable, List
+
+from aws_clients import get_client
+from base_provider import BaseProvider
+from worker_pool import run_concurrently
 
 
 request_schema = {
     "type": "object",
-    "required": ["RuleSetName", "Region"],
+    "required": ["RuleSetName"],
+    "oneOf": [{"required": ["Region"]}, {"required": ["Regions"]}],
     "properties": {
         "RuleSetName": {"type": "string", "description": "to activate"},
         "Region": {"type": "string", "description": "of the rule set"},
+        "Regions": {
+            "type": "array",
+            "items": {"type": "string"},
+            "minItems": 1,
+            "uniqueItems": True,
+            "description": "to activate the rule set in",
+        },
     },
 }
 
 
-class ActiveReceiptRuleSetProvider(ResourceProvider):
+class ActiveReceiptRuleSetProvider(BaseProvider):
     def __init__(self):
         super().__init__()
         self.request_schema = request_schema
@@ -42,36 +53,112 @@ class ActiveReceiptRuleSetProvider(ResourceProvider):
         return self.get_old("Region", self.region)
 
     @property
-    def ses(self):
-        if not self._ses:
-            self._ses = boto3.client("ses", self.region)
-        return self._ses
-
-    def get_active_rule_set_name(self):
-        response = self.ses.describe_active_receipt_rule_set()
-        self.active_rule_set_name = response.get("Metadata", {}).get("Name")
-
-    def activate(self, is_create):
-        if is_create:
-            self.get_active_rule_set_name()
-            if self.active_rule_set_name:
-                self.fail(
-                    f"active receipt rule set is already set in region {self.region} - {self.active_rule_set_name}"
-                )
-                return
+    def regions(self) -> List[str]:
+        return self.get("Regions", [self.region])
+
+    @property
+    def old_regions(self) -> List[str]:
+        if "Regions" in self.old_properties:
+            return self.get_old("Regions")
+        if "Region" in self.old_properties:
+            return [self.get_old("Region")]
+        return self.regions
 
-        self.ses.set_active_receipt_rule_set(RuleSetName=self.rule_set_name)
-        self.physical_resource_id = f"active-receipt-rule-set@{self.region}"
+    @property
+    def is_multi_region(self) -> bool:
+        return "Regions" in self.properties
+
+    def ses(self, region: str):
+        if self._ses and self._ses.meta.region_name == region:
+            return self._ses
+        return get_client("ses", region_name=region)
+
+    def get_active_rule_set_name(self, region: str):
+        response = self.ses(region).describe_active_receipt_rule_set()
+        return response.get("Metadata", {}).get("Name")
+
+    def activate_in(self, region: str, is_create: bool):
+        """
+        activates the rule set in `region`, unless it is already active. On create, any
+        active rule set is an error.
+        """
+        active_rule_set_name = self.get_active_rule_set_name(region)
+        if is_create and active_rule_set_name:
+            raise ValueError(
+                f"active receipt rule set is already set in region {region} - {active_rule_set_name}"
+            )
+        if active_rule_set_name == self.rule_set_name:
+            logging.info(
+                f"receipt rule set {self.rule_set_name} is already active in region {region}"
+            )
+            return
+        self.ses(region).set_active_receipt_rule_set(RuleSetName=self.rule_set_name)
+
+    def deactivate_in(self, region: str, rule_set_name: str):
+        """
+        deactivates `rule_set_name` in `region`, if it is the active rule set.
+        """
+        active_rule_set_name = self.get_active_rule_set_name(region)
+        if not active_rule_set_name:
+            logging.info(f"no receipt rule set is active in region {region}")
+            return
+        if active_rule_set_name != rule_set_name:
+            logging.warning(
+                f"not deactivating receipt rule set {rule_set_name} in region {region}, the active rule set is {active_rule_set_name}"
+            )
+            return
+        self.ses(region).set_active_receipt_rule_set()
+
+    def for_each_region(self, function: Callable[[str], None], regions: List[str]):
+        """
+        calls `function` for all `regions` concurrently, and fails on the first error.
+        """
+        if self.status == "FAILED":
+            return
+        results = run_concurrently(function, regions, len(regions))
+        failed = [r for r in results if r.error]
+        if len(failed) == 1 and len(regions) == 1:
+            self.fail(str(failed[0].error))
+        elif failed:
+            self.fail(
+                f"failed in {len(failed)} of {len(regions)} regions, {failed[0].item}: {failed[0].error}"
+            )
 
     def create(self):
-        self.activate(True)
+        self.for_each_region(
+            lambda region: self.activate_in(region, True), self.regions
+        )
+        if self.status != "FAILED":
+            if self.is_multi_region:
+                self.physical_resource_id = (
+                    f"active-receipt-rule-set@{self.logical_resource_id}"
+                )
+            else:
+                self.physical_resource_id = f"active-receipt-rule-set@{self.region}"
 
     def update(self):
-        self.activate(self.region != self.old_region)
+        old_regions = self.old_regions
+        removed = [region for region in old_regions if region not in self.regions]
+        self.for_each_region(
+            lambda region: self.activate_in(region, region not in old_regions),
+            self.regions,
+        )
+        self.for_each_region(
+            lambda region: self.deactivate_in(region, self.old_rule_set_name), removed
+        )
+        if (
+            self.status != "FAILED"
+            and not self.is_multi_region
+            and "Regions" not in self.old_properties
+        ):
+            self.physical_resource_id = f"active-receipt-rule-set@{self.region}"
 
     def delete(self):
         if self.physical_resource_id.startswith("active-receipt-rule-set@"):
-            self.ses.set_active_receipt_rule_set()
+            self.for_each_region(
+                lambda region: self.deactivate_in(region, self.rule_set_name),
+                self.regions,
+            )
         else:
             logging.warning(
                 f"silently ignoring delete request of active receipt rule set with physical resource id {self.physical_resource_id}"
@@ -82,4 +169,4 @@ provider = ActiveReceiptRuleSetProvider()
 
 
 def handler(request, context):
-    return provider.handle(request, context)
+    return provider.copy().handle(request, context)
@@ -0,0 +1,196 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, NamedTuple, Optional
+
+import boto3
+
+import metrics
+import request_cache
+import tracing
+
+# the credentials of an assumed role are renewed this many seconds before they
+# expire, the maximum duration of a Lambda invocation, so that a request never holds
+# a client with expired credentials
+CREDENTIALS_REFRESH_MARGIN = 900
+
+_lock = threading.Lock()
+_credentials_lock = threading.Lock()
+_clients = {}
+_role_clients = {}
+_credentials = {}
+_instrumenters: List[Callable] = []
+
+_active_role: contextvars.ContextVar = contextvars.ContextVar("role_arn", default=None)
+
+
+class Credentials(NamedTuple):
+    access_key_id: str
+    secret_access_key: str
+    session_token: str
+    expiration: float
+
+    @classmethod
+    def from_response(cls, response: dict) -> "Credentials":
+        credentials = response["Credentials"]
+        expiration = credentials["Expiration"]
+        return cls(
+            access_key_id=credentials["AccessKeyId"],
+            secret_access_key=credentials["SecretAccessKey"],
+            session_token=credentials["SessionToken"],
+            expiration=(
+                expiration.timestamp()
+                if hasattr(expiration, "timestamp")
+                else float(expiration)
+            ),
+        )
+
+
+def active_role() -> Optional[str]:
+    return _active_role.get()
+
+
+@contextmanager
+def role_scope(role_arn: Optional[str]):
+    """
+    makes the clients returned by `get_client` use the credentials of `role_arn` for
+    the duration of the block. Without a role, the credentials of the process are used.
+    """
+    token = _active_role.set(role_arn)
+    try:
+        yield role_arn
+    finally:
+        _active_role.reset(token)
+
+
+def instrument(client, role_arn: str = None):
+    """
+    registers the provider event handlers on the `client`. The responses of clients
+    of different roles are cached apart, as the roles may be in different accounts.
+    """
+    request_cache.register(client.meta.events, namespace=role_arn if role_arn else "")
+    metrics.register(client.meta.events)
+    tracing.register(client.meta.events)
+    for instrumenter in _instrumenters:
+        instrumenter(client.meta.events)
+    return client
+
+
+def add_instrumenter(instrumenter: Callable):
+    """
+    registers the event handlers of `instrumenter` on all clients, those created so far
+    and those created later. The benchmarks and tests use this to answer calls with
+    fakes; the provider itself adds none.
+    """
+    with _lock:
+        if instrumenter in _instrumenters:
+            return
+        _instrumenters.append(instrumenter)
+        for client in _clients.values():
+            instrumenter(client.meta.events)
+        for client, _ in _role_clients.values():
+            instrumenter(client.meta.events)
+
+
+def get_credentials(role_arn: str, region_name: str = None) -> Credentials:
+    """
+    returns the credentials of `role_arn`, assumed with the STS endpoint in
+    `region_name`. The credentials are cached until shortly before they expire.
+    """
+    key = (role_arn, region_name)
+    credentials = _credentials.get(key)
+    if (
+        credentials
+        and credentials.expiration - time.time() > CREDENTIALS_REFRESH_MARGIN
+    ):
+        return credentials
+    sts = _get_shared_client("sts", region_name)
+    with _credentials_lock:
+        credentials = _credentials.get(key)
+        if (
+            credentials is None
+            or credentials.expiration - time.time() <= CREDENTIALS_REFRESH_MARGIN
+        ):
+            credentials = Credentials.from_response(
+                sts.assume_role(
+                    RoleArn=role_arn,
+                    RoleSessionName=os.getenv("ROLE_SESSION_NAME", "cfn-ses-provider"),
+                )
+            )
+            _credentials[key] = credentials
+    return credentials
+
+
+def get_client(service_name: str, region_name: str = None, role_arn: str = None):
+    """
+    returns the boto3 client for `service_name` in `region_name`, instrumented with the
+    provider event handlers. Clients are thread-safe, and created once per container.
+    With a `role_arn`, or in a `role_scope`, the client uses the credentials of the role,
+    and is recreated when these are renewed.
+    """
+    role_arn = role_arn if role_arn else active_role()
+    if not role_arn:
+        return _get_shared_client(service_name, region_name)
+
+    credentials = get_credentials(role_arn, region_name)
+    key = (service_name, region_name, role_arn)
+    entry = _role_clients.get(key)
+    if entry is None or entry[1] is not credentials:
+        with _lock:
+            entry = _role_clients.get(key)
+            if entry is None or entry[1] is not credentials:
+                client = boto3.client(
+                    service_name,
+                    region_name=region_name,
+                    aws_access_key_id=credentials.access_key_id,
+                    aws_secret_access_key=credentials.secret_access_key,
+                    aws_session_token=credentials.session_token,
+                )
+                entry = (instrument(client, role_arn), credentials)
+                _role_clients[key] = entry
+    return entry[0]
+
+
+def _get_shared_client(service_name: str, region_name: str = None):
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = instrument(boto3.client(service_name, region_name=region_name))
+                _clients[key] = client
+    return client
+
+
+def close_connections():
+    """
+    closes the connections of the shared clients, which are reopened on the next call.
+    """
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        for client, _ in _role_clients.values():
+            client.close()
+
+
+def clear():
+    """
+    forgets the shared clients and the credentials of the assumed roles.
+    """
+    with _lock:
+        _clients.clear()
+        _role_clients.clear()
+    with _credentials_lock:
+        _credentials.clear()
+
+
+try:
+    from snapshot_restore_py import register_after_restore
+
+    # connections opened before the snapshot are not valid in the restored container
+    register_after_restore(close_connections)
+except ImportError:
+    pass
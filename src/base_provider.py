@@ -0,0 +1,193 @@
+import copy
+import logging
+import re
+from typing import List, Optional
+
+import jsonschema
+from cfn_resource_provider import ResourceProvider, default_injecting_validator
+
+import aws_clients
+import request_cache
+import response_upload
+import tracing
+from worker_pool import chunked
+
+log = logging.getLogger()
+
+# the maximum number of identities accepted by the SES GetIdentity*Attributes calls
+MAX_IDENTITIES_PER_CALL = 100
+
+# the role to assume to manage the resource, in any account
+ROLE_ARN_PATTERN = re.compile(r"^arn:[^:]+:iam::[0-9]{12}:role/.+$")
+
+_validators = {}
+
+
+def get_validator(schema: dict, validator_class):
+    """
+    returns the validator for `schema`, which is compiled once per schema.
+    """
+    entry = _validators.get(id(schema))
+    if entry is None or entry[0] is not schema:
+        entry = (schema, validator_class(schema))
+        _validators[id(schema)] = entry
+    return entry[1]
+
+
+def seed_identity_attributes(
+    client, method_name: str, result_key: str, identity_lists: List[List[str]]
+):
+    """
+    reads the attributes of all identities in `identity_lists` with as few calls of
+    `method_name` as possible, and seeds the active request cache with the response to
+    the read of each list.
+    """
+    cache = request_cache.active()
+    identities = sorted({i for identity_list in identity_lists for i in identity_list})
+    if cache is None or not identities:
+        return
+
+    attributes = {}
+    for chunk in chunked(identities, MAX_IDENTITIES_PER_CALL):
+        attributes.update(getattr(client, method_name)(Identities=chunk)[result_key])
+
+    for identity_list in identity_lists:
+        cache.seed(
+            client.meta.service_model.service_name,
+            client.meta.region_name,
+            client.meta.method_to_api_mapping[method_name],
+            {"Identities": identity_list},
+            {result_key: {i: attributes[i] for i in identity_list if i in attributes}},
+            namespace=aws_clients.active_role() or "",
+        )
+
+
+class BaseProvider(ResourceProvider):
+    """
+    resource provider which records the phases of handling a request as tracing spans:
+    `validate`, `execute` and `send_response`. The AWS API calls made in a phase are
+    recorded as nested spans. Requests and responses are validated with validators
+    compiled once per schema, and responses are sent over a pooled connection. All
+    resource types accept an optional `RoleArn`, which is assumed to make the AWS API
+    calls of the request.
+    """
+
+    def copy(self) -> "BaseProvider":
+        """
+        returns a copy of this provider to handle a single request. The copy shares the
+        clients and configuration of this provider, but not the state of the request.
+        """
+        return copy.copy(self)
+
+    @property
+    def cfn_request_validator(self):
+        return get_validator(
+            self.cfn_request_schema,
+            jsonschema.validators.validator_for(self.cfn_request_schema),
+        )
+
+    @property
+    def cfn_response_validator(self):
+        return get_validator(
+            self.cfn_response_schema,
+            jsonschema.validators.validator_for(self.cfn_response_schema),
+        )
+
+    @property
+    def request_validator(self):
+        return get_validator(self.request_schema, default_injecting_validator.validator)
+
+    def prime(self):
+        """
+        compiles the request validators ahead of the first request.
+        """
+        return (
+            self.cfn_request_validator,
+            self.cfn_response_validator,
+            self.request_validator,
+        )
+
+    def prefetch(self, requests: List[dict]):
+        """
+        reads the state needed to handle `requests` in as few calls as possible, into
+        the active request cache. The requests share the resource type and region.
+        """
+        pass
+
+    def is_valid_cfn_request(self):
+        with tracing.span("validate", schema="request"):
+            error = jsonschema.exceptions.best_match(
+                self.cfn_request_validator.iter_errors(self.request)
+            )
+            if error is None:
+                return True
+            self.fail(
+                "invalid CloudFormation Request received: %s" % str(error.context)
+            )
+            return False
+
+    def is_valid_cfn_response(self):
+        error = jsonschema.exceptions.best_match(
+            self.cfn_response_validator.iter_errors(self.response)
+        )
+        if error is None:
+            return True
+        log.warning("invalid CloudFormation response created: %s", str(error))
+        return False
+
+    @property
+    def role_arn(self):
+        properties = self.request.get("ResourceProperties")
+        return properties.get("RoleArn") if isinstance(properties, dict) else None
+
+    @property
+    def remaining_time(self) -> Optional[float]:
+        """
+        the seconds left in the Lambda invocation, or None outside of Lambda.
+        """
+        remaining = getattr(self.context, "get_remaining_time_in_millis", None)
+        return remaining() / 1000.0 if remaining else None
+
+    def is_valid_request(self):
+        with tracing.span("validate", schema="properties"):
+            try:
+                self.convert_property_types()
+                self.request_validator.validate(self.properties)
+                if self.role_arn is not None and not ROLE_ARN_PATTERN.match(
+                    str(self.role_arn)
+                ):
+                    self.fail(
+                        f"invalid resource properties: RoleArn {self.role_arn} is not an IAM role ARN"
+                    )
+                    return False
+                return True
+            except jsonschema.ValidationError as e:
+                message = (
+                    e.message.replace(str(e.instance), "<instance>")
+                    if isinstance(e.instance, dict)
+                    else e.message
+                )
+                self.fail("invalid resource properties: %s" % message)
+                return False
+
+    def execute(self):
+        with tracing.span(
+            "execute", RequestType=self.request.get("RequestType")
+        ) as span, aws_clients.role_scope(self.role_arn):
+            super().execute()
+            if span is not None:
+                span.annotations["Status"] = self.status
+                span.error = self.status == "FAILED"
+
+    def send_response(self):
+        """
+        sends the response to `ResponseURL` over a pooled keep-alive connection.
+        """
+        with tracing.span("send_response") as span:
+            self._truncate_reason()
+            log.debug("sending response to %s", self.request["ResponseURL"])
+            retries = response_upload.put_response(
+                self.request["ResponseURL"], self.response
+            )
+            if span is not None:
+                span.annotations["Retries"] = retries
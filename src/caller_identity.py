@@ -0,0 +1,54 @@
+import threading
+from typing import NamedTuple, Optional
+
+from aws_clients import active_role, get_client
+
+
+class CallerIdentity(NamedTuple):
+    account: str
+    partition: str
+    arn: str
+
+    @classmethod
+    def from_response(cls, response: dict) -> "CallerIdentity":
+        arn = response["Arn"]
+        return cls(account=response["Account"], partition=arn.split(":")[1], arn=arn)
+
+    @classmethod
+    def from_role_arn(cls, role_arn: str) -> "CallerIdentity":
+        parts = role_arn.split(":")
+        return cls(account=parts[4], partition=parts[1], arn=role_arn)
+
+
+_lock = threading.Lock()
+_caller_identity: Optional[CallerIdentity] = None
+
+
+def get_caller_identity(sts=None) -> CallerIdentity:
+    """
+    returns the identity of the credentials of this process. sts:GetCallerIdentity is
+    called only once per container, subsequent calls return the cached identity. In a
+    role scope, the identity is that of the role, which names its account.
+    """
+    global _caller_identity
+    role_arn = active_role()
+    if role_arn:
+        return CallerIdentity.from_role_arn(role_arn)
+    if _caller_identity is None:
+        with _lock:
+            if _caller_identity is None:
+                if not sts:
+                    sts = get_client("sts")
+                _caller_identity = CallerIdentity.from_response(
+                    sts.get_caller_identity()
+                )
+    return _caller_identity
+
+
+def clear():
+    """
+    forgets the cached caller identity.
+    """
+    global _caller_identity
+    with _lock:
+        _caller_identity = None
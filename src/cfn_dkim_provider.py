@@ -1,7 +1,9 @@
 import re
-import boto3
 from botocore.exceptions import ClientError
-from cfn_resource_provider import ResourceProvider
+
+from aws_clients import get_client
+from base_provider import BaseProvider
+import tracing
 
 
 request_schema = {
@@ -22,11 +24,14 @@ request_schema = {
 }
 
 
-class DKIMProvider(ResourceProvider):
+class DKIMProvider(BaseProvider):
     def __init__(self):
         super().__init__()
         self.request_schema = request_schema
-        self.route53 = boto3.client("route53")
+
+    @property
+    def route53(self):
+        return get_client("route53")
 
     def create(self):
         if not self.check_identity(self.dkim_domain):
@@ -76,9 +81,10 @@ class DKIMProvider(ResourceProvider):
         self.delete_identity(domain)
         self.delete_dns_records(hosted_zone_id, domain)
 
+    @tracing.traced("precondition")
     def check_identity(self, domain):
         dkim_domain = domain.rstrip(".")
-        ses = boto3.client("ses", region_name=self.get("Region"))
+        ses = get_client("ses", region_name=self.get("Region"))
         for response in ses.get_paginator("list_identities").paginate(
             IdentityType="Domain"
         ):
@@ -88,7 +94,7 @@ class DKIMProvider(ResourceProvider):
         return False
 
     def delete_identity(self, domain):
-        ses = boto3.client("ses", region_name=self.get("Region"))
+        ses = get_client("ses", region_name=self.get("Region"))
         ses.delete_identity(Identity=domain)
 
     def delete_dns_records(self, hosted_zone_id, domain):
@@ -159,7 +165,7 @@ class DKIMProvider(ResourceProvider):
         batch = {"Changes": []}
         try:
             domain = self.dkim_domain
-            ses = boto3.client("ses", region_name=self.get("Region"))
+            ses = get_client("ses", region_name=self.get("Region"))
             verification_token = ses.verify_domain_identity(Domain=domain)[
                 "VerificationToken"
             ]
@@ -203,4 +209,4 @@ provider = DKIMProvider()
 
 
 def handler(request, context):
-    return provider.handle(request, context)
+    return provider.copy().handle(request, context)
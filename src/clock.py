@@ -0,0 +1,78 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable
+
+
+class SystemClock(object):
+    def now(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class VirtualClock(object):
+    """
+    a clock which only advances when it sleeps, or when it is advanced.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._now = start
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        with self._lock:
+            self._now += max(0.0, seconds)
+
+    def set(self, now: float):
+        with self._lock:
+            self._now = max(self._now, now)
+
+
+class SleepingScheduler(object):
+    """
+    calls a function after a delay by sleeping on `clock` in the calling thread. This
+    is how a Lambda function waits before it reinvokes itself.
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock if clock else SystemClock()
+
+    def call_later(self, delay: float, function: Callable, *args):
+        self.clock.sleep(delay)
+        function(*args)
+
+
+class EventScheduler(object):
+    """
+    calls functions at their due time on a virtual clock, in order. `run` returns when
+    no calls are pending.
+    """
+
+    def __init__(self, clock: VirtualClock = None):
+        self.clock = clock if clock else VirtualClock()
+        self._events = []
+        self._sequence = itertools.count()
+
+    def call_later(self, delay: float, function: Callable, *args):
+        self.call_at(self.clock.now() + delay, function, *args)
+
+    def call_at(self, when: float, function: Callable, *args):
+        heapq.heappush(self._events, (when, next(self._sequence), function, args))
+
+    def run(self):
+        while self._events:
+            when, _, function, args = heapq.heappop(self._events)
+            self.clock.set(when)
+            function(*args)
+
+
+default_scheduler = SleepingScheduler()
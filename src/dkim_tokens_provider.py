@@ -1,6 +1,6 @@
-import boto3
 from copy import deepcopy
 from typing import List
+from aws_clients import get_client
 from ses_provider import SESProvider
 
 
@@ -28,7 +28,7 @@ class DkimTokensProvider(SESProvider):
             return
 
         try:
-            ses = boto3.client("ses", region_name=self.region)
+            ses = get_client("ses", region_name=self.region)
             response = ses.verify_domain_dkim(Domain=self.domain)
             self.physical_resource_id = f"{self.domain}@{self.region}"
 
@@ -57,4 +57,4 @@ provider = DkimTokensProvider()
 
 
 def handler(request, context):
-    return provider.handle(request, context)
+    return provider.copy().handle(request, context)
@@ -0,0 +1,214 @@
+import ipaddress
+import logging
+import os
+import random
+import socket
+import struct
+from typing import List, Optional
+
+log = logging.getLogger()
+
+TYPES = {"CNAME": 5, "SOA": 6, "MX": 15, "TXT": 16}
+
+# the longest wait for the negative answers of a resolver to expire
+MAX_WAIT_IN_SECONDS = 300
+
+
+class DNSError(Exception):
+    pass
+
+
+class Answer(object):
+    """
+    the values of a DNS lookup, and the seconds the answer is cached. Without values,
+    the ttl is that of the negative answer.
+    """
+
+    def __init__(self, values: List[str], ttl: int):
+        self.values = values
+        self.ttl = ttl
+
+
+class Record(object):
+    """
+    a DNS record SES looks up to verify an identity. A TXT record resolves if one of
+    its values is `value`, a CNAME or MX record if it points to `value`.
+    """
+
+    def __init__(self, name: str, type: str, value: str):
+        self.name = name
+        self.type = type
+        self.value = value
+
+    def matches(self, values: List[str]) -> bool:
+        if self.type == "TXT":
+            return self.value in values
+        expected = self.value.rstrip(".").lower()
+        return any(v.rstrip(".").lower() == expected for v in values)
+
+    def __str__(self):
+        return f"{self.name} {self.type} {self.value}"
+
+
+def build_query(query_id: int, name: str, type: int) -> bytes:
+    question = b"".join(
+        bytes([len(label)]) + label
+        for label in name.rstrip(".").encode("idna").split(b".")
+    )
+    return (
+        struct.pack(">HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+        + question
+        + b"\x00"
+        + struct.pack(">HH", type, 1)
+    )
+
+
+def read_name(message: bytes, offset: int):
+    """
+    returns the domain name at `offset` in `message`, and the offset after it.
+    """
+    labels = []
+    end = None
+    for _ in range(128):
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | message[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            return ".".join(labels), end if end is not None else offset
+        labels.append(message[offset : offset + length].decode("ascii", "replace"))
+        offset += length
+    raise DNSError("too many labels in domain name")
+
+
+def read_value(message: bytes, type: int, offset: int, length: int) -> str:
+    if type == TYPES["TXT"]:
+        strings = []
+        end = offset + length
+        while offset < end:
+            strings.append(message[offset + 1 : offset + 1 + message[offset]])
+            offset += 1 + message[offset]
+        return b"".join(strings).decode("utf-8", "replace")
+    if type == TYPES["MX"]:
+        return read_name(message, offset + 2)[0]
+    return read_name(message, offset)[0]
+
+
+def parse_response(message: bytes, query_id: int, type: int) -> Answer:
+    """
+    returns the values of `type` in the DNS response `message`.
+    """
+    try:
+        response_id, flags, questions, answers, authorities, _ = struct.unpack(
+            ">HHHHHH", message[:12]
+        )
+        if response_id != query_id:
+            raise DNSError("unexpected response id")
+        if flags & 0x0200:
+            raise DNSError("truncated response")
+        if flags & 0x000F not in (0, 3):
+            raise DNSError(f"response code {flags & 0x000F}")
+
+        offset = 12
+        for _ in range(questions):
+            offset = read_name(message, offset)[1] + 4
+
+        values, ttls, negative_ttl = [], [], 0
+        for i in range(answers + authorities):
+            offset = read_name(message, offset)[1]
+            rr_type, _, ttl, length = struct.unpack(
+                ">HHIH", message[offset : offset + 10]
+            )
+            offset += 10
+            if i < answers and rr_type == type:
+                values.append(read_value(message, type, offset, length))
+                ttls.append(ttl)
+            elif i >= answers and rr_type == TYPES["SOA"]:
+                rdata = read_name(message, read_name(message, offset)[1])[1]
+                minimum = struct.unpack(">I", message[rdata + 16 : rdata + 20])[0]
+                negative_ttl = min(ttl, minimum)
+            offset += length
+    except (IndexError, struct.error) as e:
+        raise DNSError(f"malformed response, {e}")
+    return Answer(values, min(ttls) if values else negative_ttl)
+
+
+class Resolver(object):
+    """
+    resolves DNS records by querying the `nameservers` over UDP.
+    """
+
+    def __init__(self, nameservers: List[str], timeout: float = 2.0, port: int = 53):
+        self.nameservers = nameservers
+        self.timeout = timeout
+        self.port = port
+
+    def resolve(self, name: str, type: str) -> Answer:
+        query_id = random.randrange(1 << 16)
+        query = build_query(query_id, name, TYPES[type])
+        error = None
+        for nameserver in self.nameservers:
+            family = socket.AF_INET6 if ":" in nameserver else socket.AF_INET
+            try:
+                with socket.socket(family, socket.SOCK_DGRAM) as s:
+                    s.settimeout(self.timeout)
+                    s.sendto(query, (nameserver, self.port))
+                    return parse_response(s.recv(4096), query_id, TYPES[type])
+            except (OSError, DNSError) as e:
+                error = e
+        raise DNSError(f"failed to resolve {name} {type}, {error}")
+
+
+def system_nameservers(path: str = "/etc/resolv.conf") -> List[str]:
+    with open(path) as f:
+        return [
+            line.split()[1]
+            for line in f
+            if line.startswith("nameserver") and len(line.split()) > 1
+        ]
+
+
+def create_resolver(setting: str = None) -> Optional[Resolver]:
+    """
+    creates the resolver for the DNS pre-check configured by `setting` or the
+    environment variable DNS_PRECHECK: `none` (default), `system` to use the
+    nameservers of /etc/resolv.conf, or a comma separated list of nameservers.
+    """
+    if setting is None:
+        setting = os.getenv("DNS_PRECHECK", "none")
+    if setting == "none":
+        return None
+    nameservers = system_nameservers() if setting == "system" else setting.split(",")
+    try:
+        for nameserver in nameservers:
+            ipaddress.ip_address(nameserver)
+    except ValueError:
+        raise ValueError(f"unsupported DNS_PRECHECK {setting}")
+    if not nameservers:
+        raise ValueError(f"no nameservers for DNS_PRECHECK {setting}")
+    return Resolver(nameservers)
+
+
+default_resolver = create_resolver()
+
+
+def unresolved_ttl(resolver, records: List[Record]) -> Optional[float]:
+    """
+    returns None if all `records` resolve, otherwise the seconds until the answers of
+    the unresolved records expire from the caches. As SES has the final say, a
+    failure to resolve counts as resolved.
+    """
+    ttl = None
+    for record in records:
+        try:
+            answer = resolver.resolve(record.name, record.type)
+        except DNSError as e:
+            log.warning("DNS pre-check of %s failed, %s", record, e)
+            return None
+        if not record.matches(answer.values):
+            log.info("%s does not resolve yet", record)
+            ttl = max(ttl or 0, answer.ttl)
+    return ttl
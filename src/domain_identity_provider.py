@@ -1,16 +1,48 @@
-import boto3
+import logging
 from copy import deepcopy
 from botocore.exceptions import ClientError
+import aws_clients
+from aws_clients import get_client
 from ses_provider import SESProvider
+from worker_pool import run_concurrently
 
 
 class DomainIdentityProvider(SESProvider):
     def __init__(self):
         super().__init__()
+        self.request_schema = deepcopy(self.request_schema)
+        self.request_schema["required"] = ["Domain"]
+        self.request_schema["oneOf"] = [
+            {"required": ["Region"]},
+            {"required": ["Regions"]},
+        ]
+        self.request_schema["properties"]["Regions"] = {
+            "type": "array",
+            "items": {"type": "string"},
+            "minItems": 1,
+            "uniqueItems": True,
+            "description": "to verify the domain in",
+        }
+
+    @property
+    def is_multi_region(self):
+        return "Regions" in self.properties
+
+    @property
+    def regions(self):
+        return self.get("Regions", [])
+
+    @property
+    def old_regions(self):
+        if "Regions" in self.old_properties:
+            return self.get_old("Regions")
+        if "Region" in self.old_properties:
+            return [self.get_old("Region")]
+        return self.regions
 
     def get_token(self):
         try:
-            ses = boto3.client("ses", region_name=self.region)
+            ses = get_client("ses", region_name=self.region)
             response = ses.verify_domain_identity(Domain=self.domain)
             self.physical_resource_id = f"{self.domain}@{self.region}"
 
@@ -35,8 +67,134 @@ class DomainIdentityProvider(SESProvider):
             if not self.physical_resource_id:
                 self.physical_resource_id = "could-not-create"
 
+    def ses_clients(self, regions):
+        return {region: get_client("ses", region_name=region) for region in regions}
+
+    def existing_regions(self, regions):
+        """
+        returns the regions in which the domain identity already exists, checking all
+        `regions` concurrently.
+        """
+        clients = self.ses_clients(regions)
+        results = run_concurrently(
+            lambda region: self.identity_already_exists(clients[region]),
+            regions,
+            len(regions),
+        )
+        for result in results:
+            if result.error:
+                raise result.error
+        return [result.item for result in results if result.value]
+
+    def get_tokens(self, physical_resource_id):
+        clients = self.ses_clients(self.regions)
+        results = run_concurrently(
+            lambda region: clients[region].verify_domain_identity(Domain=self.domain)[
+                "VerificationToken"
+            ],
+            self.regions,
+            len(self.regions),
+        )
+        self.physical_resource_id = physical_resource_id
+
+        failed = [result for result in results if result.error]
+        if failed:
+            self.fail(
+                f"could not request domain identity verification for {self.domain} in region {failed[0].item}, {failed[0].error}"
+            )
+            return
+
+        tokens = [result.value for result in results]
+        recordset = deepcopy(self.get("RecordSetDefaults"))
+        recordset.update(
+            {
+                "Type": "TXT",
+                "Name": f"_amazonses.{self.domain}.",
+                "ResourceRecords": [f'"{token}"' for token in sorted(set(tokens))],
+            }
+        )
+        self.set_attribute("VerificationTokens", tokens)
+        self.set_attribute("Domain", self.domain)
+        self.set_attribute("Regions", self.regions)
+        self.set_attribute("RecordSets", [recordset])
+
+    def delete_identities(self, regions):
+        clients = self.ses_clients(regions)
+        results = run_concurrently(
+            lambda region: clients[region].delete_identity(Identity=self.domain),
+            regions,
+            len(regions),
+        )
+        for result in results:
+            if result.error:
+                self.success(
+                    f"ignoring failed delete of identity in region {result.item}, {result.error}"
+                )
+
+    def is_rolling_back(self) -> bool:
+        """
+        returns true if the stack of the request is rolling back, or if its status
+        cannot be read. An update which rolls back a failed update of the regions names
+        the regions which the failed update refused, as the identity already existed
+        there, as removed.
+        """
+        stack_id = self.request.get("StackId", "")
+        try:
+            with aws_clients.role_scope(None):
+                cloudformation = get_client(
+                    "cloudformation", region_name=stack_id.split(":")[3]
+                )
+                stack = cloudformation.describe_stacks(StackName=stack_id)["Stacks"][0]
+            return stack["StackStatus"].endswith("ROLLBACK_IN_PROGRESS")
+        except Exception as e:
+            logging.warning("failed to read the status of stack %s, %s", stack_id, e)
+            return True
+
+    def delete_removed(self, removed):
+        """
+        deletes the identities in the `removed` regions, unless the update rolls back,
+        in which case this resource may not own them.
+        """
+        if not removed or self.status != "SUCCESS":
+            return
+        if self.is_rolling_back():
+            self.success(
+                f"kept domain identity {self.domain} in region {', '.join(removed)}, as it may not be owned by this resource during a rollback"
+            )
+            return
+        self.delete_identities(removed)
+
+    def create_multi_region(self):
+        existing = self.existing_regions(self.regions)
+        if existing:
+            self.fail(
+                f"SES domain identity {self.domain} already exists in region {', '.join(existing)}"
+            )
+            self.physical_resource_id = "could-not-create"
+            return
+        self.get_tokens(self.domain)
+
+    def update_multi_region(self):
+        if self.domain != self.old_domain:
+            self.create_multi_region()
+            return
+
+        added = [r for r in self.regions if r not in self.old_regions]
+        removed = [r for r in self.old_regions if r not in self.regions]
+        existing = self.existing_regions(added) if added else []
+        if existing:
+            self.fail(
+                f"cannot add domain identity {self.domain} as it already exists in region {', '.join(existing)}"
+            )
+            return
+
+        self.get_tokens(self.physical_resource_id)
+        self.delete_removed(removed)
+
     def create(self):
-        if not self.identity_already_exists():
+        if self.is_multi_region:
+            self.create_multi_region()
+        elif not self.identity_already_exists():
             self.get_token()
         else:
             self.fail(
@@ -44,7 +202,33 @@ class DomainIdentityProvider(SESProvider):
             )
             self.physical_resource_id = "could-not-create"
 
+    def update_from_multi_region(self):
+        """
+        verifies the domain in a single region, which was verified in `old_regions`. The
+        physical id is kept, so that CloudFormation does not delete the identity in all
+        old regions, and only the identities in the other old regions are deleted.
+        """
+        physical_resource_id = self.physical_resource_id
+        removed = [r for r in self.old_regions if r != self.region]
+        if self.region not in self.old_regions and self.identity_already_exists():
+            self.fail(
+                f"cannot add domain identity {self.domain} as it already exists in region {self.region}"
+            )
+            return
+
+        self.get_token()
+        self.physical_resource_id = physical_resource_id
+        self.delete_removed(removed)
+
     def update(self):
+        if self.is_multi_region:
+            self.update_multi_region()
+            return
+
+        if "Regions" in self.old_properties and self.domain == self.old_domain:
+            self.update_from_multi_region()
+            return
+
         if (
             self.region != self.old_region or self.domain != self.old_domain
         ) and self.identity_already_exists():
@@ -55,16 +239,22 @@ class DomainIdentityProvider(SESProvider):
         self.get_token()
 
     def delete(self):
-        if self.physical_resource_id != "could-not-create":
-            ses = boto3.client("ses", region_name=self.region)
-            try:
-                ses.delete_identity(Identity=self.domain)
-            except ClientError as e:
-                self.success(f"ignoring failed delete of identity, {e}")
+        if self.physical_resource_id == "could-not-create":
+            return
+
+        if self.is_multi_region:
+            self.delete_identities(self.regions)
+            return
+
+        ses = get_client("ses", region_name=self.region)
+        try:
+            ses.delete_identity(Identity=self.domain)
+        except ClientError as e:
+            self.success(f"ignoring failed delete of identity, {e}")
 
 
 provider = DomainIdentityProvider()
 
 
 def handler(request, context):
-    return provider.handle(request, context)
+    return provider.copy().handle(request, context)
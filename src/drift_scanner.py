@@ -0,0 +1,359 @@
+"""
+takes a snapshot of the SES identities of the account, with their verification, DKIM,
+mail from, notification attributes and policies, and reports where it differs from
+the state the custom resources of a manifest expect. The attributes are read with the
+batched attribute calls, 100 identities per call, and the regions are read concurrently.
+
+usage: python src/drift_scanner.py manifest.yaml [--region eu-west-1]
+                                   [--resources DomainIdentity,DkimTokens]
+                                   [--report drift-report.json] [--no-policies]
+                                   [--max-workers 8] [--rate 10] [--json]
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+from typing import Any, Callable, List, NamedTuple, Optional
+
+import identity_notifications_provider
+import onboard
+from aws_clients import get_client
+from base_provider import MAX_IDENTITIES_PER_CALL
+from identity_policy_provider import PolicyDocument
+from worker_pool import RateLimiter, chunked, run_concurrently
+
+# the batched read of each section of the snapshot, as (method name, result key)
+ATTRIBUTE_CALLS = {
+    "Verification": (
+        "get_identity_verification_attributes",
+        "VerificationAttributes",
+    ),
+    "Dkim": ("get_identity_dkim_attributes", "DkimAttributes"),
+    "MailFrom": (
+        "get_identity_mail_from_domain_attributes",
+        "MailFromDomainAttributes",
+    ),
+    "Notifications": (
+        "get_identity_notification_attributes",
+        "NotificationAttributes",
+    ),
+}
+
+# the maximum number of policy names accepted by GetIdentityPolicies
+MAX_POLICIES_PER_CALL = 20
+
+
+def snapshot_region(
+    region: str,
+    include_policies: bool = True,
+    max_workers: int = 8,
+    requests_per_second: float = 10,
+) -> dict:
+    """
+    returns the attributes of all identities in `region`, by identity and section. As
+    the policies can only be listed per identity, these are read concurrently by
+    `max_workers` threads.
+    """
+    ses = get_client("ses", region_name=region)
+    rate_limiter = RateLimiter(requests_per_second)
+
+    identities = []
+    for response in ses.get_paginator("list_identities").paginate():
+        rate_limiter.acquire()
+        identities.extend(response["Identities"])
+
+    result = {identity: {} for identity in identities}
+    for section, (method_name, result_key) in ATTRIBUTE_CALLS.items():
+        for chunk in chunked(identities, MAX_IDENTITIES_PER_CALL):
+            rate_limiter.acquire()
+            attributes = getattr(ses, method_name)(Identities=chunk)[result_key]
+            for identity in chunk:
+                result[identity][section] = attributes.get(identity, {})
+
+    if include_policies:
+
+        def get_policies(identity: str) -> dict:
+            rate_limiter.acquire()
+            names = ses.list_identity_policies(Identity=identity)["PolicyNames"]
+            policies = {}
+            for chunk in chunked(names, MAX_POLICIES_PER_CALL):
+                rate_limiter.acquire()
+                response = ses.get_identity_policies(
+                    Identity=identity, PolicyNames=chunk
+                )
+                policies.update(response["Policies"])
+            return policies
+
+        for policies in run_concurrently(get_policies, identities, max_workers):
+            if policies.error:
+                raise policies.error
+            result[policies.item]["Policies"] = policies.value
+
+    logging.info("read %d identities in region %s", len(identities), region)
+    return result
+
+
+def take_snapshot(regions: List[str], include_policies: bool = True, **kwargs) -> dict:
+    """
+    returns the snapshot of all `regions`, by region, reading the regions concurrently.
+    """
+    result = {}
+    for snapshot in run_concurrently(
+        lambda region: snapshot_region(region, include_policies, **kwargs),
+        regions,
+        len(regions),
+    ):
+        if snapshot.error:
+            raise snapshot.error
+        result[snapshot.item] = snapshot.value
+    return result
+
+
+class Check(NamedTuple):
+    """
+    an attribute of an identity which a custom resource expects to have a value.
+    """
+
+    resource: str
+    region: str
+    identity: str
+    section: str
+    attribute: str
+    expected: Any
+    normalize: Optional[Callable[[Any], Any]] = None
+
+
+def notification_default(name: str):
+    return identity_notifications_provider.request_schema["properties"][name].get(
+        "default"
+    )
+
+
+def normalized_policy(document):
+    if isinstance(document, str):
+        document = PolicyDocument.from_json(document)
+    elif isinstance(document, dict):
+        document = PolicyDocument.from_dict(document)
+    return document.to_dict() if document else None
+
+
+def resource_checks(resource: str, properties: dict) -> List[Check]:
+    """
+    returns the checks of the state expected by the custom `resource` with `properties`,
+    for each of its regions and identities.
+    """
+    identity = properties.get("Identity", properties.get("Domain", ""))
+    identities = [i.rstrip(".") for i in properties.get("Identities", [identity])]
+    regions = properties.get("Regions", [properties.get("Region")])
+    checks = []
+    for region, identity in itertools.product(regions, identities):
+
+        def check(section, attribute, expected, normalize=None):
+            checks.append(
+                Check(
+                    resource,
+                    region,
+                    identity,
+                    section,
+                    attribute,
+                    expected,
+                    normalize,
+                )
+            )
+
+        if resource in ["DomainIdentity", "VerifiedIdentity"]:
+            check("Verification", "VerificationStatus", "Success")
+        elif resource in ["DkimTokens", "DKIM"]:
+            check("Dkim", "DkimEnabled", True)
+            check("Dkim", "DkimVerificationStatus", "Success")
+        elif resource == "MailFromDomain":
+            subdomain = properties.get("MailFromSubdomain", "")
+            check(
+                "MailFrom",
+                "MailFromDomain",
+                f"{subdomain}.{identity}" if subdomain else None,
+            )
+            if subdomain:
+                check(
+                    "MailFrom",
+                    "BehaviorOnMXFailure",
+                    properties.get("BehaviorOnMXFailure", "UseDefaultValue"),
+                )
+        elif resource == "VerifiedMailFromDomain":
+            check("MailFrom", "MailFromDomainStatus", "Success")
+        elif resource == "IdentityNotifications":
+            check(
+                "Notifications",
+                "ForwardingEnabled",
+                properties.get(
+                    "ForwardingEnabled", notification_default("ForwardingEnabled")
+                ),
+            )
+            for notification_type in identity_notifications_provider.NOTIFICATION_TYPES:
+                topic = properties.get(f"{notification_type}Topic")
+                check("Notifications", f"{notification_type}Topic", topic)
+                if topic:
+                    name = f"HeadersIn{notification_type}NotificationsEnabled"
+                    check(
+                        "Notifications",
+                        name,
+                        properties.get(name, notification_default(name)),
+                    )
+        elif resource == "IdentityPolicy":
+            check(
+                "Policies",
+                properties.get("PolicyName"),
+                normalized_policy(properties.get("PolicyDocument", {})),
+                normalized_policy,
+            )
+        else:
+            raise ValueError(f"unsupported resource {resource}")
+    return checks
+
+
+def compare(snapshot: dict, checks: List[Check]) -> List[dict]:
+    """
+    returns the drift of the `snapshot` from the state expected by the `checks`.
+    """
+    result = []
+    for check in checks:
+        drift = {
+            "Resource": check.resource,
+            "Region": check.region,
+            "Identity": check.identity,
+        }
+        identities = snapshot.get(check.region, {})
+        if check.identity not in identities:
+            drift.update({"Attribute": "Identity", "Expected": check.identity})
+            if drift not in result:
+                result.append(drift)
+            continue
+        if check.section not in identities[check.identity]:
+            continue
+
+        actual = identities[check.identity][check.section].get(check.attribute)
+        if check.normalize and actual is not None:
+            actual = check.normalize(actual)
+        if actual != check.expected:
+            drift.update(
+                {
+                    "Attribute": f"{check.section}.{check.attribute}",
+                    "Expected": check.expected,
+                    "Actual": actual,
+                }
+            )
+            result.append(drift)
+    return result
+
+
+def unmanaged(snapshot: dict, checks: List[Check]) -> dict:
+    """
+    returns the identities in the `snapshot` which no custom resource expects, by region.
+    """
+    managed = {(check.region, check.identity) for check in checks}
+    result = {}
+    for region, identities in snapshot.items():
+        names = sorted(i for i in identities if (region, i) not in managed)
+        if names:
+            result[region] = names
+    return result
+
+
+def scan(
+    domains: List[dict],
+    resources: List[str],
+    include_policies: bool = True,
+    max_workers: int = 8,
+    requests_per_second: float = 10,
+) -> dict:
+    """
+    returns the drift report of the custom `resources` of the `domains`.
+    """
+    checks = []
+    for properties in domains:
+        for resource in properties.get("Resources", resources):
+            checks.extend(resource_checks(resource, properties))
+    regions = sorted({check.region for check in checks if check.region})
+
+    snapshot = take_snapshot(
+        regions,
+        include_policies,
+        max_workers=max_workers,
+        requests_per_second=requests_per_second,
+    )
+    drift = compare(snapshot, checks)
+    return {
+        "Regions": regions,
+        "Identities": sum(len(identities) for identities in snapshot.values()),
+        "Checks": len(checks),
+        "Drift": drift,
+        "Unmanaged": unmanaged(snapshot, checks),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="report the drift of SES from the resources of a manifest"
+    )
+    parser.add_argument("manifest", help="YAML or JSONL manifest of domains")
+    parser.add_argument(
+        "--region", default=os.getenv("AWS_REGION"), help="default region of domains"
+    )
+    parser.add_argument(
+        "--resources",
+        default=onboard.DEFAULT_RESOURCES,
+        help="comma separated resources expected per domain",
+    )
+    parser.add_argument("--report", default="drift-report.json")
+    parser.add_argument(
+        "--no-policies", action="store_true", help="do not read the identity policies"
+    )
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=float(os.getenv("SES_REQUESTS_PER_SECOND", "10")),
+        help="calls per second per region",
+    )
+    parser.add_argument("--json", action="store_true", help="report as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    try:
+        domains = onboard.load_manifest(
+            args.manifest, {"Region": args.region} if args.region else {}
+        )
+        report = scan(
+            domains,
+            args.resources.split(","),
+            not args.no_policies,
+            args.max_workers,
+            args.rate,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(
+            f'checked {report["Checks"]} attributes of {report["Identities"]} identities '
+            f'in {", ".join(report["Regions"])}, {len(report["Drift"])} drifted'
+        )
+        for drift in report["Drift"]:
+            print(
+                f'{drift["Region"]:16} {drift["Identity"]:32} {drift["Attribute"]:40} '
+                f'expected {drift["Expected"]}, actual {drift.get("Actual")}'
+            )
+        for region, identities in report["Unmanaged"].items():
+            print(f"{len(identities)} unmanaged identities in {region}")
+    return 1 if report["Drift"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+from copy import deepcopy
+from typing import List, Optional, Tuple
+
+from botocore.awsrequest import AWSResponse
+
+import aws_clients
+
+
+class FakeAWS(object):
+    """
+    answers AWS API calls with recorded responses, instead of calling AWS. The
+    `responses` are keyed by `<service>.<Operation>`, for instance `ses.VerifyDomainDkim`.
+    A response is the parsed response of the operation, or a list of them which are
+    returned in order, the last one repeating, or a function of the call parameters
+    returning the response. A response with an `Error` is returned as an error. Calls
+    without a recorded response fail with the error code `NotRecorded`.
+    """
+
+    def __init__(self, responses: dict):
+        self.responses = responses
+        self.calls: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self._served = {}
+
+    def respond(
+        self, service_name: str, operation_name: str, params: dict = None
+    ) -> dict:
+        key = f"{service_name}.{operation_name}"
+        with self._lock:
+            self.calls.append((service_name, operation_name))
+            response = self.responses.get(key)
+            if isinstance(response, list):
+                index = min(self._served.get(key, 0), len(response) - 1)
+                self._served[key] = index + 1
+                response = response[index]
+
+        if callable(response):
+            response = response(params if params is not None else {})
+        if response is None:
+            return {
+                "Error": {
+                    "Code": "NotRecorded",
+                    "Message": f"no response recorded for {key}",
+                },
+                "ResponseMetadata": {"HTTPStatusCode": 400},
+            }
+        return deepcopy(response)
+
+    def call_counts(self) -> dict:
+        """
+        returns the number of calls per service and per `<service>.<Operation>`.
+        """
+        result = {}
+        for service_name, operation_name in self.calls:
+            for key in [service_name, f"{service_name}.{operation_name}"]:
+                result[key] = result.get(key, 0) + 1
+        return result
+
+
+_active: contextvars.ContextVar = contextvars.ContextVar("fake_aws", default=None)
+
+
+def active() -> Optional[FakeAWS]:
+    return _active.get()
+
+
+@contextmanager
+def scope(fake: FakeAWS):
+    """
+    answers the AWS API calls made in the block with `fake`. The fake is installed on
+    the clients on first use.
+    """
+    aws_clients.add_instrumenter(register)
+    token = _active.set(fake)
+    try:
+        yield fake
+    finally:
+        _active.reset(token)
+
+
+def register(events):
+    """
+    registers a handler on the event system of a botocore client, which answers the
+    calls from the active fake.
+    """
+
+    def before_parameter_build(params, context, **kwargs):
+        if active() is not None:
+            context["fake_aws_params"] = deepcopy(params)
+
+    def before_call(model, params, context, **kwargs):
+        fake = active()
+        if fake is None:
+            return None
+
+        parsed = fake.respond(
+            model.service_model.service_name,
+            model.name,
+            context.get("fake_aws_params"),
+        )
+        status_code = parsed.setdefault("ResponseMetadata", {}).setdefault(
+            "HTTPStatusCode", 400 if "Error" in parsed else 200
+        )
+        return AWSResponse(params["url"], status_code, {}, None), parsed
+
+    events.register(
+        "before-parameter-build.*.*",
+        before_parameter_build,
+        unique_id="fake-aws-before-parameter-build",
+    )
+    events.register("before-call.*.*", before_call, unique_id="fake-aws-before-call")
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Callable, Optional, Tuple
+
+from base_provider import BaseProvider
+
+log = logging.getLogger()
+
+
+class InMemoryStore(object):
+    """
+    keeps the most recent completed responses in memory, for the lifetime of a warm container.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._responses = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            response = self._responses.get(key)
+            if response is not None:
+                self._responses.move_to_end(key)
+            return deepcopy(response)
+
+    def put(self, key: str, response: dict):
+        with self._lock:
+            self._responses[key] = deepcopy(response)
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.max_entries:
+                self._responses.popitem(last=False)
+
+
+class FileStore(object):
+    """
+    keeps the completed responses as JSON files in `directory`.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, response: dict):
+        fd, filename = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(response, f)
+        os.replace(filename, self.path(key))
+
+
+class NoStore(object):
+    def get(self, key: str) -> Optional[dict]:
+        return None
+
+    def put(self, key: str, response: dict):
+        pass
+
+
+def create_store(setting: str = None):
+    """
+    creates the store configured by `setting` or the environment variable IDEMPOTENCY_STORE:
+    `memory` (default), `none` or `file:<directory>`.
+    """
+    if setting is None:
+        setting = os.getenv("IDEMPOTENCY_STORE", "memory")
+    if setting == "memory":
+        return InMemoryStore()
+    if setting == "none":
+        return NoStore()
+    if setting.startswith("file:"):
+        return FileStore(setting[len("file:") :])
+    raise ValueError(f"unsupported IDEMPOTENCY_STORE {setting}")
+
+
+def request_key(request: dict) -> Optional[str]:
+    if "RequestId" not in request or "LogicalResourceId" not in request:
+        return None
+    return f'{request["RequestId"]}/{request["LogicalResourceId"]}'
+
+
+def replay(request: dict, context, response: dict):
+    """
+    sends the recorded `response` to the ResponseURL of the duplicate `request`.
+    """
+    provider = BaseProvider()
+    provider.set_request(request, context)
+    provider.response = deepcopy(response)
+    provider.send_response()
+
+
+def handle(
+    store, request: dict, context, handler: Callable[[dict, object], Tuple[dict, bool]]
+) -> dict:
+    """
+    returns the recorded response of a duplicate `request`, without calling the handler.
+    Otherwise calls `handler`, which returns the response and whether the request
+    was completed. Only completed responses are recorded.
+    """
+    key = request_key(request)
+    response = store.get(key) if key else None
+    if response is not None:
+        log.info("replaying recorded response for duplicate request %s", key)
+        replay(request, context, response)
+        return response
+
+    response, completed = handler(request, context)
+    if key and completed:
+        store.put(key, response)
+    return response
@@ -1,15 +1,32 @@
 import logging
+import os
+from typing import List, Tuple
 
-import boto3
-from cfn_resource_provider import ResourceProvider
+from aws_clients import get_client
+from base_provider import (
+    MAX_IDENTITIES_PER_CALL,
+    BaseProvider,
+    seed_identity_attributes,
+)
+from caller_identity import get_caller_identity
+import tracing
+from worker_pool import RateLimiter, chunked, run_concurrently
 
-sts = boto3.client("sts")
+NOTIFICATION_TYPES = ["Bounce", "Complaint", "Delivery"]
 
 request_schema = {
     "type": "object",
-    "required": ["Identity", "Region"],
+    "required": ["Region"],
+    "oneOf": [{"required": ["Identity"]}, {"required": ["Identities"]}],
     "properties": {
         "Identity": {"type": "string", "description": "to set the notifications for"},
+        "Identities": {
+            "type": "array",
+            "items": {"type": "string"},
+            "minItems": 1,
+            "uniqueItems": True,
+            "description": "to set the same notifications for",
+        },
         "Region": {"type": "string", "description": "of the identity"},
         "BounceTopic": {
             "type": "string",
@@ -55,11 +72,14 @@ request_schema = {
 }
 
 
-class IdentityNotificationsProvider(ResourceProvider):
+class IdentityNotificationsProvider(BaseProvider):
     def __init__(self):
         super().__init__()
         self.request_schema = request_schema
         self._ses = None
+        self.max_workers = int(os.getenv("MAX_WORKERS", "4"))
+        self.requests_per_second = float(os.getenv("SES_REQUESTS_PER_SECOND", "10"))
+        self.results = {}
 
     def convert_property_types(self):
         self.heuristic_convert_property_types(self.properties)
@@ -72,6 +92,22 @@ class IdentityNotificationsProvider(ResourceProvider):
     def old_identity(self):
         return self.get_old("Identity", self.identity).rstrip(".")
 
+    @property
+    def identities(self) -> List[str]:
+        return [identity.rstrip(".") for identity in self.get("Identities", [])]
+
+    @property
+    def old_identities(self) -> List[str]:
+        if "Identities" in self.old_properties:
+            return [identity.rstrip(".") for identity in self.get_old("Identities")]
+        if "Identity" in self.old_properties:
+            return [self.get_old("Identity").rstrip(".")]
+        return self.identities
+
+    @property
+    def is_bulk(self) -> bool:
+        return "Identities" in self.properties
+
     @property
     def region(self):
         return self.get("Region")
@@ -82,19 +118,58 @@ class IdentityNotificationsProvider(ResourceProvider):
 
     @property
     def account_id(self):
-        response = sts.get_caller_identity()
-        return response["Account"]
+        return get_caller_identity().account
+
+    @property
+    def partition(self):
+        return get_caller_identity().partition
 
     @property
     def arn(self):
-        return f"arn::ses:{self.region}:{self.account_id}:identity/{self.identity}"
+        return f"arn:{self.partition}:ses:{self.region}:{self.account_id}:identity/{self.identity}"
+
+    @property
+    def notifications_id(self):
+        """
+        the physical resource id. An update of the same identity in the same region keeps
+        the id, which earlier versions created without a partition, so that CloudFormation
+        does not delete the notifications as a replaced resource.
+        """
+        if (
+            self.request_type == "Update"
+            and self.identity == self.old_identity
+            and self.region == self.old_region
+            and self.physical_resource_id.startswith("arn:")
+        ):
+            return self.physical_resource_id
+        return self.arn
 
     @property
     def ses(self):
         if not self._ses or self._ses.meta.region_name != self.region:
-            self._ses = boto3.client("ses", region_name=self.region)
+            self._ses = get_client("ses", region_name=self.region)
         return self._ses
 
+    def prefetch(self, requests: List[dict]):
+        """
+        reads the notification attributes of the identities of `requests` in batches.
+        """
+        identity_lists = []
+        for request in requests:
+            properties = request.get("ResourceProperties", {})
+            if "Identities" in properties:
+                identities = [i.rstrip(".") for i in properties["Identities"]]
+                identity_lists.extend(chunked(identities, MAX_IDENTITIES_PER_CALL))
+            elif "Identity" in properties and request["RequestType"] != "Delete":
+                identity_lists.append([properties["Identity"].rstrip(".")])
+        seed_identity_attributes(
+            get_client("ses", region_name=requests[0]["ResourceProperties"]["Region"]),
+            "get_identity_notification_attributes",
+            "NotificationAttributes",
+            identity_lists,
+        )
+
+    @tracing.traced("precondition")
     def check_precondition(self):
         if self.get("ForceOverride"):
             logging.info(
@@ -105,7 +180,7 @@ class IdentityNotificationsProvider(ResourceProvider):
         if self.request_type == "Create" or (
             self.request_type == "Update"
             and self.region != self.old_region
-            or self.identity != self.old_identity
+            or self.identity not in self.old_identities
         ):
             response = self.ses.get_identity_notification_attributes(
                 Identities=[self.identity]
@@ -138,7 +213,7 @@ class IdentityNotificationsProvider(ResourceProvider):
             if topic:
                 kwargs["SnsTopic"] = topic
             self.ses.set_identity_notification_topic(**kwargs)
-            self.physical_resource_id = self.arn
+            self.physical_resource_id = self.notifications_id
 
             if topic:
                 kwargs.pop("SnsTopic")
@@ -160,21 +235,290 @@ class IdentityNotificationsProvider(ResourceProvider):
                 Identity=self.identity, NotificationType=notification_type
             )
 
+    @property
+    def desired_notification_attributes(self) -> dict:
+        return self.notification_attributes(self.get)
+
+    @property
+    def old_notification_attributes(self) -> dict:
+        return self.notification_attributes(self.get_old)
+
+    def notification_attributes(self, get) -> dict:
+        result = {"ForwardingEnabled": get("ForwardingEnabled", True)}
+        for notification_type in NOTIFICATION_TYPES:
+            topic = get(f"{notification_type}Topic")
+            if topic:
+                result[f"{notification_type}Topic"] = topic
+                result[f"HeadersIn{notification_type}NotificationsEnabled"] = get(
+                    f"HeadersIn{notification_type}NotificationsEnabled", False
+                )
+        return result
+
+    def get_notification_attributes(self, identities: List[str]) -> dict:
+        result = {}
+        for batch in chunked(identities, MAX_IDENTITIES_PER_CALL):
+            self.rate_limiter.acquire()
+            response = self.ses.get_identity_notification_attributes(Identities=batch)
+            result.update(response["NotificationAttributes"])
+        return result
+
+    def bulk_configure(
+        self,
+        desired: dict,
+        identities: List[str],
+        new_identities=(),
+        configured: dict = None,
+    ) -> bool:
+        """
+        applies the `desired` notification attributes to `identities`, reading the current
+        attributes in batches and only calling SES for the settings which differ. Unless
+        ForceOverride is specified, `new_identities` must not have any topics set: if
+        any has, nothing is changed and false is returned. If `configured` is given, only
+        the identities with the topics of `configured` are changed.
+        """
+        self.rate_limiter = RateLimiter(self.requests_per_second)
+        current = self.get_notification_attributes(identities)
+
+        changes = {}
+        refused = False
+        for identity in identities:
+            attributes = current.get(identity, {})
+            if identity in new_identities and not self.get("ForceOverride"):
+                topics = [t for t in NOTIFICATION_TYPES if attributes.get(f"{t}Topic")]
+                if topics:
+                    self.results[identity] = f"FAILED: {topics[0]}Topic already set"
+                    refused = True
+                    continue
+            if configured is not None and not has_topics(attributes, configured):
+                self.results[identity] = "KEPT"
+                continue
+            changes[identity] = notification_changes(identity, attributes, desired)
+            if not changes[identity]:
+                self.results[identity] = "UNCHANGED"
+
+        if refused:
+            return False
+
+        ses = self.ses
+
+        def apply(identity):
+            for method, kwargs in changes[identity]:
+                self.rate_limiter.acquire()
+                getattr(ses, method)(**kwargs)
+
+        pending = [identity for identity in changes if changes[identity]]
+        for result in run_concurrently(apply, pending, self.max_workers):
+            if result.error:
+                self.results[result.item] = f"FAILED: {result.error}"
+            else:
+                self.results[result.item] = "SUCCESS"
+        return True
+
+    def report_bulk_results(self):
+        failed = []
+        for identity, result in self.results.items():
+            logging.info(
+                f"notifications of identity {identity} in {self.region}: {result}"
+            )
+            if result.startswith("FAILED"):
+                failed.append(identity)
+            elif result == "KEPT":
+                logging.info(
+                    f"kept the notifications of identity {identity} in {self.region}, "
+                    "as its topics were not set by this resource"
+                )
+
+        self.set_attribute("Failed", failed)
+        self.set_attribute(
+            "Configured", len([r for r in self.results.values() if r == "SUCCESS"])
+        )
+        self.set_attribute(
+            "Unchanged", len([r for r in self.results.values() if r == "UNCHANGED"])
+        )
+        if failed:
+            self.fail(
+                f"failed to configure notifications of {len(failed)} identities in {self.region}, "
+                f"{failed[0]} {self.results[failed[0]]}"
+            )
+
+    def check_bulk_precondition(self):
+        if not self.get("ForwardingEnabled") and not (
+            self.get("BounceTopic") and self.get("ComplaintTopic")
+        ):
+            self.fail(
+                "ForwardingEnabled cannot be disabled without an SNS BounceTopic and SNS ComplaintTopic"
+            )
+            return False
+        return True
+
+    def bulk_create(self):
+        """
+        configures the notifications of all identities. The physical id is only set
+        once none of the identities has topics set, so that the delete of a refused
+        create does not clear the topics of another owner.
+        """
+        self.results = {}
+        if not self.check_bulk_precondition():
+            return
+
+        if self.bulk_configure(
+            self.desired_notification_attributes,
+            self.identities,
+            self.identities,
+        ):
+            self.physical_resource_id = f"{self.logical_resource_id}@{self.region}"
+        self.report_bulk_results()
+
+    def bulk_update(self):
+        """
+        configures the notifications of all identities, and clears those of the removed
+        identities. Only removed identities with the topics of the old properties are
+        cleared, as an identity added by a refused update is removed again by the
+        rollback.
+        """
+        self.results = {}
+        if not self.check_bulk_precondition():
+            return
+
+        if self.region != self.old_region:
+            new_identities = self.identities
+            removed = []
+        else:
+            old_identities = set(self.old_identities)
+            new_identities = [i for i in self.identities if i not in old_identities]
+            removed = [i for i in old_identities if i not in self.identities]
+
+        if not self.bulk_configure(
+            self.desired_notification_attributes, self.identities, new_identities
+        ):
+            self.report_bulk_results()
+            return
+
+        if self.region != self.old_region:
+            self.physical_resource_id = f"{self.logical_resource_id}@{self.region}"
+        if removed:
+            self.bulk_configure(
+                DEFAULT_NOTIFICATION_ATTRIBUTES,
+                sorted(removed),
+                configured=self.old_notification_attributes,
+            )
+        self.report_bulk_results()
+
+    def bulk_delete(self):
+        self.results = {}
+        self.bulk_configure(
+            DEFAULT_NOTIFICATION_ATTRIBUTES,
+            self.identities,
+            configured=self.desired_notification_attributes,
+        )
+        self.report_bulk_results()
+
     def create(self):
-        if self.check_precondition():
+        if self.is_bulk:
+            self.bulk_create()
+        elif self.check_precondition():
             self.set_notifications()
 
+    def update_from_bulk(self):
+        """
+        configures the notifications of a single identity, which were configured for the
+        old `Identities`. The physical id is kept, so that CloudFormation does not clear
+        the notifications of all old identities, and only the other old identities with
+        the old topics are cleared.
+        """
+        if not self.check_precondition():
+            return
+        physical_resource_id = self.physical_resource_id
+        self.results = {}
+        self.set_notifications()
+        self.physical_resource_id = physical_resource_id
+        removed = [i for i in self.old_identities if i != self.identity]
+        if removed:
+            self.bulk_configure(
+                DEFAULT_NOTIFICATION_ATTRIBUTES,
+                sorted(removed),
+                configured=self.old_notification_attributes,
+            )
+            self.report_bulk_results()
+
     def update(self):
-        if self.check_precondition():
+        if self.is_bulk:
+            self.bulk_update()
+        elif "Identities" in self.old_properties and self.region == self.old_region:
+            self.update_from_bulk()
+        elif self.check_precondition():
             self.set_notifications()
 
     def delete(self):
         if self.physical_resource_id != "could-not-create":
-            self.clear_notifications()
+            if self.is_bulk:
+                self.bulk_delete()
+            else:
+                self.clear_notifications()
+
+
+DEFAULT_NOTIFICATION_ATTRIBUTES = {"ForwardingEnabled": True}
+
+
+def has_topics(current: dict, configured: dict) -> bool:
+    """
+    returns true if the topics of the `current` notification attributes are the
+    topics of the `configured` attributes.
+    """
+    return all(
+        (current.get(f"{t}Topic") or None) == configured.get(f"{t}Topic")
+        for t in NOTIFICATION_TYPES
+    )
+
+
+def notification_changes(
+    identity: str, current: dict, desired: dict
+) -> List[Tuple[str, dict]]:
+    """
+    returns the SES calls, as (method name, arguments), required to change the
+    notification attributes of `identity` from `current` to `desired`. Feedback
+    forwarding is enabled before and disabled after the topics are changed, as SES
+    requires bounce and complaint topics while forwarding is disabled.
+    """
+    result = []
+    forwarding_enabled = desired["ForwardingEnabled"]
+    forwarding_change = None
+    if current.get("ForwardingEnabled", True) != forwarding_enabled:
+        forwarding_change = (
+            "set_identity_feedback_forwarding_enabled",
+            {"Identity": identity, "ForwardingEnabled": forwarding_enabled},
+        )
+        if forwarding_enabled:
+            result.append(forwarding_change)
+
+    for notification_type in NOTIFICATION_TYPES:
+        topic = desired.get(f"{notification_type}Topic")
+        if (current.get(f"{notification_type}Topic") or None) != topic:
+            kwargs = {"Identity": identity, "NotificationType": notification_type}
+            if topic:
+                kwargs["SnsTopic"] = topic
+            result.append(("set_identity_notification_topic", kwargs))
+
+        headers = f"HeadersIn{notification_type}NotificationsEnabled"
+        if topic and current.get(headers, False) != desired[headers]:
+            result.append(
+                (
+                    "set_identity_headers_in_notifications_enabled",
+                    {
+                        "Identity": identity,
+                        "NotificationType": notification_type,
+                        "Enabled": desired[headers],
+                    },
+                )
+            )
+
+    if forwarding_change and not forwarding_enabled:
+        result.append(forwarding_change)
+    return result
 
 
 provider = IdentityNotificationsProvider()
 
 
 def handler(request, context):
-    return provider.handle(request, context)
+    return provider.copy().handle(request, context)
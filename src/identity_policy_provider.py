@@ -1,7 +1,8 @@
-import boto3
 import json
 from botocore.exceptions import ClientError
-from cfn_resource_provider import ResourceProvider
+
+from aws_clients import get_client
+from base_provider import BaseProvider
 
 request_schema = {
     "type": "object",
@@ -78,11 +79,14 @@ request_schema = {
 }
 
 
-class IdentityPolicyProvider(ResourceProvider):
+class IdentityPolicyProvider(BaseProvider):
     def __init__(self):
         super().__init__()
         self.request_schema = request_schema
-        self.ses = boto3.client("ses")
+
+    @property
+    def ses(self):
+        return get_client("ses")
 
     def create(self):
         existing_policy = self.get_policy(self.identity, self.policy_name)
@@ -222,4 +226,4 @@ provider = IdentityPolicyProvider()
 
 
 def handler(request, context):
-    return provider.handle(request, context)
+    return provider.copy().handle(request, context)
@@ -1,7 +1,6 @@
 from copy import deepcopy
 
-import boto3
-
+from aws_clients import get_client
 from ses_provider import SESProvider
 
 
@@ -63,7 +62,7 @@ class MailFromDomainProvider(SESProvider):
 
     def set_mail_from(self):
         try:
-            ses = boto3.client("ses", region_name=self.region)
+            ses = get_client("ses", region_name=self.region)
 
             mx_failure_behaviour = self.behavior_on_mx_failure
 
@@ -109,4 +108,4 @@ provider = MailFromDomainProvider()
 
 
 def handler(request, context):
-    return provider.handle(request, context)
+    return provider.copy().handle(request, context)
@@ -0,0 +1,234 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "PriorRequestNotComplete",
+}
+
+# the maximum number of values of a metric in an EMF document
+MAX_VALUES_PER_METRIC = 100
+
+
+class ApiCallMetrics(object):
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.latencies: List[float] = []
+
+
+class MetricsRecorder(object):
+    """
+    records the latency, retries and throttling of AWS API calls per service, operation
+    and resource type.
+    """
+
+    def __init__(self, resource_type: str = None):
+        self.resource_type = resource_type
+        self._lock = threading.Lock()
+        self.api_calls = {}
+
+    def _metrics(self, service_name: str, operation_name: str) -> ApiCallMetrics:
+        key = (service_name, operation_name, self.resource_type or "")
+        if key not in self.api_calls:
+            self.api_calls[key] = ApiCallMetrics()
+        return self.api_calls[key]
+
+    def record_call(
+        self, service_name, operation_name, latency, retries=0, error=False
+    ):
+        with self._lock:
+            metrics = self._metrics(service_name, operation_name)
+            metrics.calls += 1
+            metrics.retries += retries
+            metrics.errors += 1 if error else 0
+            metrics.latencies.append(latency)
+
+    def record_throttle(self, service_name, operation_name):
+        with self._lock:
+            self._metrics(service_name, operation_name).throttles += 1
+
+    def to_documents(self, namespace: str) -> List[dict]:
+        """
+        returns the recorded metrics as CloudWatch Embedded Metric Format documents. As
+        a document holds at most 100 values of a metric, the latencies of an operation
+        are spread over several documents, of which only the first holds the counts.
+        """
+        timestamp = int(time.time() * 1000)
+        result = []
+        with self._lock:
+            for (service, operation, resource_type), metrics in self.api_calls.items():
+                latencies = metrics.latencies
+                for start in range(0, max(len(latencies), 1), MAX_VALUES_PER_METRIC):
+                    document = {
+                        "_aws": {
+                            "Timestamp": timestamp,
+                            "CloudWatchMetrics": [
+                                {
+                                    "Namespace": namespace,
+                                    "Dimensions": [
+                                        ["Service", "Operation", "ResourceType"]
+                                    ],
+                                    "Metrics": [
+                                        {"Name": "Latency", "Unit": "Milliseconds"}
+                                    ],
+                                }
+                            ],
+                        },
+                        "Service": service,
+                        "Operation": operation,
+                        "ResourceType": resource_type,
+                        "Latency": latencies[start : start + MAX_VALUES_PER_METRIC],
+                    }
+                    if start == 0:
+                        document["_aws"]["CloudWatchMetrics"][0]["Metrics"].extend(
+                            [
+                                {"Name": "Calls", "Unit": "Count"},
+                                {"Name": "Errors", "Unit": "Count"},
+                                {"Name": "Retries", "Unit": "Count"},
+                                {"Name": "Throttles", "Unit": "Count"},
+                            ]
+                        )
+                        document.update(
+                            {
+                                "Calls": metrics.calls,
+                                "Errors": metrics.errors,
+                                "Retries": metrics.retries,
+                                "Throttles": metrics.throttles,
+                            }
+                        )
+                    result.append(document)
+        return result
+
+
+class LogSink(object):
+    """
+    writes EMF documents to stdout, from where CloudWatch Logs extracts the metrics.
+    """
+
+    def emit(self, document: dict):
+        print(json.dumps(document), flush=True)
+
+
+class InMemorySink(object):
+    def __init__(self):
+        self.documents = []
+
+    def emit(self, document: dict):
+        self.documents.append(document)
+
+
+class NoSink(object):
+    def emit(self, document: dict):
+        pass
+
+
+def create_sink(setting: str = None):
+    """
+    creates the sink configured by `setting` or the environment variable METRICS:
+    `emf` (default) or `none`.
+    """
+    if setting is None:
+        setting = os.getenv("METRICS", "emf")
+    if setting == "emf":
+        return LogSink()
+    if setting == "none":
+        return NoSink()
+    raise ValueError(f"unsupported METRICS {setting}")
+
+
+namespace = os.getenv("METRICS_NAMESPACE", "cfn-ses-provider")
+default_sink = create_sink()
+
+_active: contextvars.ContextVar = contextvars.ContextVar("metrics", default=None)
+
+
+def active() -> Optional[MetricsRecorder]:
+    return _active.get()
+
+
+@contextmanager
+def scope(resource_type: str = None, sink=None):
+    """
+    records the metrics of the AWS calls made in the block, and emits them to the `sink`
+    at the end.
+    """
+    recorder = MetricsRecorder(resource_type)
+    token = _active.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _active.reset(token)
+        for document in recorder.to_documents(namespace):
+            (sink if sink is not None else default_sink).emit(document)
+
+
+def register(events):
+    """
+    registers the metrics handlers on the event system of a botocore client.
+    """
+
+    def before_call(context, **kwargs):
+        context["metrics_start"] = time.perf_counter()
+
+    def after_call(http_response, parsed, model, context, **kwargs):
+        recorder = active()
+        if recorder is None or "metrics_start" not in context:
+            return
+        recorder.record_call(
+            model.service_model.service_name,
+            model.name,
+            (time.perf_counter() - context["metrics_start"]) * 1000,
+            parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+            http_response.status_code >= 300,
+        )
+
+    def after_call_error(context, exception, **kwargs):
+        recorder = active()
+        if recorder is None or "metrics_start" not in context:
+            return
+        service_name, operation_name = context.get("metrics_operation", ("", ""))
+        recorder.record_call(
+            service_name,
+            operation_name,
+            (time.perf_counter() - context["metrics_start"]) * 1000,
+            error=True,
+        )
+
+    def before_parameter_build(model, context, **kwargs):
+        context["metrics_operation"] = (model.service_model.service_name, model.name)
+
+    def needs_retry(response, operation, **kwargs):
+        recorder = active()
+        if recorder is None or not response:
+            return
+        error_code = response[1].get("Error", {}).get("Code")
+        if error_code in THROTTLING_ERROR_CODES:
+            recorder.record_throttle(
+                operation.service_model.service_name, operation.name
+            )
+
+    events.register(
+        "before-parameter-build.*.*",
+        before_parameter_build,
+        unique_id="metrics-before-parameter-build",
+    )
+    events.register_first(
+        "before-call.*.*", before_call, unique_id="metrics-before-call"
+    )
+    events.register("after-call.*.*", after_call, unique_id="metrics-after-call")
+    events.register(
+        "after-call-error.*.*", after_call_error, unique_id="metrics-after-call-error"
+    )
+    events.register("needs-retry.*.*", needs_retry, unique_id="metrics-needs-retry")
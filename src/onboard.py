@@ -0,0 +1,406 @@
+"""
+onboards the domains of a manifest by running the providers of the DomainIdentity,
+DkimTokens, MailFromDomain and DKIM resources for each domain, with the requests
+CloudFormation would send for a stack per domain. The results are checkpointed, so that
+an interrupted run resumes where it stopped.
+
+usage: python src/onboard.py manifest.yaml [--region eu-west-1]
+                             [--resources DomainIdentity,DkimTokens]
+                             [--checkpoint onboard-checkpoint.jsonl]
+                             [--max-workers 8] [--rate 10] [--adopt] [--json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from copy import deepcopy
+from typing import List, Optional
+
+import cfn_dkim_provider
+import dkim_tokens_provider
+import domain_identity_provider
+import mail_from_domain_provider
+import request_cache
+from aws_clients import get_client
+from worker_pool import RateLimiter, run_concurrently
+
+RESOURCES = {
+    "DomainIdentity": domain_identity_provider,
+    "DkimTokens": dkim_tokens_provider,
+    "MailFromDomain": mail_from_domain_provider,
+    "DKIM": cfn_dkim_provider,
+}
+
+# the resources which create the domain identity
+IDENTITY_RESOURCES = ["DomainIdentity", "DKIM"]
+
+DEFAULT_RESOURCES = "DomainIdentity,DkimTokens"
+
+
+def load_manifest(filename: str, defaults: dict = None) -> List[dict]:
+    """
+    reads the domains of `filename`. A JSONL manifest has a domain per line, a YAML
+    manifest a list of domains, or a mapping with `Defaults` and `Domains`. A domain is
+    a name, or the properties of its resources, with the `Domain` and optionally the
+    `Resources` to run.
+    """
+    with open(filename) as f:
+        if filename.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+            manifest_defaults = {}
+        else:
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("reading a YAML manifest requires pyyaml")
+            manifest = yaml.safe_load(f)
+            if isinstance(manifest, dict):
+                manifest_defaults = manifest.get("Defaults", {})
+                entries = manifest.get("Domains", [])
+            else:
+                manifest_defaults, entries = {}, manifest if manifest else []
+
+    result = []
+    for entry in entries:
+        properties = dict(defaults if defaults else {})
+        properties.update(manifest_defaults)
+        properties.update({"Domain": entry} if isinstance(entry, str) else entry)
+        if "Domain" not in properties:
+            raise ValueError(f"domain without a name in {filename}, {entry}")
+        properties["Domain"] = properties["Domain"].rstrip(".")
+        result.append(properties)
+    return result
+
+
+class Checkpoint(object):
+    """
+    appends the result of each resource to a JSONL file at `path`. The resources which
+    succeeded in an earlier run are not run again.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._succeeded = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        result = json.loads(line)
+                        if result["Status"] == "SUCCESS":
+                            self._succeeded[self.key(result)] = result
+
+    @staticmethod
+    def key(result: dict) -> tuple:
+        return result["Domain"], result.get("Region"), result["Resource"]
+
+    def succeeded(self, result: dict) -> Optional[dict]:
+        return self._succeeded.get(self.key(result))
+
+    def record(self, result: dict):
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+
+def synthesize_request(resource: str, properties: dict, adopt: bool) -> dict:
+    """
+    returns the request CloudFormation sends to create the `resource`. To `adopt`
+    existing identities, an update without changes is sent instead.
+    """
+    properties = {
+        name: value for name, value in properties.items() if name != "Resources"
+    }
+    request = {
+        "RequestType": "Update" if adopt else "Create",
+        "ResourceType": f"Custom::{resource}",
+        "ResponseURL": "https://localhost/onboard",
+        "StackId": f"arn:aws:cloudformation:{properties.get('Region')}:000000000000:stack/onboard/{uuid.uuid4()}",
+        "RequestId": str(uuid.uuid4()),
+        "LogicalResourceId": resource,
+        "ResourceProperties": deepcopy(properties),
+    }
+    if adopt:
+        request["OldResourceProperties"] = deepcopy(properties)
+        request["PhysicalResourceId"] = (
+            f'{properties["Domain"]}@{properties.get("HostedZoneId")}'
+            if resource == "DKIM"
+            else f'{properties["Domain"]}@{properties.get("Region")}'
+        )
+    return request
+
+
+def run_provider(request: dict) -> dict:
+    """
+    returns the response of the provider of the resource type of `request`, without
+    sending it.
+    """
+    module = RESOURCES[request["ResourceType"][len("Custom::") :]]
+    provider = module.provider.copy()
+    provider.set_request(request, {})
+    provider.execute()
+    return provider.response
+
+
+class Summary(object):
+    def __init__(self, resources: List[str]):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.domains = 0
+        self.failed_domains = 0
+        self.counts = {
+            r: {"SUCCESS": 0, "FAILED": 0, "SKIPPED": 0, "BLOCKED": 0}
+            for r in resources
+        }
+        self.errors = {}
+
+    def add(self, results: List[dict]):
+        with self._lock:
+            self.domains += 1
+            if any(r["Status"] in ["FAILED", "BLOCKED"] for r in results):
+                self.failed_domains += 1
+            for result in results:
+                counts = self.counts.setdefault(
+                    result["Resource"],
+                    {"SUCCESS": 0, "FAILED": 0, "SKIPPED": 0, "BLOCKED": 0},
+                )
+                counts[result["Status"]] += 1
+                if result["Status"] == "FAILED":
+                    reason = result.get("Reason", "").replace(
+                        result["Domain"], "<domain>"
+                    )
+                    self.errors[reason] = self.errors.get(reason, 0) + 1
+            if self.domains % 100 == 0:
+                logging.info(
+                    "onboarded %d domains, %.1f domains/s",
+                    self.domains,
+                    self.domains / max(time.monotonic() - self.started, 1e-9),
+                )
+
+    def to_dict(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "domains": self.domains,
+            "failed_domains": self.failed_domains,
+            "elapsed_s": round(elapsed, 3),
+            "domains_per_s": round(self.domains / max(elapsed, 1e-9), 3),
+            "resources": self.counts,
+            "errors": dict(sorted(self.errors.items(), key=lambda e: -e[1])),
+        }
+
+
+def onboard_domain(
+    properties: dict,
+    resources: List[str],
+    checkpoint: Checkpoint,
+    adopt: bool,
+    region_cache: request_cache.RequestCache,
+) -> List[dict]:
+    """
+    runs the `resources` of the domain in order. After a failure, the remaining
+    resources are blocked.
+    """
+    results = []
+    identity_exists = False
+    with request_cache.scope(request_cache.RequestCache(parent=region_cache)) as cache:
+        for resource in properties.get("Resources", resources):
+            result = {
+                "Domain": properties["Domain"],
+                "Region": properties.get("Region"),
+                "Resource": resource,
+            }
+            if results and results[-1]["Status"] not in ["SUCCESS", "SKIPPED"]:
+                results.append(dict(result, Status="BLOCKED"))
+                continue
+            if checkpoint.succeeded(result):
+                results.append(dict(result, Status="SKIPPED"))
+                identity_exists |= resource in IDENTITY_RESOURCES
+                continue
+
+            if identity_exists:
+                # the identity was created after the identities were listed
+                cache.seed(
+                    "ses",
+                    properties.get("Region"),
+                    "ListIdentities",
+                    {"IdentityType": "Domain"},
+                    {"Identities": [properties["Domain"]]},
+                    namespace=properties.get("RoleArn", ""),
+                )
+            if resource in RESOURCES:
+                response = run_provider(synthesize_request(resource, properties, adopt))
+            else:
+                response = {
+                    "Status": "FAILED",
+                    "Reason": f"unknown resource {resource}",
+                }
+            result.update(
+                {
+                    "Status": response["Status"],
+                    "Reason": response.get("Reason", ""),
+                    "PhysicalResourceId": response.get("PhysicalResourceId"),
+                    "Data": response.get("Data", {}),
+                }
+            )
+            checkpoint.record(result)
+            results.append(result)
+            if result["Status"] == "SUCCESS":
+                identity_exists |= resource in IDENTITY_RESOURCES
+            else:
+                logging.error(
+                    "failed to onboard %s of %s, %s",
+                    resource,
+                    result["Domain"],
+                    result["Reason"],
+                )
+    return results
+
+
+def limit_rate(regions: List[str], requests_per_second: float):
+    """
+    limits the calls of the SES clients of `regions` and of the Route53 client to
+    `requests_per_second` each.
+    """
+    clients = [get_client("ses", region_name=r) for r in regions]
+    clients.append(get_client("route53"))
+    for client in clients:
+        rate_limiter = RateLimiter(requests_per_second)
+        client.meta.events.register(
+            "before-call.*.*",
+            lambda rate_limiter=rate_limiter, **kwargs: rate_limiter.acquire(),
+            unique_id="onboard-rate-limit",
+        )
+
+
+def onboard(
+    domains: List[dict],
+    resources: List[str],
+    checkpoint: Checkpoint,
+    max_workers: int = 8,
+    requests_per_second: float = 10,
+    adopt: bool = False,
+) -> Summary:
+    """
+    onboards the `domains` on a pool of `max_workers` threads. The domain identities of
+    each region are listed once.
+    """
+    regions = sorted(set(d.get("Region") for d in domains if d.get("Region")))
+    limit_rate(regions, requests_per_second)
+
+    region_caches = {}
+    for region in regions:
+        region_caches[region] = request_cache.RequestCache()
+        with request_cache.scope(region_caches[region]):
+            paginator = get_client("ses", region_name=region).get_paginator(
+                "list_identities"
+            )
+            for _ in paginator.paginate(IdentityType="Domain"):
+                pass
+
+    summary = Summary(resources)
+
+    def run(properties):
+        results = onboard_domain(
+            properties,
+            resources,
+            checkpoint,
+            adopt,
+            region_caches.get(properties.get("Region")),
+        )
+        summary.add(results)
+
+    for result in run_concurrently(run, domains, max_workers):
+        if result.error:
+            logging.error(
+                "failed to onboard %s, %s", result.item["Domain"], result.error
+            )
+            resource = result.item.get("Resources", resources)[0]
+            summary.add(
+                [
+                    {
+                        "Domain": result.item["Domain"],
+                        "Resource": resource,
+                        "Status": "FAILED",
+                        "Reason": str(result.error),
+                    }
+                ]
+            )
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="onboard the domains of a manifest")
+    parser.add_argument("manifest", help="YAML or JSONL manifest of domains")
+    parser.add_argument(
+        "--region", default=os.getenv("AWS_REGION"), help="default region of domains"
+    )
+    parser.add_argument(
+        "--resources",
+        default=DEFAULT_RESOURCES,
+        help=f"comma separated resources to run per domain, of {', '.join(RESOURCES)}",
+    )
+    parser.add_argument("--checkpoint", default="onboard-checkpoint.jsonl")
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=float(os.getenv("SES_REQUESTS_PER_SECOND", "10")),
+        help="calls per second per client",
+    )
+    parser.add_argument(
+        "--adopt", action="store_true", help="adopt existing domain identities"
+    )
+    parser.add_argument("--json", action="store_true", help="report as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    resources = args.resources.split(",")
+    unknown = [r for r in resources if r not in RESOURCES]
+    if unknown:
+        parser.error(f"unknown resources {', '.join(unknown)}")
+    try:
+        domains = load_manifest(
+            args.manifest, {"Region": args.region} if args.region else {}
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = onboard(
+        domains,
+        resources,
+        Checkpoint(args.checkpoint),
+        args.max_workers,
+        args.rate,
+        args.adopt,
+    ).to_dict()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(
+            f'onboarded {summary["domains"]} domains in {summary["elapsed_s"]:.1f}s, '
+            f'{summary["domains_per_s"]:.1f} domains/s, {summary["failed_domains"]} failed'
+        )
+        print(
+            f'{"resource":16} {"success":>8} {"failed":>8} {"skipped":>8} {"blocked":>8}'
+        )
+        for resource, counts in summary["resources"].items():
+            print(
+                f'{resource:16} {counts["SUCCESS"]:8d} {counts["FAILED"]:8d} '
+                f'{counts["SKIPPED"]:8d} {counts["BLOCKED"]:8d}'
+            )
+        if summary["errors"]:
+            print("errors:")
+            for reason, count in summary["errors"].items():
+                print(f"{count:8d}  {reason}")
+    return 1 if summary["failed_domains"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
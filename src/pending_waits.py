@@ -0,0 +1,277 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from copy import deepcopy
+from typing import List, Optional
+
+import aws_clients
+import request_cache
+
+log = logging.getLogger()
+
+# the seconds a poller holds on to a region beyond its polling interval
+POLLER_LEASE_IN_SECONDS = 900
+
+
+def wait_key(request: dict) -> str:
+    return f'{request["RequestId"]}/{request["LogicalResourceId"]}'
+
+
+def wait_region(request: dict) -> str:
+    return request["ResourceProperties"]["Region"]
+
+
+class InMemoryWaitStore(object):
+    """
+    keeps the pending waits in memory, for tests and server mode.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waits = {}
+        self._pollers = {}
+
+    def register(self, request: dict):
+        with self._lock:
+            self._waits[wait_key(request)] = deepcopy(request)
+
+    def remove(self, request: dict):
+        with self._lock:
+            self._waits.pop(wait_key(request), None)
+
+    def pending(self, region: str) -> List[dict]:
+        with self._lock:
+            return [
+                deepcopy(r) for r in self._waits.values() if wait_region(r) == region
+            ]
+
+    def acquire_poller(self, region: str, now: float, until: float) -> bool:
+        """
+        returns true if there was no poller for `region`, which is then leased `until`.
+        """
+        with self._lock:
+            if self._pollers.get(region, 0) > now:
+                return False
+            self._pollers[region] = until
+            return True
+
+    def renew_poller(self, region: str, until: float):
+        with self._lock:
+            self._pollers[region] = until
+
+    def release_poller(self, region: str) -> bool:
+        """
+        releases the poller of `region`, unless waits are pending in `region`.
+        """
+        with self._lock:
+            if any(wait_region(r) == region for r in self._waits.values()):
+                return False
+            self._pollers.pop(region, None)
+            return True
+
+
+class FileWaitStore(object):
+    """
+    keeps the pending waits as JSON files in `directory`, for instance on EFS. Changes
+    are serialized with a lock file.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def locked(self):
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def path(self, request: dict) -> str:
+        name = hashlib.sha256(wait_key(request).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, wait_region(request), f"{name}.json")
+
+    def poller_path(self, region: str) -> str:
+        return os.path.join(self.directory, f"{region}.poller")
+
+    def write(self, path: str, value):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, filename = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(filename, path)
+
+    def register(self, request: dict):
+        with self.locked():
+            self.write(self.path(request), request)
+
+    def remove(self, request: dict):
+        with self.locked():
+            try:
+                os.remove(self.path(request))
+            except FileNotFoundError:
+                pass
+
+    def _pending(self, region: str) -> List[dict]:
+        directory = os.path.join(self.directory, region)
+        if not os.path.isdir(directory):
+            return []
+        result = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name)) as f:
+                    result.append(json.load(f))
+        return result
+
+    def pending(self, region: str) -> List[dict]:
+        with self.locked():
+            return self._pending(region)
+
+    def acquire_poller(self, region: str, now: float, until: float) -> bool:
+        with self.locked():
+            try:
+                with open(self.poller_path(region)) as f:
+                    if json.load(f) > now:
+                        return False
+            except FileNotFoundError:
+                pass
+            self.write(self.poller_path(region), until)
+            return True
+
+    def renew_poller(self, region: str, until: float):
+        with self.locked():
+            self.write(self.poller_path(region), until)
+
+    def release_poller(self, region: str) -> bool:
+        with self.locked():
+            if self._pending(region):
+                return False
+            try:
+                os.remove(self.poller_path(region))
+            except FileNotFoundError:
+                pass
+            return True
+
+
+def create_wait_store(setting: str = None):
+    """
+    creates the store of pending waits configured by `setting` or the environment
+    variable PENDING_WAIT_STORE: `none` (default), `memory` or `file:<directory>`.
+    Without a store, every pending resource reinvokes the function itself.
+    """
+    if setting is None:
+        setting = os.getenv("PENDING_WAIT_STORE", "none")
+    if setting == "none":
+        return None
+    if setting == "memory":
+        return InMemoryWaitStore()
+    if setting.startswith("file:"):
+        return FileWaitStore(setting[len("file:") :])
+    raise ValueError(f"unsupported PENDING_WAIT_STORE {setting}")
+
+
+default_store = create_wait_store()
+
+
+def check(store, waits: List[dict], providers: dict, context) -> int:
+    """
+    checks the `waits`. The state of the identities is read in batches by the
+    `providers` of the resource types, and shared by the checks. When a batch read
+    fails, the checks read the state themselves. Completed waits are removed. Returns
+    the number of completed waits.
+    """
+    groups = {}
+    for request in waits:
+        role_arn = request["ResourceProperties"].get("RoleArn")
+        groups.setdefault((request["ResourceType"], role_arn), []).append(request)
+
+    cache = request_cache.RequestCache()
+    with request_cache.scope(cache):
+        for (resource_type, role_arn), requests in groups.items():
+            try:
+                with aws_clients.role_scope(role_arn):
+                    providers[resource_type].prefetch(requests)
+            except Exception as e:
+                log.warning(
+                    "failed to prefetch the reads of %s in %s, %s",
+                    resource_type,
+                    role_arn,
+                    e,
+                )
+
+    completed = 0
+    for request in waits:
+        provider = providers[request["ResourceType"]].copy()
+        try:
+            with request_cache.scope(request_cache.RequestCache(parent=cache)):
+                provider.handle(request, context)
+        except Exception as e:
+            log.error("failed to complete the wait for %s, %s", wait_key(request), e)
+            provider.asynchronous = False
+        if not provider.asynchronous:
+            store.remove(request)
+            completed += 1
+    return completed
+
+
+def poll(store, region: str, providers: dict, context) -> dict:
+    """
+    checks all waits pending in `region` in one round. While waits are pending, the
+    next round is scheduled, even when the round failed, so that the lease of the
+    poller is never left to expire.
+    """
+    try:
+        completed = check(store, store.pending(region), providers, context)
+    except Exception as e:
+        log.error("failed to check the waits pending in %s, %s", region, e)
+        completed = 0
+
+    remaining = store.pending(region)
+    if not remaining and store.release_poller(region):
+        return {"Region": region, "Completed": completed, "Pending": 0}
+
+    remaining = remaining if remaining else store.pending(region)
+    intervals = []
+    for request in remaining:
+        provider = providers[request["ResourceType"]].copy()
+        provider.set_request(request, context)
+        intervals.append(provider.interval)
+    provider.schedule_poller(min(intervals))
+    return {"Region": region, "Completed": completed, "Pending": len(remaining)}
+
+
+def event_identity(event: dict) -> Optional[str]:
+    """
+    returns the identity of an SES verification event, if any.
+    """
+    detail = event.get("detail", {})
+    for name in ["identity", "identityName", "Identity", "IdentityName"]:
+        if isinstance(detail.get(name), str):
+            return detail[name].rstrip(".")
+    return None
+
+
+def complete(store, region: str, identity: str, providers: dict, context) -> dict:
+    """
+    checks the waits for `identity` in `region` right away, for instance when its
+    verification status changed. Waits which are still pending are left to the poller.
+    """
+    waits = [
+        w
+        for w in store.pending(region)
+        if w["ResourceProperties"]["Identity"].rstrip(".") == identity
+    ]
+    completed = check(store, waits, providers, context)
+    return {
+        "Region": region,
+        "Identity": identity,
+        "Completed": completed,
+        "Pending": len(waits) - completed,
+    }
@@ -0,0 +1,169 @@
+import json
+import math
+import os
+import tempfile
+import threading
+from typing import List
+
+# the number of observed times to success below which the adaptive policy backs off
+MIN_OBSERVATIONS = 10
+
+# the quantiles of the observed times to success at which the adaptive policy polls
+QUANTILES = (0.25, 0.5, 0.75, 0.9, 1.0)
+
+# the default maximum interval, short enough to sleep within an invocation of a function
+# with a timeout of 30 seconds
+MAXIMUM_IN_SECONDS = 20.0
+
+
+class FixedInterval(object):
+    """
+    polls every `seconds`.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def interval(self, attempt: int, elapsed: float = 0.0) -> float:
+        return self.seconds
+
+    def observe(self, seconds: float):
+        pass
+
+    def __str__(self):
+        return f"fixed:{self.seconds:g}"
+
+
+class ExponentialBackoff(object):
+    """
+    polls after `initial` seconds, and multiplies the interval by `factor` on every
+    attempt, up to `maximum` seconds.
+    """
+
+    def __init__(
+        self, initial: float, factor: float = 2.0, maximum: float = MAXIMUM_IN_SECONDS
+    ):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+
+    def interval(self, attempt: int, elapsed: float = 0.0) -> float:
+        return min(self.maximum, self.initial * self.factor ** max(0, attempt - 1))
+
+    def observe(self, seconds: float):
+        pass
+
+    def __str__(self):
+        return f"exponential:{self.initial:g},{self.factor:g},{self.maximum:g}"
+
+
+class VerificationTimes(object):
+    """
+    keeps the last `size` times to success per kind of check. With a `path`, the times
+    are kept in a JSON file, which survives the warm invocations of a Lambda function
+    in /tmp.
+    """
+
+    def __init__(self, path: str = None, size: int = 100):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._times = None
+
+    def load(self) -> dict:
+        if self._times is None:
+            self._times = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path) as f:
+                        self._times = json.load(f)
+                except ValueError:
+                    pass
+        return self._times
+
+    def samples(self, kind: str) -> List[float]:
+        with self._lock:
+            return list(self.load().get(kind, []))
+
+    def add(self, kind: str, seconds: float):
+        with self._lock:
+            times = self.load()
+            times[kind] = (times.get(kind, []) + [round(seconds, 3)])[-self.size :]
+            if self.path:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                fd, filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(times, f)
+                os.replace(filename, self.path)
+
+
+default_times = VerificationTimes(
+    os.getenv("VERIFICATION_TIMES_PATH", "/tmp/verification-times.json")
+)
+
+
+class AdaptiveInterval(object):
+    """
+    polls at the quartiles, the 90th percentile and the maximum of the times to success observed for `kind`, at least
+    `minimum` and at most `maximum` seconds apart. Beyond the observed times, it polls
+    after half the time elapsed so far. Until enough times are observed, the interval
+    backs off exponentially from `minimum`.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        times: VerificationTimes,
+        minimum: float = 2.0,
+        maximum: float = MAXIMUM_IN_SECONDS,
+    ):
+        self.kind = kind
+        self.times = times
+        self.minimum = minimum
+        self.maximum = maximum
+        self.fallback = ExponentialBackoff(minimum, 2.0, maximum)
+
+    def interval(self, attempt: int, elapsed: float = 0.0) -> float:
+        samples = sorted(self.times.samples(self.kind))
+        if len(samples) < MIN_OBSERVATIONS:
+            return self.fallback.interval(attempt, elapsed)
+        quantiles = [samples[math.ceil(q * len(samples)) - 1] for q in QUANTILES]
+        later = [t - elapsed for t in quantiles if t > elapsed]
+        return min(self.maximum, max(self.minimum, later[0] if later else elapsed / 2))
+
+    def observe(self, seconds: float):
+        self.times.add(self.kind, seconds)
+
+    def __str__(self):
+        return f"adaptive:{self.minimum:g},{self.maximum:g}"
+
+
+def create_policy(
+    setting: str = None, kind: str = None, times: VerificationTimes = None
+):
+    """
+    creates the polling policy configured by `setting` or the environment variable
+    POLLING_POLICY: `fixed:<seconds>`, `exponential:<initial>,<factor>,<maximum>` or
+    `adaptive:<minimum>,<maximum>`. The default polls every INTERVAL_IN_SECONDS, or 15
+    seconds. The adaptive policy learns from the `times` to success of `kind` of check.
+    """
+    if setting is None:
+        setting = os.getenv(
+            "POLLING_POLICY", "fixed:" + os.getenv("INTERVAL_IN_SECONDS", "15")
+        )
+    name, _, arguments = setting.partition(":")
+    try:
+        values = [float(v) for v in arguments.split(",")] if arguments else []
+        if name == "fixed" and len(values) == 1:
+            return FixedInterval(values[0])
+        if name == "exponential" and 1 <= len(values) <= 3:
+            return ExponentialBackoff(*values)
+        if name == "adaptive" and len(values) <= 2:
+            return AdaptiveInterval(
+                kind if kind else "default",
+                times if times else default_times,
+                *values,
+            )
+    except ValueError:
+        pass
+    raise ValueError(f"unsupported POLLING_POLICY {setting}")
@@ -0,0 +1,293 @@
+"""
+simulates the VerifiedIdentity provider awaiting the verification of many identities
+on a virtual clock, and reports the Lambda invocations, billed seconds and SES calls of
+each polling policy, and how long after its verification each resource completed.
+
+usage: python src/polling_simulator.py [--resources 100] [--verification lognormal:120,1]
+                                       [--policy fixed:15 ...] [--overhead 0.1] [--fan-in]
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import sys
+import uuid
+from typing import Callable, List
+
+import clock
+import fake_aws
+import pending_waits
+import polling
+import request_cache
+from verified_identity_provider import VerifiedIdentityProvider
+
+DEFAULT_POLICIES = [
+    "fixed:5",
+    "fixed:15",
+    "fixed:30",
+    "exponential:5,2,60",
+    "adaptive:2,60",
+]
+
+
+def create_distribution(setting: str) -> Callable[[random.Random], float]:
+    """
+    creates the distribution of verification times in seconds configured by `setting`:
+    `fixed:<seconds>`, `uniform:<min>,<max>`, `exponential:<mean>` or
+    `lognormal:<median>,<sigma>`.
+    """
+    name, _, arguments = setting.partition(":")
+    try:
+        values = [float(v) for v in arguments.split(",")] if arguments else []
+    except ValueError:
+        values = []
+    if name == "fixed" and len(values) == 1:
+        return lambda r: values[0]
+    if name == "uniform" and len(values) == 2:
+        return lambda r: r.uniform(values[0], values[1])
+    if name == "exponential" and len(values) == 1:
+        return lambda r: r.expovariate(1.0 / values[0])
+    if name == "lognormal" and len(values) == 2:
+        return lambda r: r.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"unsupported verification time distribution {setting}")
+
+
+class SimulatedVerification(object):
+    """
+    answers GetIdentityVerificationAttributes from the virtual `clock`.
+    """
+
+    def __init__(self, clock: clock.VirtualClock):
+        self.clock = clock
+        self.verified_at = {}
+
+    def __call__(self, params: dict) -> dict:
+        return {
+            "VerificationAttributes": {
+                identity: {
+                    "VerificationStatus": (
+                        "Success"
+                        if self.clock.now() >= self.verified_at[identity]
+                        else "Pending"
+                    ),
+                    "VerificationToken": "token",
+                }
+                for identity in params["Identities"]
+                if identity in self.verified_at
+            }
+        }
+
+
+class SimulatedProvider(VerifiedIdentityProvider):
+    """
+    reports the response to the simulation, instead of sending it to CloudFormation.
+    """
+
+    simulation = None
+
+    @property
+    def custom_cfn_resource_name(self):
+        return "Custom::VerifiedIdentity"
+
+    def send_response(self):
+        self.simulation.complete(self)
+
+
+class SimulationResult(object):
+    def __init__(self, policy):
+        self.policy = policy
+        self.resources = 0
+        self.invocations = 0
+        self.billed_seconds = 0.0
+        self.ses_calls = 0
+        self.delays: List[float] = []
+
+    def percentile(self, p: float) -> float:
+        delays = sorted(self.delays)
+        if not delays:
+            return 0.0
+        return delays[max(0, math.ceil(p / 100 * len(delays)) - 1)]
+
+    def to_dict(self) -> dict:
+        return {
+            "policy": str(self.policy),
+            "resources": self.resources,
+            "invocations": self.invocations,
+            "billed_seconds": round(self.billed_seconds, 3),
+            "ses_calls": self.ses_calls,
+            "delay_p50_s": round(self.percentile(50), 3),
+            "delay_p90_s": round(self.percentile(90), 3),
+            "delay_max_s": round(max(self.delays, default=0.0), 3),
+        }
+
+
+class Simulation(object):
+    """
+    runs the provider for resources with the given verification times, against a fake
+    SES. Each invocation is billed `overhead` seconds. As the provider sleeps in the
+    Lambda function before it reinvokes itself, the polling intervals are billed as
+    well, unless `billed_waits` is false. With `fan_in`, the pending waits are polled
+    by a single poller.
+    """
+
+    region = "eu-west-1"
+
+    def __init__(
+        self,
+        policy,
+        overhead: float = 0.1,
+        billed_waits: bool = True,
+        fan_in: bool = False,
+    ):
+        self.overhead = overhead
+        self.billed_waits = billed_waits
+        self.events = clock.EventScheduler()
+        self.clock = self.events.clock
+        self.verification = SimulatedVerification(self.events.clock)
+        self.result = SimulationResult(policy)
+
+        self.provider = SimulatedProvider()
+        self.provider.simulation = self
+        self.provider.polling_policy = policy
+        self.provider.scheduler = self
+        self.provider.invoke_lambda = self.invoke_lambda
+        self.provider.pending_waits = (
+            pending_waits.InMemoryWaitStore() if fan_in else None
+        )
+
+    def call_later(self, delay: float, function: Callable, *args):
+        if self.billed_waits:
+            self.result.billed_seconds += delay
+        self.events.call_later(delay, function, *args)
+
+    def invoke_lambda(self, payload: bytes):
+        self.invoke(json.loads(payload))
+
+    def invoke(self, request: dict):
+        self.result.invocations += 1
+        self.result.billed_seconds += self.overhead
+        if "PendingWaits" in request:
+            pending_waits.poll(
+                self.provider.pending_waits,
+                request["PendingWaits"]["Region"],
+                {"Custom::VerifiedIdentity": self.provider},
+                {},
+            )
+        else:
+            with request_cache.scope():
+                self.provider.copy().handle(request, {})
+
+    def complete(self, provider):
+        verified_at = self.verification.verified_at[provider.identity]
+        self.result.delays.append(self.events.clock.now() - verified_at)
+
+    def request(self, identity: str) -> dict:
+        return {
+            "RequestType": "Create",
+            "ResourceType": "Custom::VerifiedIdentity",
+            "ResponseURL": "https://response.example.com/",
+            "StackId": "arn:aws:cloudformation:eu-west-1:123456789012:stack/sim/guid",
+            "RequestId": str(uuid.uuid4()),
+            "LogicalResourceId": "VerifiedIdentity",
+            "ResourceProperties": {
+                "ServiceToken": "arn:aws:lambda:eu-west-1:123456789012:function:sim",
+                "Identity": identity,
+                "Region": self.region,
+            },
+        }
+
+    def run(self, verification_times: List[float]) -> SimulationResult:
+        for i, verification_time in enumerate(verification_times):
+            identity = f"identity-{i}.example.com"
+            self.verification.verified_at[identity] = verification_time
+            self.events.call_at(0.0, self.invoke, self.request(identity))
+
+        fake = fake_aws.FakeAWS(
+            {"ses.GetIdentityVerificationAttributes": self.verification}
+        )
+        with fake_aws.scope(fake):
+            self.events.run()
+        self.result.resources = len(verification_times)
+        self.result.ses_calls = fake.call_counts().get("ses", 0)
+        return self.result
+
+
+def simulate(
+    policies: List[str],
+    resources: int,
+    distribution: str,
+    overhead: float = 0.1,
+    billed_waits: bool = True,
+    seed: int = 1,
+    fan_in: bool = False,
+) -> List[SimulationResult]:
+    """
+    simulates each of the `policies` for the same verification times of `resources`.
+    """
+    generator = random.Random(seed)
+    verification_time = create_distribution(distribution)
+    times = [verification_time(generator) for _ in range(resources)]
+    return [
+        Simulation(
+            polling.create_policy(
+                p, "Custom::VerifiedIdentity", polling.VerificationTimes()
+            ),
+            overhead,
+            billed_waits,
+            fan_in,
+        ).run(times)
+        for p in policies
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="simulate polling policies")
+    parser.add_argument("--resources", type=int, default=100)
+    parser.add_argument("--verification", default="lognormal:120,1")
+    parser.add_argument("--policy", action="append", dest="policies")
+    parser.add_argument(
+        "--overhead", type=float, default=0.1, help="billed seconds per invocation"
+    )
+    parser.add_argument(
+        "--unbilled-waits",
+        action="store_true",
+        help="do not bill the polling intervals, as in server mode",
+    )
+    parser.add_argument(
+        "--fan-in", action="store_true", help="poll the pending waits with one poller"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="report as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        results = simulate(
+            args.policies if args.policies else DEFAULT_POLICIES,
+            args.resources,
+            args.verification,
+            args.overhead,
+            not args.unbilled_waits,
+            args.seed,
+            args.fan_in,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.json:
+        print(json.dumps([r.to_dict() for r in results], indent=2))
+    else:
+        for r in map(lambda r: r.to_dict(), results):
+            print(
+                f'{r["policy"]:24} {r["invocations"]:7d} invocations '
+                f'{r["billed_seconds"]:10.1f} billed seconds {r["ses_calls"]:7d} SES calls  '
+                f'delay p50 {r["delay_p50_s"]:6.1f}s p90 {r["delay_p90_s"]:6.1f}s '
+                f'max {r["delay_max_s"]:6.1f}s'
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
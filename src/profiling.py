@@ -0,0 +1,165 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import List, Optional
+
+log = logging.getLogger()
+
+
+class ProfileReport(object):
+    """
+    the hot functions and allocation sites of a profiled request.
+    """
+
+    def __init__(self, resource_type: str, phase: str):
+        self.resource_type = resource_type
+        self.phase = phase
+        self.functions: List[dict] = []
+        self.allocations: List[dict] = []
+        self.peak_memory: Optional[int] = None
+        self.files: List[str] = []
+
+    def to_dict(self) -> dict:
+        result = {"profile": {"ResourceType": self.resource_type, "Phase": self.phase}}
+        if self.functions:
+            result["profile"]["functions"] = self.functions
+        if self.allocations:
+            result["profile"]["allocations"] = self.allocations
+            result["profile"]["peak_memory"] = self.peak_memory
+        if self.files:
+            result["profile"]["files"] = self.files
+        return result
+
+
+class Profiler(object):
+    """
+    profiles a request with cProfile and/or tracemalloc, and logs the `top` hot
+    functions and allocation sites. If `directory` is set, the raw profile and memory
+    snapshot are written there as well. Note that cProfile only profiles the calling
+    thread. Concurrent requests share tracemalloc, which is stopped when the last
+    of them is done.
+    """
+
+    def __init__(self, cpu: bool, memory: bool, top: int = 20, directory: str = None):
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._tracing = 0
+        self._started_tracemalloc = False
+
+    def start_tracemalloc(self):
+        with self._lock:
+            if self._tracing == 0:
+                self._started_tracemalloc = not tracemalloc.is_tracing()
+                if self._started_tracemalloc:
+                    tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._tracing += 1
+
+    def stop_tracemalloc(self):
+        with self._lock:
+            self._tracing -= 1
+            if self._tracing == 0 and self._started_tracemalloc:
+                tracemalloc.stop()
+
+    def filename(self, report: ProfileReport, extension: str) -> str:
+        name = re.sub(
+            r"[^A-Za-z0-9_.-]+",
+            "-",
+            f"{report.resource_type}-{report.phase}-{int(time.time() * 1000)}",
+        )
+        return os.path.join(self.directory, f"{name}.{extension}")
+
+    @contextmanager
+    def profile(self, resource_type: str = None, phase: str = None):
+        report = ProfileReport(resource_type, phase)
+        profile = cProfile.Profile() if self.cpu else None
+        if self.memory:
+            self.start_tracemalloc()
+        if profile:
+            profile.enable()
+        try:
+            yield report
+        finally:
+            if profile:
+                profile.disable()
+                self.report_functions(report, profile)
+            if self.memory:
+                try:
+                    self.report_allocations(report)
+                finally:
+                    self.stop_tracemalloc()
+            log.info(json.dumps(report.to_dict()))
+
+    def report_functions(self, report: ProfileReport, profile: cProfile.Profile):
+        stats = pstats.Stats(profile)
+        hot = sorted(stats.stats.items(), key=lambda s: s[1][3], reverse=True)
+        for (filename, line, function), (_, calls, total, cumulative, _) in hot[
+            : self.top
+        ]:
+            report.functions.append(
+                {
+                    "function": f"{filename}:{line}({function})",
+                    "calls": calls,
+                    "total_ms": round(total * 1000, 3),
+                    "cumulative_ms": round(cumulative * 1000, 3),
+                }
+            )
+        if self.directory:
+            filename = self.filename(report, "prof")
+            stats.dump_stats(filename)
+            report.files.append(filename)
+
+    def report_allocations(self, report: ProfileReport):
+        snapshot = tracemalloc.take_snapshot()
+        report.peak_memory = tracemalloc.get_traced_memory()[1]
+        for statistic in snapshot.statistics("lineno")[: self.top]:
+            frame = statistic.traceback[0]
+            report.allocations.append(
+                {
+                    "site": f"{frame.filename}:{frame.lineno}",
+                    "size": statistic.size,
+                    "count": statistic.count,
+                }
+            )
+        if self.directory:
+            filename = self.filename(report, "tracemalloc")
+            snapshot.dump(filename)
+            report.files.append(filename)
+
+
+class NoProfiler(object):
+    @contextmanager
+    def profile(self, resource_type: str = None, phase: str = None):
+        yield None
+
+
+def create_profiler(setting: str = None, top: int = None, directory: str = None):
+    """
+    creates the profiler configured by `setting` or the environment variable PROFILE:
+    `none` (default), `cprofile`, `tracemalloc` or `cprofile,tracemalloc`. The number of
+    functions and allocation sites reported is read from PROFILE_TOP, and the directory
+    to write the raw profiles to from PROFILE_DIRECTORY.
+    """
+    if setting is None:
+        setting = os.getenv("PROFILE", "none")
+    if top is None:
+        top = int(os.getenv("PROFILE_TOP", "20"))
+    if directory is None:
+        directory = os.getenv("PROFILE_DIRECTORY")
+
+    profilers = set(filter(None, setting.split(",")))
+    if not profilers or profilers == {"none"}:
+        return NoProfiler()
+    if not profilers.issubset({"cprofile", "tracemalloc"}):
+        raise ValueError(f"unsupported PROFILE {setting}")
+    return Profiler("cprofile" in profilers, "tracemalloc" in profilers, top, directory)
@@ -0,0 +1,246 @@
+import logging
+import os
+from typing import List, Tuple
+
+from botocore.exceptions import ClientError
+
+from aws_clients import get_client
+from base_provider import BaseProvider
+from worker_pool import RateLimiter
+
+request_schema = {
+    "type": "object",
+    "required": ["RuleSetName", "Region"],
+    "properties": {
+        "RuleSetName": {"type": "string", "description": "of the receipt rule set"},
+        "Region": {"type": "string", "description": "of the receipt rule set"},
+        "Rules": {
+            "type": "array",
+            "description": "of the rule set, in the order in which they are applied",
+            "default": [],
+            "items": {
+                "type": "object",
+                "required": ["Name"],
+                "properties": {
+                    "Name": {"type": "string"},
+                    "Enabled": {"type": "boolean"},
+                    "TlsPolicy": {"type": "string", "enum": ["Require", "Optional"]},
+                    "Recipients": {"type": "array", "items": {"type": "string"}},
+                    "Actions": {"type": "array", "items": {"type": "object"}},
+                    "ScanEnabled": {"type": "boolean"},
+                },
+            },
+        },
+    },
+}
+
+# the values of the properties of a receipt rule which SES omits
+RULE_DEFAULTS = {
+    "Enabled": False,
+    "TlsPolicy": "Optional",
+    "Recipients": [],
+    "Actions": [],
+    "ScanEnabled": False,
+}
+
+# the seconds an invocation keeps after the last change, to send the response before
+# it times out
+RESPONSE_MARGIN_IN_SECONDS = 5
+
+
+class ReceiptRuleSetProvider(BaseProvider):
+    """
+    manages a receipt rule set and all of its rules. On update, only the rules which
+    differ from the rules in SES are changed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.request_schema = request_schema
+        self._ses = None
+        self.requests_per_second = float(
+            os.getenv("RECEIPT_RULE_REQUESTS_PER_SECOND", "1")
+        )
+
+    def convert_property_types(self):
+        for rule in self.get("Rules", []):
+            if isinstance(rule, dict):
+                for name in ["Enabled", "ScanEnabled"]:
+                    if rule.get(name) in ["true", "false"]:
+                        rule[name] = rule[name] == "true"
+
+    @property
+    def rule_set_name(self):
+        return self.get("RuleSetName")
+
+    @property
+    def old_rule_set_name(self):
+        return self.get_old("RuleSetName", self.rule_set_name)
+
+    @property
+    def region(self):
+        return self.get("Region")
+
+    @property
+    def old_region(self):
+        return self.get_old("Region", self.region)
+
+    @property
+    def rules(self) -> List[dict]:
+        return self.get("Rules", [])
+
+    @property
+    def ses(self):
+        if not self._ses or self._ses.meta.region_name != self.region:
+            self._ses = get_client("ses", region_name=self.region)
+        return self._ses
+
+    def is_valid_request(self):
+        if not super().is_valid_request():
+            return False
+        names = [rule["Name"] for rule in self.rules]
+        duplicates = sorted(set(n for n in names if names.count(n) > 1))
+        if duplicates:
+            self.fail(f"duplicate receipt rule names {', '.join(duplicates)}")
+            return False
+        return True
+
+    def describe_rules(self) -> List[dict]:
+        response = self.ses.describe_receipt_rule_set(RuleSetName=self.rule_set_name)
+        return response.get("Rules", [])
+
+    def apply(self, current: List[dict]):
+        changes = rule_set_changes(self.rule_set_name, current, self.rules)
+        rate_limiter = RateLimiter(self.requests_per_second)
+        counts = {"Created": 0, "Updated": 0, "Deleted": 0, "Reordered": 0}
+        for i, (method, kwargs) in enumerate(changes):
+            rate_limiter.acquire()
+            remaining = self.remaining_time
+            if remaining is not None and remaining < RESPONSE_MARGIN_IN_SECONDS:
+                self.fail(
+                    f"applied only {i} of {len(changes)} changes to receipt rule set {self.rule_set_name} in {self.region} before the function times out, raise its timeout or RECEIPT_RULE_REQUESTS_PER_SECOND"
+                )
+                return
+            getattr(self.ses, method)(**kwargs)
+            counts[CHANGE_COUNTS[method]] += 1
+
+        logging.info(
+            f"applied {len(changes)} changes to receipt rule set {self.rule_set_name} in {self.region}, {counts}"
+        )
+        self.physical_resource_id = f"{self.rule_set_name}@{self.region}"
+        self.set_attribute("RuleSetName", self.rule_set_name)
+        for name, count in counts.items():
+            self.set_attribute(name, count)
+
+    def create_rule_set(self):
+        try:
+            self.ses.create_receipt_rule_set(RuleSetName=self.rule_set_name)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "AlreadyExists":
+                raise
+            self.fail(
+                f"receipt rule set {self.rule_set_name} already exists in region {self.region}"
+            )
+            return
+        # a failure to apply the rules deletes the new rule set
+        self.physical_resource_id = f"{self.rule_set_name}@{self.region}"
+        self.apply([])
+
+    def create(self):
+        self.create_rule_set()
+
+    def update(self):
+        if (
+            self.rule_set_name != self.old_rule_set_name
+            or self.region != self.old_region
+        ):
+            self.create_rule_set()
+        else:
+            self.apply(self.describe_rules())
+
+    def delete(self):
+        if self.physical_resource_id != f"{self.rule_set_name}@{self.region}":
+            logging.warning(
+                f"silently ignoring delete request of receipt rule set with physical resource id {self.physical_resource_id}"
+            )
+            return
+        try:
+            self.ses.delete_receipt_rule_set(RuleSetName=self.rule_set_name)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "RuleSetDoesNotExist":
+                raise
+
+
+CHANGE_COUNTS = {
+    "delete_receipt_rule": "Deleted",
+    "update_receipt_rule": "Updated",
+    "create_receipt_rule": "Created",
+    "reorder_receipt_rule_set": "Reordered",
+}
+
+
+def normalized(rule: dict) -> dict:
+    return {**RULE_DEFAULTS, **rule}
+
+
+def rule_set_changes(
+    rule_set_name: str, current: List[dict], desired: List[dict]
+) -> List[Tuple[str, dict]]:
+    """
+    returns the SES calls, as (method name, arguments), required to change the rules of
+    `rule_set_name` from `current` to `desired`. Rules which are no longer desired are
+    deleted, changed rules updated, and new rules created after their predecessor in
+    `desired`. If the resulting order still differs, the rule set is reordered in a
+    single call.
+    """
+    result = []
+    desired_names = [rule["Name"] for rule in desired]
+    current_rules = {rule["Name"]: rule for rule in current}
+
+    order = []
+    for rule in current:
+        if rule["Name"] in desired_names:
+            order.append(rule["Name"])
+        else:
+            result.append(
+                (
+                    "delete_receipt_rule",
+                    {"RuleSetName": rule_set_name, "RuleName": rule["Name"]},
+                )
+            )
+
+    for rule in desired:
+        name = rule["Name"]
+        if name in current_rules and normalized(current_rules[name]) != normalized(
+            rule
+        ):
+            result.append(
+                ("update_receipt_rule", {"RuleSetName": rule_set_name, "Rule": rule})
+            )
+
+    for i, rule in enumerate(desired):
+        if rule["Name"] in current_rules:
+            continue
+        kwargs = {"RuleSetName": rule_set_name, "Rule": rule}
+        if i > 0:
+            kwargs["After"] = desired_names[i - 1]
+            order.insert(order.index(desired_names[i - 1]) + 1, rule["Name"])
+        else:
+            order.insert(0, rule["Name"])
+        result.append(("create_receipt_rule", kwargs))
+
+    if order != desired_names:
+        result.append(
+            (
+                "reorder_receipt_rule_set",
+                {"RuleSetName": rule_set_name, "RuleNames": desired_names},
+            )
+        )
+    return result
+
+
+provider = ReceiptRuleSetProvider()
+
+
+def handler(request, context):
+    return provider.copy().handle(request, context)
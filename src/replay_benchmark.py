@@ -0,0 +1,195 @@
+"""
+replays a corpus of recorded CloudFormation requests through `ses.handler`, against
+fake AWS clients answering with recorded responses. Reports the latency percentiles,
+AWS API calls and peak allocated bytes per request, and fails when a scenario exceeds
+its API call budget.
+
+usage: python src/replay_benchmark.py [--iterations N] corpus.json...
+"""
+
+import argparse
+import json
+import logging
+import math
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, NamedTuple
+
+import fake_aws
+import metrics
+import ses
+
+
+class Scenario(NamedTuple):
+    name: str
+    request: dict
+    responses: dict
+    budget: dict
+    expect: str
+
+
+class ScenarioResult(object):
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+        self.latencies: List[float] = []
+        self.calls = {}
+        self.peak_bytes = 0
+        self.violations: List[str] = []
+
+    def percentile(self, p: float) -> float:
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return 0.0
+        return latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)]
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.scenario.name,
+            "p50_ms": round(self.percentile(50), 3),
+            "p90_ms": round(self.percentile(90), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(max(self.latencies, default=0.0), 3),
+            "calls": self.calls,
+            "peak_bytes": self.peak_bytes,
+            "violations": self.violations,
+        }
+
+
+def load_corpus(filename: str) -> List[Scenario]:
+    """
+    reads the scenarios from `filename`. The `responses` at the top level are the
+    defaults for all scenarios.
+    """
+    with open(filename) as f:
+        corpus = json.load(f)
+
+    result = []
+    for scenario in corpus["scenarios"]:
+        responses = deepcopy(corpus.get("responses", {}))
+        responses.update(scenario.get("responses", {}))
+        result.append(
+            Scenario(
+                scenario["name"],
+                scenario["request"],
+                responses,
+                scenario.get("budget", {}),
+                scenario.get("expect", "SUCCESS"),
+            )
+        )
+    return result
+
+
+class ResponseServer(object):
+    """
+    a local endpoint accepting the responses sent to the ResponseURL.
+    """
+
+    def __init__(self):
+        class Handler(BaseHTTPRequestHandler):
+            def do_PUT(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://%s:%d/" % self.server.server_address
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_once(scenario: Scenario, response_url: str):
+    request = deepcopy(scenario.request)
+    request["RequestId"] = str(uuid.uuid4())
+    request["ResponseURL"] = response_url
+    with fake_aws.scope(fake_aws.FakeAWS(scenario.responses)) as fake:
+        response = ses.handler(request, {})
+    return response, fake.call_counts()
+
+
+def replay(scenario: Scenario, response_url: str, iterations: int = 20):
+    """
+    replays `scenario` once to warm up, once to trace the allocations and `iterations`
+    times to measure the latency.
+    """
+    result = ScenarioResult(scenario)
+    run_once(scenario, response_url)
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        run_once(scenario, response_url)
+        result.peak_bytes = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response, calls = run_once(scenario, response_url)
+        result.latencies.append((time.perf_counter() - start) * 1000)
+        for key, count in calls.items():
+            result.calls[key] = max(result.calls.get(key, 0), count)
+
+        if response["Status"] != scenario.expect:
+            result.violations.append(
+                f'expected {scenario.expect}, got {response["Status"]}: {response.get("Reason")}'
+            )
+            break
+
+    total = sum(count for key, count in result.calls.items() if "." not in key)
+    for key, budget in scenario.budget.items():
+        count = total if key == "total" else result.calls.get(key, 0)
+        if count > budget:
+            result.violations.append(f"{count} {key} calls exceed budget of {budget}")
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="replay recorded requests")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="report as JSON")
+    parser.add_argument("corpus", nargs="+")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    metrics.default_sink = metrics.NoSink()
+
+    results = []
+    with ResponseServer() as server:
+        for filename in args.corpus:
+            for scenario in load_corpus(filename):
+                results.append(replay(scenario, server.url, args.iterations))
+
+    if args.json:
+        print(json.dumps([r.to_dict() for r in results], indent=2))
+    else:
+        for r in map(lambda r: r.to_dict(), results):
+            calls = ", ".join(
+                f"{k}={v}" for k, v in sorted(r["calls"].items()) if "." not in k
+            )
+            print(
+                f'{r["name"]:45} p50 {r["p50_ms"]:8.3f}ms p90 {r["p90_ms"]:8.3f}ms '
+                f'p99 {r["p99_ms"]:8.3f}ms {r["peak_bytes"]:9d} bytes  {calls}'
+            )
+            for violation in r["violations"]:
+                print(f"  FAILED: {violation}")
+
+    return 1 if any(r.violations for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import contextvars
+import json
+import threading
+from contextlib import contextmanager
+from copy import deepcopy
+from typing import Optional
+
+READ_OPERATION_PREFIXES = ("List", "Get", "Describe")
+
+
+class RequestCache(object):
+    """
+    read-through cache of AWS read operation responses. Any other operation
+    invalidates all cached responses. A cache with a `parent` falls back on the
+    responses of the parent until it is invalidated, so that the requests of a batch
+    share the reads made for the batch.
+    """
+
+    def __init__(self, parent: "RequestCache" = None):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self._responses = {}
+        self._invalidated = False
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._responses.get(key)
+            parent = None if self._invalidated else self.parent
+        if entry is None and parent is not None:
+            return parent.lookup(key)
+        return entry
+
+    def get(self, key):
+        entry = self.lookup(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        http_response, parsed = entry
+        return http_response, deepcopy(parsed)
+
+    def put(self, key, http_response, parsed):
+        with self._lock:
+            self._responses[key] = (http_response, deepcopy(parsed))
+
+    def seed(
+        self, service_name, region_name, operation_name, params, parsed, namespace=""
+    ):
+        """
+        adds the `parsed` response of a read which was made by other means, for
+        instance a batched call covering several single-identity reads.
+        """
+        key = cache_key(service_name, region_name, operation_name, params, namespace)
+        self.put(key, _CachedResponse(), parsed)
+
+    def invalidate(self):
+        with self._lock:
+            self._responses.clear()
+            self._invalidated = True
+
+
+class _CachedResponse(object):
+    status_code = 200
+
+
+_active: contextvars.ContextVar = contextvars.ContextVar("request_cache", default=None)
+
+
+def active() -> Optional[RequestCache]:
+    return _active.get()
+
+
+@contextmanager
+def scope(cache: Optional[RequestCache] = None):
+    """
+    activates a request cache for the duration of the block.
+    """
+    token = _active.set(cache if cache is not None else RequestCache())
+    try:
+        yield _active.get()
+    finally:
+        _active.reset(token)
+
+
+def is_read_operation(operation_name: str) -> bool:
+    return operation_name.startswith(READ_OPERATION_PREFIXES)
+
+
+def cache_key(service_name, region_name, operation_name, params, namespace=""):
+    return (
+        namespace,
+        service_name,
+        region_name,
+        operation_name,
+        json.dumps(params, sort_keys=True, default=str),
+    )
+
+
+def register(events, namespace: str = ""):
+    """
+    registers the cache handlers on the event system of a botocore client. Responses
+    are only cached while a request cache is active.
+    """
+
+    def before_parameter_build(params, model, context, **kwargs):
+        cache = active()
+        if cache is None:
+            return
+        if not is_read_operation(model.name):
+            cache.invalidate()
+            return
+        context["request_cache_key"] = cache_key(
+            model.service_model.service_name,
+            context.get("client_region"),
+            model.name,
+            params,
+            namespace,
+        )
+
+    def before_call(context, **kwargs):
+        cache = active()
+        key = context.get("request_cache_key")
+        if cache is None or key is None:
+            return None
+        response = cache.get(key)
+        if response is not None:
+            context["request_cache_hit"] = True
+        return response
+
+    def after_call(http_response, parsed, context, **kwargs):
+        cache = active()
+        key = context.get("request_cache_key")
+        if (
+            cache is None
+            or key is None
+            or context.get("request_cache_hit")
+            or http_response.status_code >= 300
+        ):
+            return
+        cache.put(key, http_response, parsed)
+
+    events.register_first(
+        "before-parameter-build.*.*",
+        before_parameter_build,
+        unique_id="request-cache-before-parameter-build",
+    )
+    events.register_first(
+        "before-call.*.*", before_call, unique_id="request-cache-before-call"
+    )
+    events.register_last(
+        "after-call.*.*", after_call, unique_id="request-cache-after-call"
+    )
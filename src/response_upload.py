@@ -0,0 +1,80 @@
+import json
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+connect_timeout = float(os.getenv("RESPONSE_CONNECT_TIMEOUT", "3.05"))
+read_timeout = float(os.getenv("RESPONSE_READ_TIMEOUT", "10"))
+
+
+def create_session(max_retries: int = None, pool_maxsize: int = 16) -> requests.Session:
+    """
+    creates a session keeping the connections to the response endpoint alive. Uploads
+    failing on a connection error or a 5xx status are retried `max_retries` times, with
+    exponential backoff.
+    """
+    if max_retries is None:
+        max_retries = int(os.getenv("RESPONSE_MAX_RETRIES", "3"))
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.2,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["PUT"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry, pool_connections=4, pool_maxsize=pool_maxsize
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = create_session()
+
+
+def put_response(url: str, response: dict) -> int:
+    """
+    uploads the CloudFormation `response` to the pre-signed `url`, and records the
+    latency and retries of the upload. Returns the number of retries.
+    """
+    body = json.dumps(response).encode("utf-8")
+    start = time.perf_counter()
+    try:
+        r = session.put(
+            url,
+            data=body,
+            headers={"content-type": ""},
+            timeout=(connect_timeout, read_timeout),
+        )
+    except requests.RequestException:
+        record(time.perf_counter() - start, error=True)
+        raise
+
+    retries = retry_count(r)
+    record(time.perf_counter() - start, retries, r.status_code != 200)
+    if r.status_code != 200:
+        raise Exception(
+            "failed to put the response to %s status code %d, %s"
+            % (url, r.status_code, r.text)
+        )
+    return retries
+
+
+def retry_count(r: requests.Response) -> int:
+    retries = getattr(getattr(r, "raw", None), "retries", None)
+    return len(retries.history) if retries else 0
+
+
+def record(latency: float, retries: int = 0, error: bool = False):
+    recorder = metrics.active()
+    if recorder is not None:
+        recorder.record_call(
+            "cloudformation", "SendResponse", latency * 1000, retries, error
+        )
@@ -0,0 +1,311 @@
+"""
+runs the providers as a long-lived process, for instance as an ECS service. The requests
+are received over HTTP as signed SNS notifications, or polled from an SQS queue, and are
+handled concurrently by `ses.handler`. All requests share the clients, caches and
+validators of the process.
+
+usage: python src/server.py [--port 8080 [--topic-arn ARN] | --queue-url URL]
+                            [--max-workers 16]
+"""
+
+import argparse
+import contextvars
+import functools
+import json
+import logging
+import math
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+import requests
+
+import clock
+import ses
+import sns_signature
+from aws_clients import get_client
+
+log = logging.getLogger()
+
+reinvoking_modules = [
+    ses.verified_identity_provider,
+    ses.verified_mail_from_domain_provider,
+]
+
+# the maximum delay of an SQS message
+MAX_DELAY_IN_SECONDS = 900
+
+
+class Server(object):
+    """
+    handles requests on a pool of `max_workers` threads. Requests received while all
+    workers are busy wait for a worker to become available. Each request is handled in
+    a fresh context, so that no request cache, metrics or trace scope of the submitter
+    leaks into it. The server schedules the reinvocations of the providers, without
+    holding on to a worker while they wait.
+    """
+
+    def __init__(self, max_workers: int = 16, handler: Callable = None):
+        self.handler = handler if handler else ses.handler
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="request")
+        self.capacity = threading.BoundedSemaphore(max_workers)
+        self.stopped = threading.Event()
+        self.clock = clock.SystemClock()
+
+    def submit(
+        self, request: dict, on_success: Callable = None, wait: bool = True
+    ) -> Future:
+        """
+        handles `request` on a worker. If `wait` is true, waits until a worker is available.
+        `on_success` is called after the request is handled without exception, in the
+        context of the caller.
+        """
+        if wait:
+            self.capacity.acquire()
+        if on_success:
+            on_success = functools.partial(contextvars.copy_context().run, on_success)
+        return self.executor.submit(
+            contextvars.Context().run, self.handle, request, on_success, wait
+        )
+
+    def handle(self, request: dict, on_success: Optional[Callable], release: bool):
+        try:
+            response = self.handler(request, {})
+            if on_success:
+                on_success()
+            return response
+        except Exception:
+            log.exception("failed to handle request %s", request.get("RequestId"))
+        finally:
+            if release:
+                self.capacity.release()
+
+    def reinvoke(self, payload: bytes):
+        """
+        handles the reinvocation of a provider waiting for completion. It does not wait
+        for a worker, as it is called from a worker.
+        """
+        self.submit(json.loads(payload), wait=False)
+
+    def call_later(self, delay: float, function: Callable, *args):
+        """
+        calls `function` after `delay` seconds on a timer thread.
+        """
+        timer = threading.Timer(delay, function, args)
+        timer.daemon = True
+        timer.start()
+
+    def install(self):
+        """
+        directs the reinvocations of the providers to this server, instead of Lambda.
+        """
+        for module in reinvoking_modules:
+            module.provider.invoke_lambda = self.reinvoke
+            module.provider.scheduler = self
+
+    def stop(self):
+        self.stopped.set()
+
+    def shutdown(self):
+        """
+        waits for the requests in progress to complete.
+        """
+        self.executor.shutdown(wait=True)
+
+
+class HTTPServer(Server):
+    """
+    accepts SNS notifications of requests with a POST on `port`, and answers 202 before
+    handling them. Only messages signed by SNS, and with `topic_arns` only those of these
+    topics, are accepted; others are answered with 403. SNS subscriptions are confirmed.
+    GET / answers 200 as health check.
+    """
+
+    def __init__(
+        self,
+        port: int = 8080,
+        max_workers: int = 16,
+        handler=None,
+        topic_arns: List[str] = None,
+    ):
+        super().__init__(max_workers, handler)
+        self.topic_arns = topic_arns
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.respond(200)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    message = json.loads(body)
+                    if not server.is_trusted(message):
+                        self.respond(403)
+                        return
+                    if message["Type"] == "SubscriptionConfirmation":
+                        server.confirm_subscription(message)
+                        self.respond(200)
+                        return
+                    if message["Type"] != "Notification":
+                        self.respond(200)
+                        return
+                    request = json.loads(message["Message"])
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    log.error("invalid request received, %s", e)
+                    self.respond(400)
+                    return
+                except requests.RequestException as e:
+                    log.error("failed to confirm the subscription, %s", e)
+                    self.respond(502)
+                    return
+
+                server.submit(request)
+                self.respond(202)
+
+            def respond(self, status: int):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                log.debug(format, *args)
+
+        self.http_server = ThreadingHTTPServer(("", port), Handler)
+        self.port = self.http_server.server_address[1]
+
+    def is_trusted(self, message) -> bool:
+        """
+        returns true if `message` is signed by SNS, and sent by one of the `topic_arns`.
+        """
+        if not isinstance(message, dict):
+            return False
+        if self.topic_arns and message.get("TopicArn") not in self.topic_arns:
+            log.warning("rejected message of topic %s", message.get("TopicArn"))
+            return False
+        if not sns_signature.verify(message):
+            log.warning(
+                "rejected message %s without valid signature", message.get("MessageId")
+            )
+            return False
+        return True
+
+    def confirm_subscription(self, message: dict):
+        """
+        confirms the subscription of `message`, only with an SNS endpoint.
+        """
+        url = message["SubscribeURL"]
+        if not sns_signature.is_sns_url(url):
+            raise ValueError(f"SubscribeURL {url} is not an SNS endpoint")
+        requests.get(url, timeout=10).raise_for_status()
+
+    def run(self):
+        log.info("listening on port %d", self.port)
+        self.http_server.serve_forever()
+        self.shutdown()
+
+    def stop(self):
+        super().stop()
+        threading.Thread(target=self.http_server.shutdown).start()
+
+
+class SQSPoller(Server):
+    """
+    polls the queue `queue_url` for requests, and deletes each message after it is
+    handled. Reinvocations are sent to the queue, delayed by the wait of the provider,
+    so that a provider waiting for completion survives a restart of the process.
+    """
+
+    def __init__(self, queue_url: str, max_workers: int = 16, handler=None):
+        super().__init__(max_workers, handler)
+        self.queue_url = queue_url
+        self.sqs = get_client("sqs")
+
+    def reinvoke(self, payload: bytes, delay: float = 0):
+        self.sqs.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=payload.decode("utf-8"),
+            DelaySeconds=min(MAX_DELAY_IN_SECONDS, math.ceil(delay)),
+        )
+
+    def call_later(self, delay: float, function: Callable, *args):
+        """
+        sends a reinvocation to the queue with a delay of `delay` seconds, instead of
+        waiting for it.
+        """
+        if function == self.reinvoke:
+            self.reinvoke(*args, delay=delay)
+        else:
+            super().call_later(delay, function, *args)
+
+    def delete(self, receipt_handle: str):
+        self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt_handle)
+
+    def poll_once(self) -> int:
+        """
+        receives at most 10 messages and submits them. Returns the number of messages.
+        """
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(10, self.max_workers),
+            WaitTimeSeconds=20,
+        )
+        messages = response.get("Messages", [])
+        for message in messages:
+            receipt_handle = message["ReceiptHandle"]
+            try:
+                request = ses.parse_message(message["Body"])
+            except ValueError as e:
+                log.error("invalid message %s received, %s", message["MessageId"], e)
+                continue
+            self.submit(request, lambda r=receipt_handle: self.delete(r))
+        return len(messages)
+
+    def run(self):
+        log.info("polling %s", self.queue_url)
+        while not self.stopped.is_set():
+            try:
+                self.poll_once()
+            except Exception:
+                log.exception("failed to receive messages from %s", self.queue_url)
+                self.stopped.wait(5)
+        self.shutdown()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="serve custom resource requests")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "0")))
+    parser.add_argument("--queue-url", default=os.getenv("SERVER_QUEUE_URL"))
+    parser.add_argument(
+        "--topic-arn",
+        action="append",
+        default=list(filter(None, os.getenv("SERVER_TOPIC_ARNS", "").split(","))),
+        help="of the SNS topics from which notifications are accepted, default any",
+    )
+    parser.add_argument(
+        "--max-workers", type=int, default=int(os.getenv("SERVER_MAX_WORKERS", "16"))
+    )
+    args = parser.parse_args(argv)
+    if bool(args.port) == bool(args.queue_url):
+        parser.error("specify either --port or --queue-url")
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    if args.queue_url:
+        server = SQSPoller(args.queue_url, args.max_workers)
+    else:
+        server = HTTPServer(args.port, args.max_workers, topic_arns=args.topic_arn)
+    server.install()
+
+    signal.signal(signal.SIGTERM, lambda *_: server.stop())
+    signal.signal(signal.SIGINT, lambda *_: server.stop())
+    server.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
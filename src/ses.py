@@ -1,36 +1,239 @@
 import os
+import json
 import logging
 import cfn_dkim_provider
 import dkim_tokens_provider
 import domain_identity_provider
 import mail_from_domain_provider
 import active_rule_set_provider
+import receipt_rule_set_provider
 import verified_identity_provider
 import verified_mail_from_domain_provider
 import identity_notifications_provider
 import identity_policy_provider
+import caller_identity
+import idempotency
+import metrics
+import pending_waits
+import profiling
+import request_cache
+import tracing
+import aws_clients
+from aws_clients import get_client
+from worker_pool import run_concurrently
 
+store = idempotency.create_store()
+profiler = profiling.create_profiler()
+batch_max_workers = int(os.getenv("BATCH_MAX_WORKERS", "16"))
 
-def handler(request, context):
+provider_modules = [
+    cfn_dkim_provider,
+    dkim_tokens_provider,
+    domain_identity_provider,
+    mail_from_domain_provider,
+    active_rule_set_provider,
+    receipt_rule_set_provider,
+    verified_identity_provider,
+    verified_mail_from_domain_provider,
+    identity_notifications_provider,
+    identity_policy_provider,
+]
+
+
+def handler(request, context, parent_cache: request_cache.RequestCache = None):
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    if "PendingWaits" in request:
+        return poll_pending_waits(request["PendingWaits"]["Region"], context)
+    if request.get("source") == "aws.ses":
+        return handle_verification_event(request, context)
+    resource_type = request.get("ResourceType")
+    request_type = request.get("RequestType")
+    with profiler.profile(resource_type, request_type):
+        with tracing.trace(
+            "ses",
+            ResourceType=resource_type,
+            RequestType=request_type,
+            LogicalResourceId=request.get("LogicalResourceId"),
+        ):
+            with metrics.scope(resource_type):
+                return idempotency.handle(
+                    store,
+                    request,
+                    context,
+                    lambda r, c: dispatch(r, c, parent_cache),
+                )
+
+
+def dispatch(request, context, parent_cache: request_cache.RequestCache = None):
+    """
+    handles the request with the provider of the resource type. Returns the response and
+    whether the request was completed. The reads of the request fall back on the
+    `parent_cache` of its batch, if any, and are never shared with other requests.
+    """
+    provider = get_provider_module(request).provider.copy()
+    with request_cache.scope(request_cache.RequestCache(parent=parent_cache)):
+        response = provider.handle(request, context)
+    return response, not provider.asynchronous
+
+
+def verified_providers() -> dict:
+    return {
+        "Custom::VerifiedIdentity": verified_identity_provider.provider,
+        "Custom::VerifiedMailFromDomain": verified_mail_from_domain_provider.provider,
+    }
+
+
+def poll_pending_waits(region: str, context) -> dict:
+    """
+    checks the verification of all identities pending in `region`.
+    """
+    store = verified_identity_provider.provider.pending_waits
+    with tracing.trace("ses", PendingWaits=region):
+        with metrics.scope("PendingWaits"):
+            return pending_waits.poll(store, region, verified_providers(), context)
+
+
+def handle_verification_event(event: dict, context) -> dict:
+    """
+    completes the pending waits for the identity of an SES verification event right
+    away, instead of at the next poll.
+    """
+    store = verified_identity_provider.provider.pending_waits
+    identity = pending_waits.event_identity(event)
+    region = event.get("region", os.getenv("AWS_REGION"))
+    if store is None or not identity:
+        logging.info(
+            "ignoring %s event without pending waits", event.get("detail-type")
+        )
+        return {"Region": region, "Identity": identity, "Completed": 0, "Pending": 0}
+
+    with tracing.trace("ses", VerificationEvent=identity):
+        with metrics.scope("VerificationEvent"):
+            return pending_waits.complete(
+                store, region, identity, verified_providers(), context
+            )
+
+
+def parse_message(body) -> dict:
+    """
+    returns the message in `body`, which is either a CloudFormation request or an SNS
+    notification with a CloudFormation request as message.
+    """
+    message = json.loads(body)
+    if message.get("Type") == "Notification" and "Message" in message:
+        return json.loads(message["Message"])
+    return message
+
+
+def batch_handler(event, context):
+    """
+    handles a batch of CloudFormation requests delivered by SNS or SQS. The requests are
+    grouped by resource type, region and role. The reads of a group are made once, in batches,
+    and shared by its requests, which are handled concurrently. Returns the messages
+    which could not be handled as SQS `batchItemFailures`.
+    """
     logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    records = event.get("Records", [])
+    failures = []
+    groups = {}
+    for record in records:
+        if "Sns" in record:
+            message_id, body = record["Sns"]["MessageId"], record["Sns"]["Message"]
+        else:
+            message_id, body = record["messageId"], record["body"]
+        try:
+            request = parse_message(body)
+            properties = request.get("ResourceProperties", {})
+            key = (
+                request["ResourceType"],
+                properties.get("Region"),
+                properties.get("RoleArn"),
+            )
+        except (ValueError, KeyError, AttributeError) as e:
+            logging.error("invalid message %s received, %s", message_id, e)
+            failures.append(message_id)
+            continue
+        groups.setdefault(key, []).append((message_id, request))
+
+    caches = {key: request_cache.RequestCache() for key in groups}
+
+    def prefetch(key):
+        requests = [request for _, request in groups[key]]
+        if len(requests) > 1:
+            with request_cache.scope(caches[key]), aws_clients.role_scope(key[2]):
+                get_provider_module(requests[0]).provider.prefetch(requests)
+
+    for result in run_concurrently(prefetch, groups, batch_max_workers):
+        if result.error:
+            logging.warning(
+                "failed to prefetch the reads of %s in %s, %s",
+                *result.item[:2],
+                result.error,
+            )
+
+    def handle(item):
+        key, (message_id, request) = item
+        return handler(request, context, caches[key])
+
+    items = [(key, message) for key, messages in groups.items() for message in messages]
+    for result in run_concurrently(handle, items, batch_max_workers):
+        if result.error:
+            message_id = result.item[1][0]
+            logging.error("failed to handle message %s, %s", message_id, result.error)
+            failures.append(message_id)
+
+    if failures and any("Sns" in record for record in records):
+        # SNS retries the delivery of the whole event
+        raise RuntimeError(f"failed to handle messages {', '.join(failures)}")
+    return {"batchItemFailures": [{"itemIdentifier": f} for f in failures]}
+
+
+def get_provider_module(request):
     if request["ResourceType"] == "Custom::DkimTokens":
-        return dkim_tokens_provider.handler(request, context)
+        return dkim_tokens_provider
     elif request["ResourceType"] == "Custom::DomainIdentity":
-        return domain_identity_provider.handler(request, context)
+        return domain_identity_provider
     elif request["ResourceType"] in [
         "Custom::SESActiveReceiptRuleSet",
         "Custom::ActiveReceiptRuleSet",
     ]:
-        return active_rule_set_provider.handler(request, context)
+        return active_rule_set_provider
+    elif request["ResourceType"] == "Custom::ReceiptRuleSet":
+        return receipt_rule_set_provider
     elif request["ResourceType"] == "Custom::IdentityNotifications":
-        return identity_notifications_provider.handler(request, context)
+        return identity_notifications_provider
     elif request["ResourceType"] == "Custom::VerifiedIdentity":
-        return verified_identity_provider.handler(request, context)
+        return verified_identity_provider
     elif request["ResourceType"] == "Custom::IdentityPolicy":
-        return identity_policy_provider.handler(request, context)
+        return identity_policy_provider
     elif request["ResourceType"] == "Custom::MailFromDomain":
-        return mail_from_domain_provider.handler(request, context)
+        return mail_from_domain_provider
     elif request["ResourceType"] == "Custom::VerifiedMailFromDomain":
-        return verified_mail_from_domain_provider.handler(request, context)
+        return verified_mail_from_domain_provider
     else:
-        return cfn_dkim_provider.handler(request, context)
+        return cfn_dkim_provider
+
+
+def prime(regions):
+    """
+    does the work of a first request ahead of it: creates the shared clients for SES in
+    `regions`, Route53 and STS with their service models, compiles the request validators
+    and resolves the caller identity.
+    """
+    get_client("sts")
+    get_client("route53").get_paginator("list_resource_record_sets")
+    for region in regions:
+        get_client("ses", region_name=region).get_paginator("list_identities")
+
+    for module in provider_modules:
+        module.provider.prime()
+
+    try:
+        caller_identity.get_caller_identity()
+    except Exception as e:
+        logging.warning("failed to resolve the caller identity, %s", e)
+
+
+prime_regions = list(filter(None, os.getenv("PRIME_REGIONS", "").split(",")))
+if prime_regions:
+    prime(prime_regions)
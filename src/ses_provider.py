@@ -1,7 +1,6 @@
-import boto3
-from copy import deepcopy
-from botocore.exceptions import ClientError
-from cfn_resource_provider import ResourceProvider
+from aws_clients import get_client
+from base_provider import BaseProvider
+import tracing
 
 
 request_schema = {
@@ -15,7 +14,7 @@ request_schema = {
 }
 
 
-class SESProvider(ResourceProvider):
+class SESProvider(BaseProvider):
     def __init__(self):
         super().__init__()
         self.request_schema = request_schema
@@ -36,8 +35,23 @@ class SESProvider(ResourceProvider):
     def old_region(self):
         return self.get_old("Region", self.region)
 
-    def identity_already_exists(self) -> bool:
-        ses = boto3.client("ses", region_name=self.region)
+    def prefetch(self, requests):
+        """
+        lists the domain identities once for all `requests`. Requests for multiple
+        `Regions` have no single region to list, and are not prefetched.
+        """
+        region = requests[0].get("ResourceProperties", {}).get("Region")
+        if region and any(r["RequestType"] != "Delete" for r in requests):
+            paginator = get_client("ses", region_name=region).get_paginator(
+                "list_identities"
+            )
+            for _ in paginator.paginate(IdentityType="Domain"):
+                pass
+
+    @tracing.traced("precondition")
+    def identity_already_exists(self, ses=None) -> bool:
+        if not ses:
+            ses = get_client("ses", region_name=self.region)
         for response in ses.get_paginator("list_identities").paginate(
             IdentityType="Domain"
         ):
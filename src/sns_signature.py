@@ -0,0 +1,193 @@
+"""
+verifies the signature of SNS messages delivered over HTTP, as described in
+https://docs.aws.amazon.com/sns/latest/dg/sns-verify-signature-of-message.html. The
+signing certificate is only fetched from an SNS endpoint over HTTPS, and the RSA
+signature is checked without a cryptography library.
+"""
+
+import base64
+import functools
+import hashlib
+import logging
+import re
+from typing import List, NamedTuple, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+log = logging.getLogger()
+
+# the host names of the SNS endpoints, the only hosts from which a signing certificate
+# is fetched or a subscription is confirmed
+SNS_HOST_PATTERN = re.compile(r"^sns\.[a-z0-9-]+\.amazonaws\.com(\.cn)?$")
+
+# the keys of a message which are signed, in order, per message type
+SIGNED_KEYS = {
+    "Notification": [
+        "Message",
+        "MessageId",
+        "Subject",
+        "Timestamp",
+        "TopicArn",
+        "Type",
+    ],
+    "SubscriptionConfirmation": [
+        "Message",
+        "MessageId",
+        "SubscribeURL",
+        "Timestamp",
+        "Token",
+        "TopicArn",
+        "Type",
+    ],
+    "UnsubscribeConfirmation": [
+        "Message",
+        "MessageId",
+        "SubscribeURL",
+        "Timestamp",
+        "Token",
+        "TopicArn",
+        "Type",
+    ],
+}
+
+# the hash algorithms per SignatureVersion, with the DER encoded prefix of their
+# DigestInfo in a PKCS #1 v1.5 signature
+HASHES = {
+    "1": (hashlib.sha1, bytes.fromhex("3021300906052b0e03021a05000414")),
+    "2": (hashlib.sha256, bytes.fromhex("3031300d060960864801650304020105000420")),
+}
+
+
+class PublicKey(NamedTuple):
+    modulus: int
+    exponent: int
+
+
+def is_sns_url(url: str) -> bool:
+    """
+    returns true if `url` is an HTTPS URL of an SNS endpoint.
+    """
+    try:
+        parsed = urlparse(url)
+        return (
+            parsed.scheme == "https"
+            and parsed.port is None
+            and bool(SNS_HOST_PATTERN.match(parsed.hostname or ""))
+        )
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+def string_to_sign(message: dict) -> bytes:
+    """
+    returns the string SNS signs for `message`: the signed keys present in the
+    message, each followed by its value, one per line.
+    """
+    lines = []
+    for key in SIGNED_KEYS[message["Type"]]:
+        if key in message:
+            lines.extend([key, message[key]])
+    return "".join(f"{line}\n" for line in lines).encode("utf-8")
+
+
+def der_elements(data: bytes) -> List[Tuple[int, bytes]]:
+    """
+    returns the tag and content of the DER encoded elements in `data`.
+    """
+    result = []
+    i = 0
+    while i < len(data):
+        tag, length = data[i], data[i + 1]
+        i += 2
+        if length & 0x80:
+            size = length & 0x7F
+            length = int.from_bytes(data[i : i + size], "big")
+            i += size
+        if i + length > len(data):
+            raise ValueError("truncated DER element")
+        result.append((tag, data[i : i + length]))
+        i += length
+    return result
+
+
+def public_key(certificate: str) -> PublicKey:
+    """
+    returns the RSA public key of the PEM encoded X.509 `certificate`.
+    """
+    match = re.search(
+        r"-----BEGIN CERTIFICATE-----(.+?)-----END CERTIFICATE-----",
+        certificate,
+        re.DOTALL,
+    )
+    if not match:
+        raise ValueError("no PEM encoded certificate found")
+    (_, cert), *_ = der_elements(base64.b64decode(match.group(1)))
+    (_, tbs), *_ = der_elements(cert)
+    fields = der_elements(tbs)
+    if fields[0][0] == 0xA0:  # explicit version
+        fields = fields[1:]
+    # serialNumber, signature, issuer, validity, subject, subjectPublicKeyInfo
+    _, key_info = fields[5]
+    _, (_, bits) = der_elements(key_info)
+    (_, rsa_key), *_ = der_elements(bits[1:])
+    (_, modulus), (_, exponent) = der_elements(rsa_key)[:2]
+    return PublicKey(int.from_bytes(modulus, "big"), int.from_bytes(exponent, "big"))
+
+
+@functools.lru_cache(maxsize=16)
+def get_certificate(url: str) -> PublicKey:
+    """
+    returns the public key of the signing certificate at `url`, fetched once.
+    """
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    return public_key(response.text)
+
+
+def verify_signature(key: PublicKey, data: bytes, signature: bytes, version: str):
+    """
+    returns true if `signature` is the PKCS #1 v1.5 signature of `data` with `key`.
+    """
+    hash_function, prefix = HASHES[version]
+    size = (key.modulus.bit_length() + 7) // 8
+    if len(signature) != size:
+        return False
+    value = int.from_bytes(signature, "big")
+    if value >= key.modulus:
+        return False
+    digest_info = prefix + hash_function(data).digest()
+    expected = (
+        b"\x00\x01" + b"\xff" * (size - len(digest_info) - 3) + b"\x00" + digest_info
+    )
+    return pow(value, key.exponent, key.modulus).to_bytes(size, "big") == expected
+
+
+def verify(message: dict) -> bool:
+    """
+    returns true if `message` is signed by SNS.
+    """
+    try:
+        if message.get("Type") not in SIGNED_KEYS:
+            return False
+        if message.get("SignatureVersion") not in HASHES:
+            return False
+        if not is_sns_url(message.get("SigningCertURL")):
+            log.warning(
+                "untrusted signing certificate %s", message.get("SigningCertURL")
+            )
+            return False
+        key = get_certificate(message["SigningCertURL"])
+        signature = base64.b64decode(message["Signature"], validate=True)
+        return verify_signature(
+            key, string_to_sign(message), signature, message["SignatureVersion"]
+        )
+    except (
+        KeyError,
+        TypeError,
+        ValueError,
+        IndexError,
+        requests.RequestException,
+    ) as e:
+        log.warning("failed to verify the signature of the SNS message, %s", e)
+        return False
@@ -0,0 +1,247 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+log = logging.getLogger()
+
+
+class Span(object):
+    """
+    a timed phase of a request, with its nested phases.
+    """
+
+    def __init__(self, name: str, namespace: str = None, **annotations):
+        self.id = os.urandom(8).hex()
+        self.name = name
+        self.namespace = namespace
+        self.annotations = annotations
+        self.aws = {}
+        self.start_time = time.time()
+        self.end_time = None
+        self.error = False
+        self.children: List["Span"] = []
+        self._lock = threading.Lock()
+
+    def add_child(self, span: "Span"):
+        with self._lock:
+            self.children.append(span)
+
+    def end(self, error: bool = False):
+        self.end_time = time.time()
+        self.error = self.error or error
+
+    @property
+    def duration(self) -> float:
+        return (self.end_time or time.time()) - self.start_time
+
+    def find(self, name: str) -> List["Span"]:
+        """
+        returns all spans named `name` in this tree.
+        """
+        result = [self] if self.name == name else []
+        for child in self.children:
+            result.extend(child.find(name))
+        return result
+
+    def to_xray(self) -> dict:
+        """
+        returns the span as X-Ray subsegment document.
+        """
+        result = {
+            "id": self.id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time or time.time(),
+        }
+        if self.namespace:
+            result["namespace"] = self.namespace
+        if self.aws:
+            result["aws"] = self.aws
+        if self.error:
+            result["error"] = True
+        if self.annotations:
+            result["annotations"] = {
+                re.sub(r"[^A-Za-z0-9_]", "_", k): v
+                for k, v in self.annotations.items()
+                if isinstance(v, (str, int, float, bool))
+            }
+        if self.children:
+            result["subsegments"] = [child.to_xray() for child in self.children]
+        return result
+
+
+class XRayExporter(object):
+    """
+    sends the spans as subsegments of the Lambda function segment to the X-Ray daemon,
+    if the invocation is sampled.
+    """
+
+    def __init__(self, address: str = None):
+        address = address or os.getenv("AWS_XRAY_DAEMON_ADDRESS", "127.0.0.1:2000")
+        address = address.split(" ")[0]
+        if address.startswith("udp:"):
+            address = address[len("udp:") :]
+        host, port = address.rsplit(":", 1)
+        self.address = (host, int(port))
+
+    @staticmethod
+    def trace_header() -> dict:
+        header = os.getenv("_X_AMZN_TRACE_ID", "")
+        return dict(part.split("=", 1) for part in header.split(";") if "=" in part)
+
+    def export(self, span: Span):
+        header = self.trace_header()
+        if header.get("Sampled") != "1" or "Root" not in header:
+            return
+
+        document = span.to_xray()
+        document.update(
+            {"type": "subsegment", "trace_id": header["Root"]},
+        )
+        if "Parent" in header:
+            document["parent_id"] = header["Parent"]
+
+        message = '{"format": "json", "version": 1}\n' + json.dumps(document)
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.sendto(message.encode("utf-8"), self.address)
+        except OSError as e:
+            log.warning("failed to send trace to the X-Ray daemon, %s", e)
+
+
+class InMemoryCollector(object):
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+
+class NoExporter(object):
+    def export(self, span: Span):
+        pass
+
+
+def create_exporter(setting: str = None):
+    """
+    creates the exporter configured by `setting` or the environment variable TRACING:
+    `xray` (default) or `none`.
+    """
+    if setting is None:
+        setting = os.getenv("TRACING", "xray")
+    if setting == "xray":
+        return XRayExporter()
+    if setting == "none":
+        return NoExporter()
+    raise ValueError(f"unsupported TRACING {setting}")
+
+
+default_exporter = create_exporter()
+
+_current: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def trace(name: str, exporter=None, **annotations):
+    """
+    records the spans created in the block, and exports them at the end.
+    """
+    root = Span(name, **annotations)
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException:
+        root.error = True
+        raise
+    finally:
+        _current.reset(token)
+        root.end()
+        (exporter if exporter is not None else default_exporter).export(root)
+
+
+@contextmanager
+def span(name: str, **annotations):
+    """
+    records the block as span, nested in the current span. Does nothing outside a trace.
+    """
+    parent = current()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, **annotations)
+    parent.add_child(child)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException:
+        child.error = True
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+def traced(name: str):
+    """
+    decorates a function to be recorded as span `name`.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, function=function.__name__):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def register(events):
+    """
+    registers handlers on the event system of a botocore client, which record each AWS
+    API call as span.
+    """
+
+    def before_call(model, context, **kwargs):
+        parent = current()
+        if parent is None:
+            return
+        call = Span(model.service_model.service_id, namespace="aws")
+        call.aws = {"operation": model.name, "region": context.get("client_region")}
+        parent.add_child(call)
+        context["tracing_span"] = call
+
+    def after_call(http_response, parsed, context, **kwargs):
+        call = context.get("tracing_span")
+        if call is not None:
+            request_id = parsed.get("ResponseMetadata", {}).get("RequestId")
+            if request_id:
+                call.aws["request_id"] = request_id
+            call.end(error=http_response.status_code >= 300)
+
+    def after_call_error(context, **kwargs):
+        call = context.get("tracing_span")
+        if call is not None:
+            call.end(error=True)
+
+    events.register_first(
+        "before-call.*.*", before_call, unique_id="tracing-before-call"
+    )
+    events.register("after-call.*.*", after_call, unique_id="tracing-after-call")
+    events.register(
+        "after-call-error.*.*", after_call_error, unique_id="tracing-after-call-error"
+    )
@@ -0,0 +1,190 @@
+import abc
+import json
+
+import clock
+import dns_check
+import pending_waits
+import polling
+import tracing
+from aws_clients import get_client
+from base_provider import BaseProvider, seed_identity_attributes
+
+lmbda = get_client("lambda")
+
+# the seconds an invocation keeps after a wait, to reinvoke the function before it
+# times out
+REINVOKE_MARGIN_IN_SECONDS = 5
+
+
+class VerifiedProvider(BaseProvider, abc.ABC):
+    """
+    awaits the verification of an SES identity. While the verification is pending, the
+    provider reinvokes itself after the interval of the `polling_policy`, scheduled on
+    the `scheduler`, but never longer than the invocation has left to reinvoke itself.
+    With a store of `pending_waits`, the wait is registered instead, and a single
+    poller per region checks all pending waits. With a `resolver`, SES is only asked
+    once the DNS records of the identity resolve. Subclasses implement
+    `check` and `expected_records`, and name the SES call which reads the attributes of
+    the identity for `prefetch`.
+    """
+
+    attributes_method: str = None
+    attributes_key: str = None
+
+    def __init__(self):
+        super().__init__()
+        self.request_schema = {
+            "type": "object",
+            "required": ["Identity", "Region"],
+            "properties": {
+                "Identity": {"type": "string", "description": "to await verification"},
+                "Region": {"type": "string", "description": "of to the identity"},
+            },
+        }
+        self._ses = None
+        self.polling_policy = polling.create_policy(kind=self.custom_cfn_resource_name)
+        self.scheduler = clock.default_scheduler
+        self.pending_waits = pending_waits.default_store
+        self.resolver = dns_check.default_resolver
+
+    @property
+    def identity(self):
+        return self.get("Identity").rstrip(".")
+
+    @property
+    def region(self):
+        return self.get("Region")
+
+    @property
+    def ses(self):
+        if not self._ses or self._ses.meta.region_name != self.region:
+            self._ses = get_client("ses", region_name=self.region)
+        return self._ses
+
+    def prefetch(self, requests):
+        seed_identity_attributes(
+            get_client("ses", region_name=requests[0]["ResourceProperties"]["Region"]),
+            self.attributes_method,
+            self.attributes_key,
+            [
+                [r["ResourceProperties"]["Identity"].rstrip(".")]
+                for r in requests
+                if r["RequestType"] != "Delete"
+            ],
+        )
+
+    @abc.abstractmethod
+    def check(self):
+        """
+        checks the verification of the identity once: reports success or failure, or
+        reinvokes the provider while it is pending.
+        """
+
+    def expected_records(self):
+        """
+        returns the DNS records SES looks up to verify the identity, as far as known
+        from an earlier attempt.
+        """
+        return []
+
+    def dns_pending(self) -> bool:
+        """
+        returns true if the expected records do not resolve yet, in which case the
+        check is retried once their negative answers expire.
+        """
+        records = self.expected_records()
+        if self.resolver is None or not records:
+            return False
+        ttl = dns_check.unresolved_ttl(self.resolver, records)
+        if ttl is None:
+            return False
+        self.async_reinvoke(max(self.interval, min(ttl, dns_check.MAX_WAIT_IN_SECONDS)))
+        return True
+
+    def create(self):
+        if not self.dns_pending():
+            self.check()
+
+    def update(self):
+        if not self.dns_pending():
+            self.check()
+
+    def delete(self):
+        self.success("nothing to delete")
+
+    def invoke_lambda(self, payload):
+        lmbda.invoke(
+            FunctionName=self.get("ServiceToken"),
+            InvocationType="Event",
+            Payload=payload,
+        )
+
+    def max_wait(self, interval: float) -> float:
+        """
+        returns `interval`, capped at the time left in the Lambda invocation to sleep
+        and still reinvoke the function. A longer wait is continued by the next
+        invocation.
+        """
+        remaining = self.remaining_time
+        if remaining is None:
+            return interval
+        return max(0.0, min(interval, remaining - REINVOKE_MARGIN_IN_SECONDS))
+
+    @tracing.traced("reinvoke")
+    def async_reinvoke(self, interval: float = None):
+        self.asynchronous = True  ## do not report result to CFN yet
+        if interval is None:
+            interval = self.interval
+        interval = self.max_wait(interval)
+        self.properties.setdefault("PendingSince", self.scheduler.clock.now())
+        self.increment_attempt()
+        if self.pending_waits is not None:
+            self.pending_waits.register(self.request)
+            now = self.scheduler.clock.now()
+            until = now + interval + pending_waits.POLLER_LEASE_IN_SECONDS
+            if self.pending_waits.acquire_poller(self.region, now, until):
+                self.schedule_poller(interval)
+            return
+
+        payload = json.dumps(self.request).encode("utf-8")
+        self.scheduler.call_later(interval, self.invoke_lambda, payload)
+
+    def schedule_poller(self, interval: float):
+        """
+        invokes the poller of the pending waits in the region after `interval` seconds.
+        """
+        interval = self.max_wait(interval)
+        until = (
+            self.scheduler.clock.now()
+            + interval
+            + pending_waits.POLLER_LEASE_IN_SECONDS
+        )
+        self.pending_waits.renew_poller(self.region, until)
+        payload = json.dumps({"PendingWaits": {"Region": self.region}})
+        self.scheduler.call_later(interval, self.invoke_lambda, payload.encode("utf-8"))
+
+    def success(self, reason=None):
+        super().success(reason)
+        if self.request_type != "Delete" and "PendingSince" in self.properties:
+            self.polling_policy.observe(self.elapsed)
+
+    @property
+    def elapsed(self) -> float:
+        """returns the seconds since the verification was first found pending"""
+        return self.scheduler.clock.now() - self.get("PendingSince", 0.0)
+
+    @property
+    def interval(self) -> float:
+        """returns the seconds until the next check"""
+        return self.polling_policy.interval(
+            self.attempt, self.elapsed if "PendingSince" in self.properties else 0.0
+        )
+
+    @property
+    def attempt(self):
+        """returns the number of attempts waiting for completion"""
+        return int(self.get("Attempt", 1))
+
+    def increment_attempt(self):
+        """returns the number of attempts waiting for completion"""
+        self.properties["Attempt"] = self.attempt + 1
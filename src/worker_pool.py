@@ -0,0 +1,63 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional
+
+
+class RateLimiter(object):
+    """
+    spaces calls evenly, so that at most `calls_per_second` calls are made over all
+    threads sharing the limiter. A rate of 0 or less means unlimited.
+    """
+
+    def __init__(self, calls_per_second: float):
+        self.interval = 1.0 / calls_per_second if calls_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_call = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Result(NamedTuple):
+    item: Any
+    value: Any
+    error: Optional[BaseException]
+
+
+def run_concurrently(
+    function: Callable[[Any], Any], items: Iterable[Any], max_workers: int = 4
+) -> List[Result]:
+    """
+    calls `function` for each item on a pool of `max_workers` threads, in a copy of the
+    context of the caller. Returns a result per item, in the order of `items`.
+    Exceptions are returned, not raised.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, function, item)
+            for item in items
+        ]
+
+    results = []
+    for item, future in zip(items, futures):
+        error = future.exception()
+        results.append(Result(item, None if error else future.result(), error))
+    return results
+
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
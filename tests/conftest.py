@@ -0,0 +1,95 @@
+import base64
+
+import pytest
+
+import caller_identity
+import metrics
+import ses
+import sns_signature
+
+# a self-signed certificate and the private exponent of its key, to sign SNS messages
+SNS_CERTIFICATE = """-----BEGIN CERTIFICATE-----
+MIICFDCCAX2gAwIBAgIUJPrAr2GYeAo49slihn89oYNHG1IwDQYJKoZIhvcNAQEL
+BQAwHDEaMBgGA1UEAwwRc25zLmFtYXpvbmF3cy5jb20wHhcNMjYxMDE5MTk0NjI5
+WhcNMzYxMDE2MTk0NjI5WjAcMRowGAYDVQQDDBFzbnMuYW1hem9uYXdzLmNvbTCB
+nzANBgkqhkiG9w0BAQEFAAOBjQAwgYkCgYEAtBurDbuQVP0IHb4i6PYibxPRw5Gj
+Y+f8omTMpJiJWKW5/8LLbCC59pVlqL5XvOj/pfG1gN/X98IjEmww4Z87p0Pho/uI
+YqyawVcNg2i3KTgQQH66UFFveJ4RJ/KepuCmTZ6QeilPgFu1N3hbXSDmRu37dabR
+erkolyHZ5CIVCg0CAwEAAaNTMFEwHQYDVR0OBBYEFAdCNk6teuANWBFfil89R0x+
+1B3ZMB8GA1UdIwQYMBaAFAdCNk6teuANWBFfil89R0x+1B3ZMA8GA1UdEwEB/wQF
+MAMBAf8wDQYJKoZIhvcNAQELBQADgYEAW7/5SvMvcxmGdrQ/1GHsnLiWEH3Fz4j5
++k3a1yh0Z/5PKxWIBXccaomChFslFMLlMQetXPl6Xd7Mqw7YX45sOzvM/y5rWd/l
+UHNPBMi1OFoXqMkCBwQviAfYOm7/KKsYF9k8/EVV//w7/Ifgi6EY6EQZE1TzgVlD
+iORBfvc0Ay4=
+-----END CERTIFICATE-----
+"""
+SNS_PRIVATE_EXPONENT = int(
+    "af92d54212d9157080cbf5c1345654a4f1ae27b6be8fb2e39d2f242b442387ce"
+    "2eae7ba730260b02ad0aa7dfbdca035ccbd8ffb5bd005c9edcefa596552b93ca"
+    "cc6789e89739fd7018e4250f4b8e56c8426f776809f0221283ad42069cfb0d9e"
+    "c3b12f3272476261e677878445aa2b4b2e2adb5af6eae728be400ab4b978eac5",
+    16,
+)
+SNS_CERTIFICATE_URL = (
+    "https://sns.eu-west-1.amazonaws.com/SimpleNotificationService.pem"
+)
+
+
+@pytest.fixture
+def fresh_providers(monkeypatch):
+    """
+    removes the stubbed clients and functions injected into the providers by other tests.
+    """
+    for module in [
+        ses.active_rule_set_provider,
+        ses.domain_identity_provider,
+        ses.identity_notifications_provider,
+        ses.verified_identity_provider,
+        ses.verified_mail_from_domain_provider,
+    ]:
+        provider = module.provider
+        if hasattr(provider, "_ses"):
+            monkeypatch.setattr(provider, "_ses", None)
+        for name in ["ses_clients", "invoke_lambda"]:
+            if name in provider.__dict__:
+                monkeypatch.delattr(provider, name)
+    monkeypatch.setattr(metrics, "default_sink", metrics.NoSink())
+    caller_identity.clear()
+    yield
+    caller_identity.clear()
+
+
+@pytest.fixture
+def sign_sns_message(monkeypatch):
+    """
+    returns a function which signs an SNS message with the test certificate, which is
+    returned for the signing certificate URL of the message.
+    """
+    key = sns_signature.public_key(SNS_CERTIFICATE)
+    monkeypatch.setattr(
+        sns_signature, "get_certificate", {SNS_CERTIFICATE_URL: key}.__getitem__
+    )
+
+    def sign(message: dict, version: str = "2") -> dict:
+        message = dict(
+            message, SignatureVersion=version, SigningCertURL=SNS_CERTIFICATE_URL
+        )
+        hash_function, prefix = sns_signature.HASHES[version]
+        digest_info = (
+            prefix + hash_function(sns_signature.string_to_sign(message)).digest()
+        )
+        size = (key.modulus.bit_length() + 7) // 8
+        padded = (
+            b"\x00\x01"
+            + b"\xff" * (size - len(digest_info) - 3)
+            + b"\x00"
+            + digest_info
+        )
+        signature = pow(
+            int.from_bytes(padded, "big"), SNS_PRIVATE_EXPONENT, key.modulus
+        )
+        signature = signature.to_bytes(size, "big")
+        message["Signature"] = base64.b64encode(signature).decode("ascii")
+        return message
+
+    return sign
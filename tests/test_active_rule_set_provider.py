@@ -3,6 +3,7 @@ import datetime
 from dateutil.tz import tzutc
 import botocore
 from botocore.stub import Stubber
+import fake_aws
 from active_rule_set_provider import handler, provider
 
 
@@ -46,6 +47,9 @@ def test_create_fails_existing_rule_set():
 def test_update_receipt_rule_set():
     ses = botocore.session.get_session().create_client("ses")
     stubber = Stubber(ses)
+    stubber.add_response(
+        "describe_active_receipt_rule_set", active_receipt_rule_set_response
+    )
     stubber.add_response(
         "set_active_receipt_rule_set",
         no_active_receipt_rule_set_response,
@@ -92,9 +96,72 @@ def test_activate_receipt_rule_with_rule_set_present():
     stubber.assert_no_pending_responses()
 
 
+def test_update_already_active_receipt_rule_set():
+    ses = botocore.session.get_session().create_client("ses")
+    stubber = Stubber(ses)
+    stubber.add_response(
+        "describe_active_receipt_rule_set", active_receipt_rule_set_response
+    )
+    stubber.activate()
+    provider._ses = ses
+    request = Request("Update", "lists.binx.io")
+    response = handler(request, {})
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    stubber.assert_no_pending_responses()
+
+
+def test_multi_region(monkeypatch):
+    monkeypatch.setattr(provider, "_ses", None)
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.DescribeActiveReceiptRuleSet": [
+                no_active_receipt_rule_set_response,
+                no_active_receipt_rule_set_response,
+                active_receipt_rule_set_response,
+            ],
+            "ses.SetActiveReceiptRuleSet": no_active_receipt_rule_set_response,
+        }
+    )
+    request = Request("Create", "lists.binx.io", region=None)
+    request["ResourceProperties"]["Regions"] = ["eu-west-1", "us-east-1"]
+    with fake_aws.scope(fake):
+        response = handler(request, {})
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["PhysicalResourceId"] == "active-receipt-rule-set@MyReceiptRuleSet"
+    assert fake.call_counts()["ses.SetActiveReceiptRuleSet"] == 2
+
+    request = Request(
+        "Update",
+        "lists.binx.io",
+        region=None,
+        physical_resource_id=response["PhysicalResourceId"],
+    )
+    request["ResourceProperties"]["Regions"] = ["eu-west-1", "eu-central-1"]
+    request["OldResourceProperties"] = {
+        "RuleSetName": "lists.binx.io",
+        "Regions": ["eu-west-1", "us-east-1"],
+    }
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.DescribeActiveReceiptRuleSet": active_receipt_rule_set_response,
+            "ses.SetActiveReceiptRuleSet": no_active_receipt_rule_set_response,
+        }
+    )
+    with fake_aws.scope(fake):
+        response = handler(request, {})
+    assert response["Status"] == "FAILED"
+    assert response["Reason"] == (
+        "failed in 1 of 2 regions, eu-central-1: active receipt rule set is already set in region eu-central-1 - lists.binx.io"
+    )
+    assert "ses.SetActiveReceiptRuleSet" not in fake.call_counts()
+
+
 def test_delete():
     ses = botocore.session.get_session().create_client("ses")
     stubber = Stubber(ses)
+    stubber.add_response(
+        "describe_active_receipt_rule_set", active_receipt_rule_set_response
+    )
     stubber.add_response(
         "set_active_receipt_rule_set", no_active_receipt_rule_set_response, {}
     )
@@ -133,6 +200,8 @@ class Request(dict):
                 },
             }
         )
+        if not region:
+            del self["ResourceProperties"]["Region"]
 
         self["PhysicalResourceId"] = (
             physical_resource_id
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+import aws_clients
+import fake_aws
+from aws_clients import get_client
+
+
+def test_clients_are_shared():
+    ses = get_client("ses", region_name="eu-west-1")
+    assert get_client("ses", region_name="eu-west-1") is ses
+    assert get_client("ses", region_name="us-east-1") is not ses
+    assert get_client("ses", region_name="us-east-1").meta.region_name == "us-east-1"
+    assert get_client("sts") is get_client("sts")
+
+
+def test_clear():
+    ses = get_client("ses", region_name="eu-west-1")
+    aws_clients.close_connections()
+    aws_clients.clear()
+    assert get_client("ses", region_name="eu-west-1") is not ses
+
+
+def test_instrumenters_apply_to_all_clients(monkeypatch):
+    monkeypatch.setattr(aws_clients, "_instrumenters", [])
+    ses = get_client("ses", region_name="eu-west-1")
+    instrumented = []
+    aws_clients.add_instrumenter(instrumented.append)
+    aws_clients.add_instrumenter(instrumented.append)
+    assert ses.meta.events in instrumented
+
+    sts = get_client("sts", region_name="eu-central-1")
+    assert instrumented.count(sts.meta.events) == 1
+
+
+def assume_role_response(expires_in: float) -> dict:
+    return {
+        "Credentials": {
+            "AccessKeyId": "ASIAEXAMPLE",
+            "SecretAccessKey": "secret",
+            "SessionToken": "token",
+            "Expiration": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+        }
+    }
+
+
+def test_role_credentials_are_cached():
+    role_arn = "arn:aws:iam::123456789012:role/ses"
+    fake = fake_aws.FakeAWS({"sts.AssumeRole": assume_role_response(3600)})
+    try:
+        with fake_aws.scope(fake):
+            with aws_clients.role_scope(role_arn):
+                ses = get_client("ses", region_name="eu-west-1")
+                assert get_client("ses", region_name="eu-west-1") is ses
+                assert get_client("route53", region_name="eu-west-1") is not ses
+                assert get_client("ses", region_name="us-east-1") is not ses
+            assert get_client("ses", region_name="eu-west-1") is not ses
+            assert get_client("ses", "eu-west-1", role_arn) is ses
+        assert fake.call_counts()["sts.AssumeRole"] == 2
+        assert ses._request_signer._credentials.access_key == "ASIAEXAMPLE"
+    finally:
+        aws_clients.clear()
+
+
+def test_expiring_role_credentials_are_renewed():
+    role_arn = "arn:aws:iam::123456789012:role/ses"
+    fake = fake_aws.FakeAWS(
+        {
+            "sts.AssumeRole": [
+                assume_role_response(aws_clients.CREDENTIALS_REFRESH_MARGIN - 60),
+                assume_role_response(3600),
+            ]
+        }
+    )
+    try:
+        with fake_aws.scope(fake):
+            ses = get_client("ses", "eu-west-1", role_arn)
+            renewed = get_client("ses", "eu-west-1", role_arn)
+            assert renewed is not ses
+            assert get_client("ses", "eu-west-1", role_arn) is renewed
+        assert fake.call_counts()["sts.AssumeRole"] == 2
+    finally:
+        aws_clients.clear()
@@ -0,0 +1,84 @@
+import uuid
+
+from base_provider import BaseProvider, get_validator
+
+
+class ThingProvider(BaseProvider):
+    def __init__(self):
+        super().__init__()
+        self.request_schema = {
+            "type": "object",
+            "required": ["Name"],
+            "properties": {
+                "Name": {"type": "string"},
+                "TTL": {"type": "string", "default": "60"},
+            },
+        }
+
+    def create(self):
+        self.physical_resource_id = self.get("Name")
+
+
+def test_valid_request_gets_defaults():
+    provider = ThingProvider()
+    provider.set_request(Request({"Name": "example"}), {})
+    provider.execute()
+    assert provider.status == "SUCCESS", provider.reason
+    assert provider.get("TTL") == "60"
+    assert provider.physical_resource_id == "example"
+
+
+def test_invalid_properties():
+    provider = ThingProvider()
+    provider.set_request(Request({"Name": 1}), {})
+    provider.execute()
+    assert provider.status == "FAILED"
+    assert provider.reason == "invalid resource properties: 1 is not of type 'string'"
+
+
+def test_invalid_cfn_request():
+    provider = ThingProvider()
+    request = Request({"Name": "example"})
+    del request["ResponseURL"]
+    provider.set_request(request, {})
+    provider.execute()
+    assert provider.status == "FAILED"
+    assert provider.reason.startswith("invalid CloudFormation Request received")
+
+
+def test_validators_are_compiled_once():
+    provider = ThingProvider()
+    assert provider.request_validator is provider.request_validator
+    assert provider.cfn_request_validator is ThingProvider().cfn_request_validator
+
+    schema = {"type": "object"}
+    validator = get_validator(schema, type(provider.request_validator))
+    assert get_validator(schema, type(provider.request_validator)) is validator
+    assert (
+        get_validator(dict(schema), type(provider.request_validator)) is not validator
+    )
+
+
+class Request(dict):
+    def __init__(self, properties):
+        self.update(
+            {
+                "RequestType": "Create",
+                "ResponseURL": "https://httpbin.org/put",
+                "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+                "RequestId": "request-%s" % uuid.uuid4(),
+                "ResourceType": "Custom::Thing",
+                "LogicalResourceId": "MyResource",
+                "ResourceProperties": properties,
+            }
+        )
+
+
+def test_invalid_role_arn():
+    provider = ThingProvider()
+    provider.set_request(Request({"Name": "example", "RoleArn": "ses"}), {})
+    provider.execute()
+    assert provider.status == "FAILED"
+    assert provider.reason == (
+        "invalid resource properties: RoleArn ses is not an IAM role ARN"
+    )
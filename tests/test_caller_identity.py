@@ -0,0 +1,37 @@
+import botocore
+from botocore.stub import Stubber
+
+import caller_identity
+from caller_identity import get_caller_identity
+
+
+def test_caller_identity_is_cached():
+    caller_identity.clear()
+    sts = botocore.session.get_session().create_client("sts", region_name="eu-west-1")
+    stubber = Stubber(sts)
+    stubber.add_response("get_caller_identity", get_caller_identity_response, {})
+    stubber.activate()
+
+    identity = get_caller_identity(sts)
+    assert identity.account == "123456789012"
+    assert identity.partition == "aws"
+    assert identity.arn == "arn:aws:sts::123456789012:assumed-role/provider/session"
+
+    # the second call must not reach sts
+    assert get_caller_identity(sts) is identity
+    stubber.assert_no_pending_responses()
+    caller_identity.clear()
+
+
+def test_partition_from_arn():
+    identity = caller_identity.CallerIdentity.from_response(
+        {"Account": "123456789012", "Arn": "arn:aws-cn:iam::123456789012:user/me"}
+    )
+    assert identity.partition == "aws-cn"
+
+
+get_caller_identity_response = {
+    "UserId": "AROAEXAMPLE:session",
+    "Account": "123456789012",
+    "Arn": "arn:aws:sts::123456789012:assumed-role/provider/session",
+}
@@ -0,0 +1,25 @@
+import clock
+
+
+def test_sleeping_on_a_virtual_clock():
+    scheduler = clock.SleepingScheduler(clock.VirtualClock())
+    calls = []
+    scheduler.call_later(15, calls.append, "reinvoke")
+    assert calls == ["reinvoke"]
+    assert scheduler.clock.now() == 15
+
+
+def test_events_are_called_in_order_of_due_time():
+    scheduler = clock.EventScheduler()
+    calls = []
+
+    def call(name):
+        calls.append((scheduler.clock.now(), name))
+        if name == "first":
+            scheduler.call_later(5, call, "third")
+
+    scheduler.call_at(10, call, "second")
+    scheduler.call_later(1, call, "first")
+    scheduler.call_at(10, call, "fourth")
+    scheduler.run()
+    assert calls == [(1, "first"), (6, "third"), (10, "second"), (10, "fourth")]
@@ -46,10 +46,12 @@ def test_create(domain_identity):
         check_dkim_tokens(name, "eu-west-1", response)
 
         # try duplicate create
+        request["RequestId"] = "request-%s" % uuid.uuid4()
         response = handler(request, {})
         assert response["Status"] == "SUCCESS", response["Reason"]
         check_dkim_tokens(name, "eu-west-1", response)
 
+        request["RequestId"] = "request-%s" % uuid.uuid4()
         request["RequestType"] = "Update"
         request["OldResourceProperties"] = {"Region": "eu-west-1"}
         request["ResourceProperties"]["Region"] = "eu-central-1"
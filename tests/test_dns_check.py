@@ -0,0 +1,135 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+import dns_check
+from dns_check import Answer, Record
+
+
+def name(value: str) -> bytes:
+    return b"".join(bytes([len(l)]) + l.encode() for l in value.split(".")) + b"\x00"
+
+
+def response(query: bytes, answers=(), soa_ttl=None, rcode=0) -> bytes:
+    """
+    answers the `query` with TXT `answers` with a ttl of 300, or a negative answer
+    with the SOA record cached for `soa_ttl`.
+    """
+    query_id = struct.unpack(">H", query[:2])[0]
+    header = struct.pack(
+        ">HHHHHH",
+        query_id,
+        0x8180 | rcode,
+        1,
+        len(answers),
+        1 if soa_ttl is not None else 0,
+        0,
+    )
+    records = b""
+    for value in answers:
+        rdata = bytes([len(value)]) + value.encode()
+        records += b"\xc0\x0c" + struct.pack(">HHIH", 16, 1, 300, len(rdata)) + rdata
+    if soa_ttl is not None:
+        rdata = name("ns.example.com") + name("admin.example.com")
+        rdata += struct.pack(">IIIII", 1, 7200, 900, 1209600, 3600)
+        records += name("example.com") + struct.pack(">HHIH", 6, 1, soa_ttl, len(rdata))
+        records += rdata
+    return header + query[12:] + records
+
+
+class NameServer(object):
+    """
+    answers DNS queries on a local UDP port with `respond`.
+    """
+
+    def __init__(self, respond):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        self.respond = respond
+        self.queries = []
+
+    def serve(self):
+        while True:
+            try:
+                query, address = self.socket.recvfrom(512)
+            except OSError:
+                return
+            self.queries.append(query)
+            self.socket.sendto(self.respond(query), address)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.socket.close()
+
+
+def test_resolve_txt_record():
+    with NameServer(lambda q: response(q, ["token", "other"])) as server:
+        resolver = dns_check.Resolver(["127.0.0.1"], port=server.port)
+        answer = resolver.resolve("_amazonses.example.com", "TXT")
+    assert answer.values == ["token", "other"]
+    assert answer.ttl == 300
+    assert name("_amazonses.example.com") in server.queries[0]
+
+
+def test_resolve_negative_answer():
+    with NameServer(lambda q: response(q, soa_ttl=600, rcode=3)) as server:
+        resolver = dns_check.Resolver(["127.0.0.1"], port=server.port)
+        answer = resolver.resolve("_amazonses.example.com", "TXT")
+    assert answer.values == []
+    assert answer.ttl == 600
+
+
+def test_resolve_failure():
+    with NameServer(lambda q: response(q, rcode=2)) as server:
+        resolver = dns_check.Resolver(["127.0.0.1"], port=server.port)
+        with pytest.raises(dns_check.DNSError):
+            resolver.resolve("_amazonses.example.com", "TXT")
+
+
+class StubResolver(object):
+    def __init__(self, answers: dict):
+        self.answers = answers
+
+    def resolve(self, name, type):
+        answer = self.answers[(name, type)]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def test_unresolved_ttl():
+    records = [
+        Record("_amazonses.example.com", "TXT", "token"),
+        Record("mail.example.com", "MX", "feedback-smtp.eu-west-1.amazonses.com"),
+    ]
+    resolver = StubResolver(
+        {
+            ("_amazonses.example.com", "TXT"): Answer(["token"], 300),
+            ("mail.example.com", "MX"): Answer([], 60),
+        }
+    )
+    assert dns_check.unresolved_ttl(resolver, records) == 60
+
+    resolver.answers[("mail.example.com", "MX")] = Answer(
+        ["feedback-smtp.eu-west-1.amazonses.com."], 300
+    )
+    assert dns_check.unresolved_ttl(resolver, records) is None
+
+    resolver.answers[("_amazonses.example.com", "TXT")] = dns_check.DNSError("timeout")
+    assert dns_check.unresolved_ttl(resolver, records) is None
+
+
+def test_create_resolver():
+    assert dns_check.create_resolver("none") is None
+    assert dns_check.create_resolver("1.1.1.1,8.8.8.8").nameservers == [
+        "1.1.1.1",
+        "8.8.8.8",
+    ]
+    with pytest.raises(ValueError):
+        dns_check.create_resolver("dns.example.com")
@@ -1,5 +1,10 @@
 import uuid
 
+import botocore
+from botocore.stub import Stubber
+
+import domain_identity_provider
+import fake_aws
 from ses import handler
 
 
@@ -30,6 +35,7 @@ def test_create():
         check_verification_response(name, "eu-west-1", response)
 
         # try duplicate create
+        request["RequestId"] = "request-%s" % uuid.uuid4()
         response = handler(request, {})
         assert response["Status"] == "FAILED", response["Reason"]
         assert (
@@ -38,6 +44,7 @@ def test_create():
         )
         request["PhysicalResourceId"] = response.get("PhysicalResourceId")
 
+        request["RequestId"] = "request-%s" % uuid.uuid4()
         request["RequestType"] = "Update"
         request["OldResourceProperties"] = {"Region": "eu-west-1"}
         request["ResourceProperties"]["Region"] = "eu-central-1"
@@ -46,6 +53,7 @@ def test_create():
         check_verification_response(name, "eu-central-1", response)
 
         # try duplicate update of existing record
+        request["RequestId"] = "request-%s" % uuid.uuid4()
         request["ResourceProperties"]["Region"] = "eu-central-1"
         request["OldResourceProperties"] = {"Region": "eu-central-1"}
         request["ResourceProperties"]["Region"] = "eu-west-1"
@@ -68,6 +76,128 @@ def test_create():
             assert response["Status"] == "SUCCESS", response["Reason"]
 
 
+def test_create_and_delete_multi_region():
+    name = "lists.binx.io"
+    regions = ["eu-west-1", "eu-central-1"]
+    clients = {}
+    stubbers = []
+    for i, region in enumerate(regions):
+        ses = botocore.session.get_session().create_client("ses", region_name=region)
+        stubber = Stubber(ses)
+        stubber.add_response(
+            "list_identities", {"Identities": []}, {"IdentityType": "Domain"}
+        )
+        stubber.add_response(
+            "verify_domain_identity",
+            {"VerificationToken": f"token-{i}"},
+            {"Domain": name},
+        )
+        stubber.add_response("delete_identity", {}, {"Identity": name})
+        stubber.activate()
+        clients[region] = ses
+        stubbers.append(stubber)
+
+    provider = domain_identity_provider.provider
+    provider.ses_clients = lambda regions: {r: clients[r] for r in regions}
+    try:
+        request = Request("Create", name, region=None)
+        request["ResourceProperties"]["Regions"] = regions
+        response = handler(request, {})
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        assert response["PhysicalResourceId"] == name
+        data = response["Data"]
+        assert data["Regions"] == regions
+        assert data["VerificationTokens"] == ["token-0", "token-1"]
+        assert data["RecordSets"] == [
+            {
+                "Name": f"_amazonses.{name}.",
+                "Type": "TXT",
+                "TTL": "60",
+                "ResourceRecords": ['"token-0"', '"token-1"'],
+            }
+        ]
+
+        request = Request("Delete", name, region=None, physical_resource_id=name)
+        request["ResourceProperties"]["Regions"] = regions
+        response = handler(request, {})
+        assert response["Status"] == "SUCCESS", response["Reason"]
+        for stubber in stubbers:
+            stubber.assert_no_pending_responses()
+    finally:
+        del provider.ses_clients
+
+
+def test_update_from_multi_region_keeps_physical_resource_id(fresh_providers):
+    name = "lists.binx.io"
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.VerifyDomainIdentity": {"VerificationToken": "token"},
+            "ses.DeleteIdentity": {},
+            "cloudformation.DescribeStacks": stack("UPDATE_IN_PROGRESS"),
+        }
+    )
+    request = Request("Update", name, region="eu-west-1", physical_resource_id=name)
+    request["OldResourceProperties"] = {
+        "Domain": name,
+        "Regions": ["eu-west-1", "eu-central-1"],
+    }
+    with fake_aws.scope(fake):
+        response = handler(request, {})
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["PhysicalResourceId"] == name
+    assert fake.call_counts()["ses.DeleteIdentity"] == 1
+    assert "ses.ListIdentities" not in fake.call_counts()
+
+
+def test_prefetch_skips_multi_region_requests(fresh_providers):
+    request = Request("Create", "lists.binx.io", region=None)
+    request["ResourceProperties"]["Regions"] = ["eu-west-1", "us-east-1"]
+    fake = fake_aws.FakeAWS({})
+    with fake_aws.scope(fake):
+        domain_identity_provider.provider.prefetch([request, request])
+    assert fake.calls == []
+
+
+def stack(status: str) -> dict:
+    return {
+        "Stacks": [
+            {
+                "StackName": "stack-name",
+                "StackStatus": status,
+                "CreationTime": "2026-10-19T12:00:00Z",
+            }
+        ]
+    }
+
+
+def test_rollback_keeps_identities_of_refused_regions(fresh_providers):
+    name = "lists.binx.io"
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.ListIdentities": {"Identities": [name]},
+            "ses.VerifyDomainIdentity": {"VerificationToken": "token"},
+            "ses.DeleteIdentity": {},
+            "cloudformation.DescribeStacks": stack("UPDATE_ROLLBACK_IN_PROGRESS"),
+        }
+    )
+    request = Request("Update", name, region=None, physical_resource_id=name)
+    request["ResourceProperties"]["Regions"] = ["eu-west-1", "us-east-1"]
+    request["OldResourceProperties"] = {"Domain": name, "Regions": ["eu-west-1"]}
+    with fake_aws.scope(fake):
+        response = handler(request, {})
+        assert response["Status"] == "FAILED"
+        assert "already exists in region us-east-1" in response["Reason"]
+
+        rollback = Request("Update", name, region=None, physical_resource_id=name)
+        rollback["ResourceProperties"]["Regions"] = ["eu-west-1"]
+        rollback["OldResourceProperties"] = request["ResourceProperties"]
+        response = handler(rollback, {})
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["PhysicalResourceId"] == name
+    assert "ses.DeleteIdentity" not in fake.call_counts()
+    assert fake.call_counts()["ses.VerifyDomainIdentity"] == 1
+
+
 class Request(dict):
     def __init__(
         self, request_type, domain=None, region="eu-west-1", physical_resource_id=None
@@ -0,0 +1,152 @@
+import json
+from typing import Callable
+
+import pytest
+
+import drift_scanner
+import fake_aws
+
+pytestmark = pytest.mark.usefixtures("fresh_providers")
+
+POLICY = {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {"AWS": "arn:aws:iam::123456789012:root"},
+            "Action": ["ses:SendEmail"],
+            "Resource": "*",
+        }
+    ],
+}
+
+
+def attributes(key: str, values: dict) -> Callable:
+    return lambda params: {
+        key: {i: values[i] for i in params["Identities"] if i in values}
+    }
+
+
+def test_scan():
+    identities = [f"example-{i}.com" for i in range(250)]
+    verification = {i: {"VerificationStatus": "Success"} for i in identities}
+    verification["example-1.com"] = {"VerificationStatus": "Pending"}
+    dkim = {
+        i: {"DkimEnabled": True, "DkimVerificationStatus": "Success"}
+        for i in identities
+    }
+    dkim["example-2.com"] = {"DkimEnabled": False, "DkimVerificationStatus": "Success"}
+    mail_from = {
+        "example-3.com": {
+            "MailFromDomain": "bounce.example-3.com",
+            "BehaviorOnMXFailure": "UseDefaultValue",
+            "MailFromDomainStatus": "Success",
+        }
+    }
+    notifications = {
+        i: {
+            "ForwardingEnabled": True,
+            "HeadersInBounceNotificationsEnabled": False,
+            "HeadersInComplaintNotificationsEnabled": False,
+            "HeadersInDeliveryNotificationsEnabled": False,
+        }
+        for i in identities
+    }
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.ListIdentities": {"Identities": identities + ["unmanaged.com"]},
+            "ses.GetIdentityVerificationAttributes": attributes(
+                "VerificationAttributes", verification
+            ),
+            "ses.GetIdentityDkimAttributes": attributes("DkimAttributes", dkim),
+            "ses.GetIdentityMailFromDomainAttributes": attributes(
+                "MailFromDomainAttributes", mail_from
+            ),
+            "ses.GetIdentityNotificationAttributes": attributes(
+                "NotificationAttributes", notifications
+            ),
+            "ses.ListIdentityPolicies": lambda params: {
+                "PolicyNames": ["send"] if params["Identity"] == "example-4.com" else []
+            },
+            "ses.GetIdentityPolicies": {"Policies": {"send": json.dumps(POLICY)}},
+        }
+    )
+    domains = [{"Domain": i, "Region": "eu-west-1"} for i in identities]
+    domains[3].update({"MailFromSubdomain": "mail", "Resources": ["MailFromDomain"]})
+    domains[4].update(
+        {
+            "PolicyName": "send",
+            "PolicyDocument": dict(POLICY, Statement=[dict(POLICY["Statement"][0])]),
+            "Resources": ["IdentityPolicy", "IdentityNotifications"],
+        }
+    )
+    domains.append(
+        {"Domain": "missing.com", "Region": "eu-west-1", "Resources": ["DkimTokens"]}
+    )
+    with fake_aws.scope(fake):
+        report = drift_scanner.scan(domains, ["DomainIdentity", "DkimTokens"])
+
+    counts = fake.call_counts()
+    assert counts["ses.GetIdentityVerificationAttributes"] == 3
+    assert counts["ses.GetIdentityDkimAttributes"] == 3
+    assert counts["ses.ListIdentityPolicies"] == 251
+    assert counts["ses.GetIdentityPolicies"] == 1
+
+    assert report["Identities"] == 251
+    assert report["Unmanaged"] == {"eu-west-1": ["unmanaged.com"]}
+    assert [
+        (d["Identity"], d["Attribute"], d.get("Actual")) for d in report["Drift"]
+    ] == [
+        ("example-1.com", "Verification.VerificationStatus", "Pending"),
+        ("example-2.com", "Dkim.DkimEnabled", False),
+        ("example-3.com", "MailFrom.MailFromDomain", "bounce.example-3.com"),
+        ("missing.com", "Identity", None),
+    ]
+
+
+def test_policy_drift():
+    checks = drift_scanner.resource_checks(
+        "IdentityPolicy",
+        {
+            "Identity": "example.com",
+            "Region": "eu-west-1",
+            "PolicyName": "send",
+            "PolicyDocument": POLICY,
+        },
+    )
+    changed = dict(POLICY, Statement=[dict(POLICY["Statement"][0], Effect="Deny")])
+    snapshot = {
+        "eu-west-1": {"example.com": {"Policies": {"send": json.dumps(POLICY)}}}
+    }
+    assert drift_scanner.compare(snapshot, checks) == []
+
+    snapshot["eu-west-1"]["example.com"]["Policies"]["send"] = json.dumps(changed)
+    assert len(drift_scanner.compare(snapshot, checks)) == 1
+
+    del snapshot["eu-west-1"]["example.com"]["Policies"]["send"]
+    assert drift_scanner.compare(snapshot, checks)[0]["Actual"] is None
+
+    with pytest.raises(ValueError):
+        drift_scanner.resource_checks("ReceiptRuleSet", {"Region": "eu-west-1"})
+
+
+def test_notifications_of_identities():
+    checks = drift_scanner.resource_checks(
+        "IdentityNotifications",
+        {
+            "Identities": ["example.com.", "example.org"],
+            "Region": "eu-west-1",
+            "ForwardingEnabled": False,
+        },
+    )
+    assert {check.identity for check in checks} == {"example.com", "example.org"}
+    notifications = {"Notifications": {"ForwardingEnabled": False}}
+    snapshot = {
+        "eu-west-1": {
+            "example.com": notifications,
+            "example.org": {"Notifications": {"ForwardingEnabled": True}},
+        }
+    }
+    assert [
+        (d["Identity"], d["Attribute"]) for d in drift_scanner.compare(snapshot, checks)
+    ] == [("example.org", "Notifications.ForwardingEnabled")]
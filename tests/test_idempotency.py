@@ -0,0 +1,76 @@
+import uuid
+
+import pytest
+
+import idempotency
+
+
+class Handler(object):
+    def __init__(self, completed=True):
+        self.calls = 0
+        self.completed = completed
+
+    def __call__(self, request, context):
+        self.calls += 1
+        return {"Status": "SUCCESS", "Reason": "", "Call": self.calls}, self.completed
+
+
+@pytest.fixture(params=["memory", "file"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return idempotency.InMemoryStore()
+    return idempotency.FileStore(str(tmp_path))
+
+
+def test_duplicate_request_is_replayed(store):
+    handler = Handler()
+    request = Request()
+    response = idempotency.handle(store, request, {}, handler)
+    assert response["Call"] == 1
+
+    response = idempotency.handle(store, request, {}, handler)
+    assert response["Call"] == 1
+    assert handler.calls == 1
+
+    response = idempotency.handle(store, Request(), {}, handler)
+    assert response["Call"] == 2
+
+
+def test_incomplete_requests_are_not_recorded(store):
+    handler = Handler(completed=False)
+    request = Request()
+    idempotency.handle(store, request, {}, handler)
+    idempotency.handle(store, request, {}, handler)
+    assert handler.calls == 2
+
+
+def test_in_memory_store_is_bounded():
+    store = idempotency.InMemoryStore(max_entries=2)
+    for key in ["a", "b", "c"]:
+        store.put(key, {"Key": key})
+    assert store.get("a") is None
+    assert store.get("c") == {"Key": "c"}
+
+
+def test_create_store(tmp_path):
+    assert isinstance(idempotency.create_store("memory"), idempotency.InMemoryStore)
+    assert isinstance(idempotency.create_store("none"), idempotency.NoStore)
+    store = idempotency.create_store(f"file:{tmp_path}")
+    assert isinstance(store, idempotency.FileStore)
+    with pytest.raises(ValueError):
+        idempotency.create_store("dynamodb")
+
+
+class Request(dict):
+    def __init__(self):
+        self.update(
+            {
+                "RequestType": "Create",
+                "ResponseURL": "https://httpbin.org/put",
+                "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+                "RequestId": "request-%s" % uuid.uuid4(),
+                "ResourceType": "Custom::DomainIdentity",
+                "LogicalResourceId": "MyDomainIdentity",
+                "ResourceProperties": {},
+            }
+        )
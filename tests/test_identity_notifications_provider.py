@@ -1,7 +1,9 @@
 import uuid
 from copy import copy
 import botocore
+import pytest
 from botocore.stub import Stubber, ANY
+import caller_identity
 from identity_notifications_provider import handler, provider
 
 attributes = {
@@ -17,6 +19,26 @@ attributes = {
 }
 
 
+@pytest.fixture(autouse=True)
+def cached_caller_identity():
+    sts = botocore.session.get_session().create_client("sts", region_name="eu-west-1")
+    stubber = Stubber(sts)
+    stubber.add_response(
+        "get_caller_identity",
+        {
+            "UserId": "AROAEXAMPLE:session",
+            "Account": "123456789012",
+            "Arn": "arn:aws:sts::123456789012:assumed-role/provider/session",
+        },
+        {},
+    )
+    stubber.activate()
+    caller_identity.clear()
+    caller_identity.get_caller_identity(sts)
+    yield
+    caller_identity.clear()
+
+
 def test_set_notifications():
     ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
     stubber = Stubber(ses)
@@ -27,6 +49,27 @@ def test_set_notifications():
     request = Request("Create", attributes)
     response = handler(request, ())
     assert response["Status"] == "SUCCESS", response["Reason"]
+    assert (
+        response["PhysicalResourceId"]
+        == "arn:aws:ses:eu-west-1:123456789012:identity/lists.binx.io"
+    )
+    stubber.assert_no_pending_responses()
+    stubber.deactivate()
+
+
+def test_update_keeps_physical_resource_id():
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    addStubberCreateResponse(stubber, attributes, override=True)
+    stubber.activate()
+    provider._ses = ses
+
+    physical_resource_id = "arn::ses:eu-west-1:123456789012:identity/lists.binx.io"
+    request = Request("Update", attributes, physical_resource_id)
+    request["OldResourceProperties"] = copy(request["ResourceProperties"])
+    response = handler(request, ())
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["PhysicalResourceId"] == physical_resource_id
     stubber.assert_no_pending_responses()
     stubber.deactivate()
 
@@ -77,6 +120,319 @@ def test_delete():
     stubber.assert_no_pending_responses()
 
 
+def test_bulk_create_applies_only_differing_settings():
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    provider._ses = ses
+
+    notifications = attributes["lists.binx.io"]
+    identities = ["a.binx.io", "b.binx.io"]
+    current = {
+        "a.binx.io": {
+            "BounceTopic": "",
+            "ComplaintTopic": "",
+            "DeliveryTopic": "",
+            "ForwardingEnabled": True,
+            "HeadersInBounceNotificationsEnabled": False,
+            "HeadersInComplaintNotificationsEnabled": False,
+            "HeadersInDeliveryNotificationsEnabled": False,
+        },
+        "b.binx.io": {
+            "BounceTopic": "",
+            "ComplaintTopic": "",
+            "DeliveryTopic": "",
+            "ForwardingEnabled": True,
+            "HeadersInBounceNotificationsEnabled": True,
+            "HeadersInComplaintNotificationsEnabled": True,
+            "HeadersInDeliveryNotificationsEnabled": True,
+        },
+    }
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse(current),
+        {"Identities": identities},
+    )
+    for identity in identities:
+        for notification_type in ["Bounce", "Complaint", "Delivery"]:
+            stubber.add_response(
+                "set_identity_notification_topic",
+                SetIdentityNotificationTopicResponse(),
+                {
+                    "Identity": identity,
+                    "NotificationType": notification_type,
+                    "SnsTopic": notifications[f"{notification_type}Topic"],
+                },
+            )
+            if identity == "a.binx.io":
+                stubber.add_response(
+                    "set_identity_headers_in_notifications_enabled",
+                    SetIdentityNotificationTopicResponse(),
+                    {
+                        "Identity": identity,
+                        "NotificationType": notification_type,
+                        "Enabled": True,
+                    },
+                )
+    stubber.activate()
+    provider.max_workers = 1
+
+    request = BulkRequest("Create", identities, notifications)
+    response = handler(request, ())
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["PhysicalResourceId"] == "IdentityNotifications@eu-west-1"
+    assert response["Data"]["Configured"] == 2
+    assert response["Data"]["Failed"] == []
+    stubber.assert_no_pending_responses()
+
+
+def test_bulk_create_reports_identities_with_existing_topics():
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    provider._ses = ses
+
+    identities = [f"{i}.binx.io" for i in range(150)]
+    current = {"0.binx.io": attributes["lists.binx.io"]}
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse(current),
+        {"Identities": identities[:100]},
+    )
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse({}),
+        {"Identities": identities[100:]},
+    )
+    stubber.activate()
+
+    request = BulkRequest("Create", identities, {"ForwardingEnabled": True})
+    response = handler(request, ())
+    assert response["Status"] == "FAILED"
+    assert response["Data"]["Failed"] == ["0.binx.io"]
+    assert response["Data"]["Unchanged"] == 149
+    assert response["Reason"].endswith("0.binx.io FAILED: BounceTopic already set")
+    stubber.assert_no_pending_responses()
+
+
+def test_bulk_update_clears_removed_identities():
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    provider._ses = ses
+
+    topic = "arn:aws:sns:eu-west-1:111111111111:SES_email_bounces"
+    configured = {
+        "BounceTopic": topic,
+        "ComplaintTopic": "",
+        "DeliveryTopic": "",
+        "ForwardingEnabled": True,
+        "HeadersInBounceNotificationsEnabled": False,
+    }
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse({"a.binx.io": configured}),
+        {"Identities": ["a.binx.io"]},
+    )
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse({"b.binx.io": configured}),
+        {"Identities": ["b.binx.io"]},
+    )
+    stubber.add_response(
+        "set_identity_notification_topic",
+        SetIdentityNotificationTopicResponse(),
+        {"Identity": "b.binx.io", "NotificationType": "Bounce"},
+    )
+    stubber.activate()
+
+    request = BulkRequest(
+        "Update",
+        ["a.binx.io"],
+        {"BounceTopic": topic},
+        "IdentityNotifications@eu-west-1",
+    )
+    request["OldResourceProperties"] = {
+        "Identities": ["a.binx.io", "b.binx.io"],
+        "Region": "eu-west-1",
+        "BounceTopic": topic,
+    }
+    response = handler(request, ())
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["Data"]["Configured"] == 1
+    assert response["Data"]["Unchanged"] == 1
+    stubber.assert_no_pending_responses()
+
+
+def test_update_from_bulk_keeps_physical_resource_id():
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    provider._ses = ses
+
+    notifications = {"a.binx.io": {"ForwardingEnabled": True}}
+    addStubberCreateResponse(stubber, notifications, override=True)
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse(
+            {
+                "b.binx.io": {
+                    "BounceTopic": "arn:aws:sns:eu-west-1:111111111111:bounces",
+                    "ComplaintTopic": "",
+                    "DeliveryTopic": "",
+                    "ForwardingEnabled": True,
+                }
+            }
+        ),
+        {"Identities": ["b.binx.io"]},
+    )
+    stubber.add_response(
+        "set_identity_notification_topic",
+        SetIdentityNotificationTopicResponse(),
+        {"Identity": "b.binx.io", "NotificationType": "Bounce"},
+    )
+    stubber.activate()
+
+    request = Request("Update", notifications, "IdentityNotifications@eu-west-1")
+    request["OldResourceProperties"] = {
+        "Identities": ["a.binx.io", "b.binx.io"],
+        "Region": "eu-west-1",
+        "BounceTopic": "arn:aws:sns:eu-west-1:111111111111:bounces",
+    }
+    response = handler(request, ())
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["PhysicalResourceId"] == "IdentityNotifications@eu-west-1"
+    stubber.assert_no_pending_responses()
+
+
+def test_update_from_bulk_refuses_identity_with_existing_topics():
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    provider._ses = ses
+
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse(attributes),
+        {"Identities": ["lists.binx.io"]},
+    )
+    stubber.activate()
+
+    request = Request("Update", attributes, "IdentityNotifications@eu-west-1")
+    request["OldResourceProperties"] = {
+        "Identities": ["a.binx.io"],
+        "Region": "eu-west-1",
+    }
+    response = handler(request, ())
+    assert response["Status"] == "FAILED"
+    assert response["Reason"].startswith("BounceTopic already set")
+    stubber.assert_no_pending_responses()
+
+
+def test_refused_bulk_create_is_not_cleared_on_rollback():
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    provider._ses = ses
+
+    identities = ["a.binx.io", "lists.binx.io"]
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse(attributes),
+        {"Identities": identities},
+    )
+    stubber.activate()
+
+    request = BulkRequest("Create", identities, {"BounceTopic": topic})
+    response = handler(request, ())
+    assert response["Status"] == "FAILED"
+    assert response["PhysicalResourceId"] == "could-not-create"
+
+    request = BulkRequest("Delete", identities, {"BounceTopic": topic})
+    request["PhysicalResourceId"] = response["PhysicalResourceId"]
+    response = handler(request, ())
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    stubber.assert_no_pending_responses()
+
+
+def test_bulk_update_rollback_keeps_topics_of_refused_identity():
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    provider._ses = ses
+
+    current = dict(
+        attributes,
+        **{
+            "a.binx.io": {
+                "BounceTopic": topic,
+                "ComplaintTopic": "",
+                "DeliveryTopic": "",
+                "ForwardingEnabled": True,
+                "HeadersInBounceNotificationsEnabled": False,
+            }
+        },
+    )
+    identities = ["a.binx.io", "lists.binx.io"]
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse(current),
+        {"Identities": identities},
+    )
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse(current),
+        {"Identities": ["a.binx.io"]},
+    )
+    stubber.add_response(
+        "get_identity_notification_attributes",
+        GetIdentityNotificationAttributesResponse(current),
+        {"Identities": ["lists.binx.io"]},
+    )
+    stubber.activate()
+
+    physical_resource_id = "IdentityNotifications@eu-west-1"
+    request = BulkRequest("Update", identities, {"BounceTopic": topic})
+    request["PhysicalResourceId"] = physical_resource_id
+    request["OldResourceProperties"] = {
+        "Identities": ["a.binx.io"],
+        "Region": "eu-west-1",
+        "BounceTopic": topic,
+    }
+    response = handler(request, ())
+    assert response["Status"] == "FAILED"
+    assert response["Data"]["Failed"] == ["lists.binx.io"]
+
+    request = BulkRequest("Update", ["a.binx.io"], {"BounceTopic": topic})
+    request["PhysicalResourceId"] = physical_resource_id
+    request["OldResourceProperties"] = {
+        "Identities": identities,
+        "Region": "eu-west-1",
+        "BounceTopic": topic,
+    }
+    response = handler(request, ())
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["Data"]["Unchanged"] == 1
+    stubber.assert_no_pending_responses()
+
+
+topic = "arn:aws:sns:eu-west-1:444444444444:SES_email_bounces"
+
+
+class BulkRequest(dict):
+    def __init__(
+        self, request_type, identities, notifications, physical_resource_id=None
+    ):
+        self.update(
+            {
+                "RequestType": request_type,
+                "ResponseURL": "https://httpbin.org/put",
+                "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+                "RequestId": "request-%s" % uuid.uuid4(),
+                "ResourceType": "Custom::IdentityNotifications",
+                "LogicalResourceId": "IdentityNotifications",
+                "ResourceProperties": dict(
+                    notifications, Identities=identities, Region="eu-west-1"
+                ),
+            }
+        )
+        if physical_resource_id:
+            self["PhysicalResourceId"] = physical_resource_id
+
+
 class Request(dict):
     def __init__(self, request_type, attributes, physical_resource_id=None):
         request_id = "request-%s" % uuid.uuid4()
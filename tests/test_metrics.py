@@ -0,0 +1,107 @@
+import botocore
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+
+import metrics
+from aws_clients import instrument
+
+
+def test_api_calls_are_recorded_per_operation():
+    ses = create_ses_client([throttled_response, list_identities_response])
+    sink = metrics.InMemorySink()
+    with metrics.scope("Custom::DomainIdentity", sink) as recorder:
+        ses.list_identities(IdentityType="Domain")
+
+    api_calls = recorder.api_calls[("ses", "ListIdentities", "Custom::DomainIdentity")]
+    assert api_calls.calls == 1
+    assert api_calls.retries == 1
+    assert api_calls.throttles == 1
+    assert api_calls.errors == 0
+    assert len(api_calls.latencies) == 1
+
+    assert len(sink.documents) == 1
+    document = sink.documents[0]
+    assert document["Service"] == "ses"
+    assert document["Operation"] == "ListIdentities"
+    assert document["ResourceType"] == "Custom::DomainIdentity"
+    assert document["Throttles"] == 1
+    definition = document["_aws"]["CloudWatchMetrics"][0]
+    assert definition["Dimensions"] == [["Service", "Operation", "ResourceType"]]
+    assert {m["Name"] for m in definition["Metrics"]} == {
+        "Latency",
+        "Calls",
+        "Errors",
+        "Retries",
+        "Throttles",
+    }
+
+
+def test_all_latencies_are_emitted():
+    recorder = metrics.MetricsRecorder("Custom::IdentityNotifications")
+    for latency in range(250):
+        recorder.record_call("ses", "SetIdentityNotificationTopic", latency)
+
+    documents = recorder.to_documents("test")
+    assert [len(d["Latency"]) for d in documents] == [100, 100, 50]
+    assert sum((d["Latency"] for d in documents), []) == list(range(250))
+    assert [d.get("Calls") for d in documents] == [250, None, None]
+    assert [len(d["_aws"]["CloudWatchMetrics"][0]["Metrics"]) for d in documents] == [
+        5,
+        1,
+        1,
+    ]
+
+
+def test_nothing_is_recorded_outside_a_scope():
+    ses = create_ses_client([list_identities_response])
+    sink = metrics.InMemorySink()
+    ses.list_identities(IdentityType="Domain")
+    with metrics.scope("Custom::DomainIdentity", sink):
+        pass
+    assert sink.documents == []
+
+
+def create_ses_client(responses):
+    ses = botocore.session.get_session().create_client(
+        "ses",
+        region_name="eu-west-1",
+        aws_access_key_id="AKIAEXAMPLE",
+        aws_secret_access_key="secret",
+        config=Config(retries={"mode": "standard", "max_attempts": 2}),
+    )
+    instrument(ses)
+    responses = list(responses)
+
+    def send(request, **kwargs):
+        status_code, body = responses.pop(0)
+        return AWSResponse(request.url, status_code, {}, RawResponse(body))
+
+    ses.meta.events.register("before-send.ses", send)
+    return ses
+
+
+class RawResponse(object):
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+throttled_response = (
+    400,
+    b"""<ErrorResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/">
+  <Error><Type>Sender</Type><Code>Throttling</Code><Message>Rate exceeded</Message></Error>
+  <RequestId>1</RequestId>
+</ErrorResponse>""",
+)
+
+list_identities_response = (
+    200,
+    b"""<ListIdentitiesResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/">
+  <ListIdentitiesResult>
+    <Identities><member>binx.io</member></Identities>
+  </ListIdentitiesResult>
+  <ResponseMetadata><RequestId>2</RequestId></ResponseMetadata>
+</ListIdentitiesResponse>""",
+)
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+import fake_aws
+import onboard
+
+pytestmark = pytest.mark.usefixtures("fresh_providers")
+
+
+def write_manifest(path, domains) -> str:
+    filename = str(path / "manifest.jsonl")
+    with open(filename, "w") as f:
+        for domain in domains:
+            f.write(json.dumps(domain) + "\n")
+    return filename
+
+
+def responses(existing=None) -> dict:
+    return {
+        "ses.ListIdentities": {"Identities": existing if existing else []},
+        "ses.VerifyDomainIdentity": {"VerificationToken": "token"},
+        "ses.VerifyDomainDkim": {"DkimTokens": ["c", "b", "a"]},
+    }
+
+
+def test_load_manifest(tmp_path):
+    filename = str(tmp_path / "manifest.yaml")
+    with open(filename, "w") as f:
+        f.write(
+            "Defaults:\n"
+            "  MailFromSubdomain: mail\n"
+            "Domains:\n"
+            "  - example.com.\n"
+            "  - Domain: example.org\n"
+            "    Region: us-east-1\n"
+            "    Resources: [DomainIdentity]\n"
+        )
+    assert onboard.load_manifest(filename, {"Region": "eu-west-1"}) == [
+        {"Region": "eu-west-1", "MailFromSubdomain": "mail", "Domain": "example.com"},
+        {
+            "Region": "us-east-1",
+            "MailFromSubdomain": "mail",
+            "Domain": "example.org",
+            "Resources": ["DomainIdentity"],
+        },
+    ]
+
+    filename = write_manifest(tmp_path, ["example.com", {"Region": "eu-west-1"}])
+    with pytest.raises(ValueError):
+        onboard.load_manifest(filename)
+
+
+def test_onboard(tmp_path):
+    domains = [f"example-{i}.com" for i in range(20)]
+    manifest = write_manifest(
+        tmp_path, [{"Domain": d, "Region": "eu-west-1"} for d in domains]
+    )
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    fake = fake_aws.FakeAWS(responses())
+    with fake_aws.scope(fake):
+        assert onboard.main([manifest, "--checkpoint", checkpoint, "--json"]) == 0
+
+    counts = fake.call_counts()
+    assert counts["ses.ListIdentities"] == 1
+    assert counts["ses.VerifyDomainIdentity"] == 20
+    assert counts["ses.VerifyDomainDkim"] == 20
+
+    with open(checkpoint) as f:
+        results = [json.loads(line) for line in f]
+    assert len(results) == 40
+    assert all(r["Status"] == "SUCCESS" for r in results)
+    tokens = [r for r in results if r["Resource"] == "DkimTokens"][0]
+    assert tokens["Data"]["DkimTokens"] == ["a", "b", "c"]
+    assert tokens["PhysicalResourceId"] == f'{tokens["Domain"]}@eu-west-1'
+
+
+def test_resume_from_checkpoint(tmp_path, capsys):
+    manifest = write_manifest(
+        tmp_path,
+        [
+            {"Domain": "example.com", "Region": "eu-west-1"},
+            {"Domain": "example.org", "Region": "eu-west-1"},
+        ],
+    )
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    fake = fake_aws.FakeAWS(responses(["example.org"]))
+    with fake_aws.scope(fake):
+        assert onboard.main([manifest, "--checkpoint", checkpoint, "--json"]) == 1
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["domains"] == 2
+    assert summary["failed_domains"] == 1
+    assert summary["resources"]["DomainIdentity"]["FAILED"] == 1
+    assert summary["resources"]["DkimTokens"]["BLOCKED"] == 1
+    assert summary["errors"] == {
+        "SES domain identity <domain> already exists in region eu-west-1": 1
+    }
+
+    fake = fake_aws.FakeAWS(responses(["example.com", "example.org"]))
+    with fake_aws.scope(fake):
+        assert (
+            onboard.main([manifest, "--checkpoint", checkpoint, "--json", "--adopt"])
+            == 0
+        )
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["resources"]["DomainIdentity"] == {
+        "SUCCESS": 1,
+        "FAILED": 0,
+        "SKIPPED": 1,
+        "BLOCKED": 0,
+    }
+    assert summary["resources"]["DkimTokens"]["SKIPPED"] == 1
+    assert fake.call_counts()["ses.VerifyDomainIdentity"] == 1
+    assert fake.call_counts()["ses.VerifyDomainDkim"] == 1
@@ -0,0 +1,223 @@
+import json
+import uuid
+
+import pytest
+
+import clock
+import fake_aws
+import pending_waits
+import replay_benchmark
+import ses
+
+pytestmark = pytest.mark.usefixtures("fresh_providers")
+
+
+def verification_attributes(status: str, *identities) -> dict:
+    return {
+        "VerificationAttributes": {
+            identity: {"VerificationStatus": status, "VerificationToken": "token"}
+            for identity in identities
+        }
+    }
+
+
+def verified_identity_request(identity: str, response_url: str) -> dict:
+    return {
+        "RequestType": "Create",
+        "ResourceType": "Custom::VerifiedIdentity",
+        "ResponseURL": response_url,
+        "StackId": "arn:aws:cloudformation:eu-west-1:123456789012:stack/demo/guid",
+        "RequestId": str(uuid.uuid4()),
+        "LogicalResourceId": "VerifiedIdentity",
+        "ResourceProperties": {
+            "ServiceToken": "arn:aws:lambda:eu-west-1:123456789012:function:ses",
+            "Identity": identity,
+            "Region": "eu-west-1",
+        },
+    }
+
+
+@pytest.fixture(params=["memory", "file"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return pending_waits.InMemoryWaitStore()
+    return pending_waits.FileWaitStore(str(tmp_path))
+
+
+def test_one_poller_for_all_pending_identities(store, monkeypatch):
+    scheduler = clock.EventScheduler()
+    invocations = []
+
+    def invoke_lambda(payload):
+        invocations.append(json.loads(payload))
+        return ses.handler(invocations[-1], {})
+
+    for module in [
+        ses.verified_identity_provider,
+        ses.verified_mail_from_domain_provider,
+    ]:
+        monkeypatch.setattr(module.provider, "pending_waits", store)
+        monkeypatch.setattr(module.provider, "scheduler", scheduler)
+        monkeypatch.setattr(module.provider, "invoke_lambda", invoke_lambda)
+
+    identities = ["example.com", "example.org", "example.net"]
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.GetIdentityVerificationAttributes": [
+                verification_attributes("Pending", "example.com"),
+                verification_attributes("Pending", "example.org"),
+                verification_attributes("Pending", "example.net"),
+                verification_attributes("Pending", *identities),
+                verification_attributes("Success", *identities),
+            ]
+        }
+    )
+    with replay_benchmark.ResponseServer() as server:
+        with fake_aws.scope(fake):
+            for identity in identities:
+                ses.handler(verified_identity_request(identity, server.url), {})
+            assert len(store.pending("eu-west-1")) == 3
+            scheduler.run()
+
+    assert invocations == [{"PendingWaits": {"Region": "eu-west-1"}}] * 2
+    assert scheduler.clock.now() == 30
+    assert fake.call_counts()["ses.GetIdentityVerificationAttributes"] == 5
+    assert store.pending("eu-west-1") == []
+    assert store.acquire_poller("eu-west-1", 30, 60)
+
+
+class Context(object):
+    def get_remaining_time_in_millis(self):
+        return 12000
+
+
+def test_poller_interval_is_capped_at_remaining_time(store, monkeypatch):
+    scheduler = clock.EventScheduler()
+    provider = ses.verified_identity_provider.provider
+    monkeypatch.setattr(provider, "pending_waits", store)
+    monkeypatch.setattr(provider, "scheduler", scheduler)
+    monkeypatch.setattr(provider, "invoke_lambda", lambda payload: None)
+
+    store.register(verified_identity_request("example.com", "http://localhost/"))
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.GetIdentityVerificationAttributes": verification_attributes(
+                "Pending", "example.com"
+            )
+        }
+    )
+    with fake_aws.scope(fake):
+        result = pending_waits.poll(
+            store, "eu-west-1", ses.verified_providers(), Context()
+        )
+    assert result["Pending"] == 1
+    scheduler.run()
+    assert scheduler.clock.now() == 7
+
+
+def test_poller_continues_after_failed_prefetch(store, monkeypatch):
+    scheduler = clock.EventScheduler()
+    provider = ses.verified_identity_provider.provider
+    monkeypatch.setattr(provider, "pending_waits", store)
+    monkeypatch.setattr(provider, "scheduler", scheduler)
+    monkeypatch.setattr(provider, "invoke_lambda", lambda payload: None)
+
+    def prefetch(requests):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(provider, "prefetch", prefetch)
+
+    store.register(verified_identity_request("example.com", "http://localhost/"))
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.GetIdentityVerificationAttributes": verification_attributes(
+                "Pending", "example.com"
+            )
+        }
+    )
+    with fake_aws.scope(fake):
+        result = pending_waits.poll(
+            store, "eu-west-1", ses.verified_providers(), Context()
+        )
+    assert result == {"Region": "eu-west-1", "Completed": 0, "Pending": 1}
+    assert fake.call_counts()["ses.GetIdentityVerificationAttributes"] == 1
+    scheduler.run()
+    assert scheduler.clock.now() == 7
+
+
+def test_poller_lease(store):
+    request = verified_identity_request("example.com", "http://localhost/")
+    assert store.acquire_poller("eu-west-1", 0, 100)
+    assert not store.acquire_poller("eu-west-1", 50, 150)
+
+    store.register(request)
+    assert not store.release_poller("eu-west-1")
+    assert not store.acquire_poller("eu-west-1", 99, 150)
+    assert store.acquire_poller("eu-west-1", 100, 200)
+
+    store.remove(request)
+    assert store.release_poller("eu-west-1")
+    assert store.acquire_poller("eu-west-1", 0, 100)
+
+
+def test_create_wait_store(tmp_path):
+    assert pending_waits.create_wait_store("none") is None
+    assert isinstance(
+        pending_waits.create_wait_store("memory"), pending_waits.InMemoryWaitStore
+    )
+    assert isinstance(
+        pending_waits.create_wait_store(f"file:{tmp_path}"),
+        pending_waits.FileWaitStore,
+    )
+    with pytest.raises(ValueError):
+        pending_waits.create_wait_store("dynamodb")
+
+
+def test_verification_event_completes_the_pending_waits(store, monkeypatch):
+    scheduler = clock.EventScheduler()
+    for module in [
+        ses.verified_identity_provider,
+        ses.verified_mail_from_domain_provider,
+    ]:
+        monkeypatch.setattr(module.provider, "pending_waits", store)
+        monkeypatch.setattr(module.provider, "scheduler", scheduler)
+        monkeypatch.setattr(module.provider, "invoke_lambda", lambda payload: None)
+
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.GetIdentityVerificationAttributes": [
+                verification_attributes("Pending", "example.com"),
+                verification_attributes("Pending", "example.org"),
+                verification_attributes("Success", "example.com"),
+            ]
+        }
+    )
+    event = {
+        "source": "aws.ses",
+        "detail-type": "Identity Verification Status Change",
+        "region": "eu-west-1",
+        "detail": {"identity": "example.com", "status": "SUCCESS"},
+    }
+    with replay_benchmark.ResponseServer() as server:
+        with fake_aws.scope(fake):
+            for identity in ["example.com", "example.org"]:
+                ses.handler(verified_identity_request(identity, server.url), {})
+            result = ses.handler(event, {})
+
+    assert result == {
+        "Region": "eu-west-1",
+        "Identity": "example.com",
+        "Completed": 1,
+        "Pending": 0,
+    }
+    pending = store.pending("eu-west-1")
+    assert [w["ResourceProperties"]["Identity"] for w in pending] == ["example.org"]
+    assert not store.acquire_poller("eu-west-1", scheduler.clock.now(), 900)
+
+
+def test_event_identity():
+    assert pending_waits.event_identity({"detail": {"identity": "example.com."}}) == (
+        "example.com"
+    )
+    assert pending_waits.event_identity({"detail": {"status": "SUCCESS"}}) is None
+    assert pending_waits.event_identity({}) is None
@@ -0,0 +1,64 @@
+import pytest
+
+import polling
+
+
+def test_fixed_interval():
+    policy = polling.create_policy("fixed:15")
+    assert [policy.interval(attempt) for attempt in [1, 2, 10]] == [15, 15, 15]
+    assert str(policy) == "fixed:15"
+
+
+def test_exponential_backoff():
+    policy = polling.create_policy("exponential:5,2,30")
+    assert [policy.interval(attempt) for attempt in range(1, 6)] == [5, 10, 20, 30, 30]
+    assert str(policy) == "exponential:5,2,30"
+
+
+def test_default_maximum():
+    policy = polling.create_policy("exponential:5")
+    assert [policy.interval(attempt) for attempt in range(1, 5)] == [5, 10, 20, 20]
+    policy = polling.create_policy("adaptive", "default", polling.VerificationTimes())
+    assert policy.interval(10) == 20
+
+
+def test_default_policy(monkeypatch):
+    monkeypatch.delenv("POLLING_POLICY", raising=False)
+    monkeypatch.setenv("INTERVAL_IN_SECONDS", "10")
+    assert str(polling.create_policy()) == "fixed:10"
+
+
+@pytest.mark.parametrize(
+    "setting", ["fixed", "fixed:a", "linear:5", "exponential:", "adaptive:1,2,3"]
+)
+def test_unsupported_policy(setting):
+    with pytest.raises(ValueError):
+        polling.create_policy(setting)
+
+
+def test_adaptive_interval():
+    times = polling.VerificationTimes()
+    policy = polling.create_policy("adaptive:2,60", "Custom::VerifiedIdentity", times)
+    assert str(policy) == "adaptive:2,60"
+    assert [policy.interval(attempt) for attempt in range(1, 4)] == [2, 4, 8]
+
+    for seconds in range(1, 21):
+        policy.observe(seconds)
+    assert times.samples("Custom::VerifiedMailFromDomain") == []
+    assert policy.interval(1, 0) == 5
+    assert policy.interval(2, 5) == 5
+    assert policy.interval(3, 17) == 2
+    assert policy.interval(4, 20) == 10
+    assert policy.interval(5, 200) == 60
+
+
+def test_verification_times_persist(tmp_path):
+    path = str(tmp_path / "verification-times.json")
+    times = polling.VerificationTimes(path, size=3)
+    for seconds in [1, 2, 3, 4]:
+        times.add("Custom::VerifiedIdentity", seconds)
+    assert polling.VerificationTimes(path).samples("Custom::VerifiedIdentity") == [
+        2,
+        3,
+        4,
+    ]
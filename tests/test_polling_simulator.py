@@ -0,0 +1,48 @@
+import pytest
+
+import polling_simulator
+
+
+def test_fixed_interval_polling():
+    result = polling_simulator.simulate(["fixed:15"], 2, "fixed:20", overhead=0.5)[0]
+    # invoked at 0, 15 and 30 seconds, waiting 15 seconds twice
+    assert result.resources == 2
+    assert result.invocations == 6
+    assert result.ses_calls == 6
+    assert result.billed_seconds == pytest.approx(2 * (3 * 0.5 + 30))
+    assert result.delays == [10, 10]
+
+
+def test_unbilled_waits():
+    result = polling_simulator.simulate(
+        ["fixed:15"], 1, "fixed:20", overhead=0.5, billed_waits=False
+    )[0]
+    assert result.billed_seconds == pytest.approx(1.5)
+
+
+def test_policies_are_compared_on_the_same_verification_times():
+    results = polling_simulator.simulate(
+        ["fixed:5", "exponential:5,2,60"], 20, "uniform:10,300"
+    )
+    assert results[0].invocations > results[1].invocations
+    assert max(results[0].delays) <= 5
+    assert polling_simulator.main(["--resources", "5", "--json"]) == 0
+
+
+@pytest.mark.parametrize(
+    "setting", ["fixed", "uniform:1", "normal:1,2", "lognormal:a,b"]
+)
+def test_unsupported_distribution(setting):
+    with pytest.raises(ValueError):
+        polling_simulator.create_distribution(setting)
+
+
+def test_fan_in_polls_all_pending_identities_at_once():
+    result = polling_simulator.simulate(
+        ["fixed:15"], 3, "fixed:20", overhead=0.5, fan_in=True
+    )[0]
+    # each resource is invoked once, the poller at 15 and 30 seconds
+    assert result.invocations == 5
+    assert result.ses_calls == 5
+    assert result.billed_seconds == pytest.approx(5 * 0.5 + 30)
+    assert result.delays == [10, 10, 10]
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+import profiling
+
+
+def allocate():
+    return [bytearray(1024) for _ in range(100)]
+
+
+def test_cprofile_and_tracemalloc(tmp_path):
+    profiler = profiling.create_profiler(
+        "cprofile,tracemalloc", top=5, directory=str(tmp_path)
+    )
+    with profiler.profile("Custom::DomainIdentity", "Create") as report:
+        allocate()
+
+    assert report.resource_type == "Custom::DomainIdentity"
+    assert report.phase == "Create"
+    assert 0 < len(report.functions) <= 5
+    assert any("allocate" in f["function"] for f in report.functions)
+    assert 0 < len(report.allocations) <= 5
+    assert report.peak_memory >= 100 * 1024
+
+    assert len(report.files) == 2
+    for filename in report.files:
+        assert os.path.basename(filename).startswith("Custom-DomainIdentity-Create-")
+        assert os.path.exists(filename)
+
+    document = report.to_dict()["profile"]
+    assert document["ResourceType"] == "Custom::DomainIdentity"
+    assert document["Phase"] == "Create"
+
+
+def test_cprofile_only():
+    profiler = profiling.create_profiler("cprofile", top=5, directory="")
+    with profiler.profile("Custom::DomainIdentity", "Delete") as report:
+        allocate()
+    assert report.functions
+    assert report.allocations == []
+    assert report.files == []
+
+
+def test_create_profiler():
+    assert isinstance(profiling.create_profiler("none"), profiling.NoProfiler)
+    assert isinstance(profiling.create_profiler(""), profiling.NoProfiler)
+    with profiling.create_profiler("none").profile() as report:
+        assert report is None
+
+    profiler = profiling.create_profiler("tracemalloc")
+    assert not profiler.cpu and profiler.memory
+
+    with pytest.raises(ValueError):
+        profiling.create_profiler("perf")
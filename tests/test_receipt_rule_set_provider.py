@@ -0,0 +1,183 @@
+import uuid
+
+import botocore
+import pytest
+from botocore.stub import Stubber
+
+from receipt_rule_set_provider import handler, provider, rule_set_changes
+
+
+def rule(name, recipient=None, enabled=True):
+    return {
+        "Name": name,
+        "Enabled": enabled,
+        "Recipients": [recipient if recipient else f"{name}.binx.io"],
+        "Actions": [{"StopAction": {"Scope": "RuleSet"}}],
+    }
+
+
+def test_no_changes():
+    current = [dict(rule("a"), TlsPolicy="Optional", ScanEnabled=False), rule("b")]
+    assert rule_set_changes("inbound", current, [rule("a"), rule("b")]) == []
+
+
+def test_change_one_rule_of_many():
+    current = [rule(f"rule-{i}") for i in range(300)]
+    desired = [rule(f"rule-{i}") for i in range(300)]
+    desired[150] = rule("rule-150", enabled=False)
+    assert rule_set_changes("inbound", current, desired) == [
+        ("update_receipt_rule", {"RuleSetName": "inbound", "Rule": desired[150]})
+    ]
+
+
+def test_create_and_delete_rules_in_place():
+    current = [rule("a"), rule("b"), rule("c")]
+    desired = [rule("first"), rule("a"), rule("new"), rule("c")]
+    assert rule_set_changes("inbound", current, desired) == [
+        ("delete_receipt_rule", {"RuleSetName": "inbound", "RuleName": "b"}),
+        ("create_receipt_rule", {"RuleSetName": "inbound", "Rule": rule("first")}),
+        (
+            "create_receipt_rule",
+            {"RuleSetName": "inbound", "Rule": rule("new"), "After": "a"},
+        ),
+    ]
+
+
+def test_reorder_in_one_call():
+    current = [rule("a"), rule("b"), rule("c")]
+    desired = [rule("c"), rule("a"), rule("d"), rule("b")]
+    assert rule_set_changes("inbound", current, desired) == [
+        (
+            "create_receipt_rule",
+            {"RuleSetName": "inbound", "Rule": rule("d"), "After": "a"},
+        ),
+        (
+            "reorder_receipt_rule_set",
+            {"RuleSetName": "inbound", "RuleNames": ["c", "a", "d", "b"]},
+        ),
+    ]
+
+
+@pytest.fixture
+def ses(monkeypatch):
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    monkeypatch.setattr(provider, "_ses", ses)
+    monkeypatch.setattr(provider, "requests_per_second", 0)
+    with stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_create(ses):
+    ses.add_response("create_receipt_rule_set", {}, {"RuleSetName": "inbound"})
+    ses.add_response(
+        "create_receipt_rule", {}, {"RuleSetName": "inbound", "Rule": rule("a")}
+    )
+    ses.add_response(
+        "create_receipt_rule",
+        {},
+        {"RuleSetName": "inbound", "Rule": rule("b"), "After": "a"},
+    )
+    request = Request("Create", [rule("a"), rule("b")])
+    request["ResourceProperties"]["Rules"][0]["Enabled"] = "true"
+    response = handler(request, {})
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["PhysicalResourceId"] == "inbound@eu-west-1"
+    assert response["Data"]["RuleSetName"] == "inbound"
+    assert response["Data"]["Created"] == 2
+
+
+def test_create_existing_rule_set(ses):
+    ses.add_client_error(
+        "create_receipt_rule_set",
+        "AlreadyExists",
+        expected_params={"RuleSetName": "inbound"},
+    )
+    response = handler(Request("Create", [rule("a")]), {})
+    assert response["Status"] == "FAILED"
+    assert (
+        response["Reason"]
+        == "receipt rule set inbound already exists in region eu-west-1"
+    )
+
+
+def test_create_fails_before_timeout(ses):
+    ses.add_response("create_receipt_rule_set", {}, {"RuleSetName": "inbound"})
+    ses.add_response(
+        "create_receipt_rule", {}, {"RuleSetName": "inbound", "Rule": rule("a")}
+    )
+    response = handler(
+        Request("Create", [rule("a"), rule("b")]), Context([60000, 4000])
+    )
+    assert response["Status"] == "FAILED"
+    assert response["PhysicalResourceId"] == "inbound@eu-west-1"
+    assert response["Reason"].startswith(
+        "applied only 1 of 2 changes to receipt rule set inbound in eu-west-1"
+    )
+
+
+def test_update(ses):
+    ses.add_response(
+        "describe_receipt_rule_set",
+        {"Metadata": {"Name": "inbound"}, "Rules": [rule("a"), rule("b")]},
+        {"RuleSetName": "inbound"},
+    )
+    ses.add_response(
+        "update_receipt_rule",
+        {},
+        {"RuleSetName": "inbound", "Rule": rule("b", "b.xebia.com")},
+    )
+    request = Request(
+        "Update", [rule("a"), rule("b", "b.xebia.com")], "inbound@eu-west-1"
+    )
+    request["OldResourceProperties"] = dict(request["ResourceProperties"])
+    response = handler(request, {})
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert response["Data"]["Updated"] == 1
+    assert response["Data"]["Created"] == 0
+
+
+def test_duplicate_rule_names(ses):
+    response = handler(Request("Create", [rule("a"), rule("a")]), {})
+    assert response["Status"] == "FAILED"
+    assert response["Reason"] == "duplicate receipt rule names a"
+
+
+def test_delete(ses):
+    ses.add_client_error(
+        "delete_receipt_rule_set",
+        "RuleSetDoesNotExist",
+        expected_params={"RuleSetName": "inbound"},
+    )
+    response = handler(Request("Delete", [], "inbound@eu-west-1"), {})
+    assert response["Status"] == "SUCCESS", response["Reason"]
+
+
+class Context(object):
+    def __init__(self, remaining):
+        self.remaining = remaining
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining.pop(0)
+
+
+class Request(dict):
+    def __init__(self, request_type, rules, physical_resource_id=None):
+        self.update(
+            {
+                "RequestType": request_type,
+                "ResponseURL": "https://httpbin.org/put",
+                "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+                "RequestId": "request-%s" % uuid.uuid4(),
+                "ResourceType": "Custom::ReceiptRuleSet",
+                "LogicalResourceId": "ReceiptRuleSet",
+                "ResourceProperties": {
+                    "RuleSetName": "inbound",
+                    "Region": "eu-west-1",
+                    "Rules": rules,
+                },
+            }
+        )
+        if physical_resource_id:
+            self["PhysicalResourceId"] = physical_resource_id
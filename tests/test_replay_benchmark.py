@@ -0,0 +1,84 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import botocore
+import pytest
+
+import fake_aws
+import replay_benchmark
+from aws_clients import get_client
+
+pytestmark = pytest.mark.usefixtures("fresh_providers")
+
+corpus = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "corpus.json")
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    replay_benchmark.load_corpus(corpus),
+    ids=lambda scenario: scenario.name,
+)
+def test_corpus_within_budget(scenario):
+    with replay_benchmark.ResponseServer() as server:
+        result = replay_benchmark.replay(scenario, server.url, iterations=1)
+    assert result.violations == []
+    assert len(result.latencies) == 1
+    assert result.peak_bytes > 0
+
+
+def test_exceeded_budget_is_reported():
+    scenario = next(
+        s for s in replay_benchmark.load_corpus(corpus) if s.name == "DkimTokens update"
+    )
+    scenario = scenario._replace(budget={"ses": 1, "ses.VerifyDomainDkim": 1})
+    with replay_benchmark.ResponseServer() as server:
+        result = replay_benchmark.replay(scenario, server.url, iterations=2)
+    assert result.calls["ses"] == 2
+    assert result.violations == ["2 ses calls exceed budget of 1"]
+
+
+def test_fake_responses():
+    ses_client = get_client("ses", region_name="eu-west-1")
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.ListIdentities": [
+                {"Identities": ["example.com"]},
+                {"Identities": []},
+            ]
+        }
+    )
+    with fake_aws.scope(fake):
+        assert ses_client.list_identities()["Identities"] == ["example.com"]
+        assert ses_client.list_identities()["Identities"] == []
+        assert ses_client.list_identities()["Identities"] == []
+        with pytest.raises(botocore.exceptions.ClientError) as error:
+            ses_client.delete_identity(Identity="example.com")
+    assert error.value.response["Error"]["Code"] == "NotRecorded"
+    assert fake.call_counts() == {
+        "ses": 4,
+        "ses.ListIdentities": 3,
+        "ses.DeleteIdentity": 1,
+    }
+
+
+def test_concurrent_requests_do_not_share_state():
+    scenarios = replay_benchmark.load_corpus(corpus)
+    with replay_benchmark.ResponseServer() as server:
+        expected = {
+            s.name: replay_benchmark.run_once(s, server.url)[0] for s in scenarios
+        }
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(
+                executor.map(
+                    lambda s: replay_benchmark.run_once(s, server.url)[0],
+                    scenarios * 4,
+                )
+            )
+
+    for scenario, response in zip(scenarios * 4, responses):
+        assert response["Status"] == scenario.expect, response.get("Reason")
+        assert response["LogicalResourceId"] == scenario.request["LogicalResourceId"]
+        assert response["PhysicalResourceId"] == (
+            expected[scenario.name]["PhysicalResourceId"]
+        )
+        assert response.get("Data") == expected[scenario.name].get("Data")
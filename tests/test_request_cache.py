@@ -0,0 +1,107 @@
+import botocore
+from botocore.awsrequest import AWSResponse
+
+import request_cache
+from aws_clients import instrument
+
+
+def test_reads_are_cached_within_a_request():
+    ses, sent = create_ses_client()
+    with request_cache.scope() as cache:
+        assert ses.list_identities(IdentityType="Domain")["Identities"] == ["binx.io"]
+        assert ses.list_identities(IdentityType="Domain")["Identities"] == ["binx.io"]
+        assert len(sent) == 1
+        assert cache.hits == 1
+
+        ses.list_identities(IdentityType="EmailAddress")
+        assert len(sent) == 2
+
+    with request_cache.scope():
+        ses.list_identities(IdentityType="Domain")
+        assert len(sent) == 3
+
+
+def test_writes_invalidate_the_cache():
+    ses, sent = create_ses_client()
+    with request_cache.scope():
+        ses.list_identities(IdentityType="Domain")
+        ses.verify_domain_identity(Domain="binx.io")
+        ses.list_identities(IdentityType="Domain")
+        assert len(sent) == 3
+
+
+def test_no_caching_outside_a_request():
+    ses, sent = create_ses_client()
+    ses.list_identities(IdentityType="Domain")
+    ses.list_identities(IdentityType="Domain")
+    assert len(sent) == 2
+
+
+def test_cached_responses_are_copies():
+    ses, sent = create_ses_client()
+    with request_cache.scope():
+        ses.list_identities(IdentityType="Domain")["Identities"].append("changed")
+        assert ses.list_identities(IdentityType="Domain")["Identities"] == ["binx.io"]
+
+
+def test_reads_of_the_parent_are_shared_until_a_write():
+    ses, sent = create_ses_client()
+    with request_cache.scope() as batch:
+        ses.list_identities(IdentityType="Domain")
+        assert len(sent) == 1
+
+        with request_cache.scope(request_cache.RequestCache(parent=batch)):
+            ses.list_identities(IdentityType="Domain")
+            assert len(sent) == 1
+
+            ses.verify_domain_identity(Domain="binx.io")
+            ses.list_identities(IdentityType="Domain")
+            assert len(sent) == 3
+
+        with request_cache.scope(request_cache.RequestCache(parent=batch)):
+            ses.list_identities(IdentityType="Domain")
+            assert len(sent) == 3
+
+
+def create_ses_client():
+    ses = botocore.session.get_session().create_client(
+        "ses",
+        region_name="eu-west-1",
+        aws_access_key_id="AKIAEXAMPLE",
+        aws_secret_access_key="secret",
+    )
+    instrument(ses)
+    sent = []
+
+    def send(request, **kwargs):
+        sent.append(request)
+        body = request.body if isinstance(request.body, str) else request.body.decode()
+        operation = body.split("Action=")[1].split("&")[0]
+        return AWSResponse(request.url, 200, {}, RawResponse(responses[operation]))
+
+    ses.meta.events.register("before-send.ses", send)
+    return ses, sent
+
+
+class RawResponse(object):
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+responses = {
+    "ListIdentities": b"""<ListIdentitiesResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/">
+  <ListIdentitiesResult>
+    <Identities><member>binx.io</member></Identities>
+  </ListIdentitiesResult>
+  <ResponseMetadata><RequestId>1</RequestId></ResponseMetadata>
+</ListIdentitiesResponse>""",
+    "VerifyDomainIdentity": b"""<VerifyDomainIdentityResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/">
+  <VerifyDomainIdentityResult>
+    <VerificationToken>token</VerificationToken>
+  </VerifyDomainIdentityResult>
+  <ResponseMetadata><RequestId>2</RequestId></ResponseMetadata>
+</VerifyDomainIdentityResponse>""",
+}
@@ -0,0 +1,73 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import metrics
+import response_upload
+
+
+class Endpoint(object):
+    """
+    a local response endpoint answering with `statuses` in order, and 200 after that.
+    """
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.bodies = []
+        self.connections = set()
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_PUT(self):
+                endpoint.connections.add(self.client_address)
+                endpoint.bodies.append(
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                )
+                status = endpoint.statuses.pop(0) if endpoint.statuses else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://%s:%d/response" % self.server.server_address
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_connections_are_reused():
+    with Endpoint() as endpoint:
+        for _ in range(3):
+            response_upload.put_response(endpoint.url, {"Status": "SUCCESS"})
+    assert endpoint.bodies == [b'{"Status": "SUCCESS"}'] * 3
+    assert len(endpoint.connections) == 1
+
+
+def test_server_errors_are_retried():
+    sink = metrics.InMemorySink()
+    with Endpoint([503]) as endpoint:
+        with metrics.scope("Custom::Thing", sink) as recorder:
+            assert response_upload.put_response(endpoint.url, {}) == 1
+    api_calls = recorder.api_calls[("cloudformation", "SendResponse", "Custom::Thing")]
+    assert api_calls.calls == 1
+    assert api_calls.retries == 1
+    assert api_calls.errors == 0
+
+
+def test_failed_upload_raises(monkeypatch):
+    monkeypatch.setattr(response_upload, "session", response_upload.create_session(1))
+    with Endpoint([503, 503]) as endpoint:
+        with pytest.raises(Exception) as error:
+            response_upload.put_response(endpoint.url, {})
+    assert "status code 503" in str(error.value)
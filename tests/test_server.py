@@ -0,0 +1,184 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import requests
+
+import fake_aws
+import request_cache
+import server
+
+
+class Recorder(object):
+    def __init__(self):
+        self.requests = []
+        self.done = threading.Semaphore(0)
+
+    def handler(self, request, context):
+        self.requests.append(request)
+        self.done.release()
+        return {"Status": "SUCCESS"}
+
+
+request = {
+    "RequestType": "Create",
+    "ResourceType": "Custom::VerifiedIdentity",
+    "RequestId": "1",
+    "LogicalResourceId": "Identity",
+}
+
+
+def http_status(url: str, body: str = None) -> int:
+    data = body.encode("utf-8") if body is not None else None
+    try:
+        with urllib.request.urlopen(url, data=data, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+topic_arn = "arn:aws:sns:eu-west-1:123456789012:cfn-ses-provider"
+
+notification = {
+    "Type": "Notification",
+    "MessageId": "m1",
+    "TopicArn": topic_arn,
+    "Message": json.dumps(request),
+    "Timestamp": "2026-10-19T12:00:00.000Z",
+}
+
+
+def test_http_server(sign_sns_message):
+    recorder = Recorder()
+    http_server = server.HTTPServer(
+        0, max_workers=2, handler=recorder.handler, topic_arns=[topic_arn]
+    )
+    thread = threading.Thread(target=http_server.run)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{http_server.port}/"
+        assert http_status(url) == 200
+        signed = sign_sns_message(notification)
+        assert http_status(url, json.dumps(signed)) == 202
+        assert http_status(url, json.dumps(notification)) == 403
+        assert http_status(url, json.dumps(request)) == 403
+        other_topic = dict(notification, TopicArn=topic_arn + "-other")
+        assert http_status(url, json.dumps(sign_sns_message(other_topic))) == 403
+        assert http_status(url, "{") == 400
+        assert recorder.done.acquire(timeout=5)
+    finally:
+        http_server.stop()
+        thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert recorder.requests == [request]
+
+
+def test_subscription_is_only_confirmed_with_sns(sign_sns_message, monkeypatch):
+    confirmed = []
+
+    def get(url, **kwargs):
+        confirmed.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        return response
+
+    monkeypatch.setattr(server.requests, "get", get)
+    http_server = server.HTTPServer(0, max_workers=1, handler=Recorder().handler)
+    thread = threading.Thread(target=http_server.run)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{http_server.port}/"
+        confirmation = {
+            "Type": "SubscriptionConfirmation",
+            "MessageId": "m1",
+            "Token": "token",
+            "TopicArn": topic_arn,
+            "Message": "You have chosen to subscribe to the topic",
+            "Timestamp": "2026-10-19T12:00:00.000Z",
+        }
+        for subscribe_url, status in [
+            ("http://169.254.169.254/latest/meta-data/", 400),
+            ("https://sns.eu-west-1.amazonaws.com/?Action=ConfirmSubscription", 200),
+        ]:
+            message = sign_sns_message(dict(confirmation, SubscribeURL=subscribe_url))
+            assert http_status(url, json.dumps(message)) == status
+    finally:
+        http_server.stop()
+        thread.join(timeout=5)
+    assert confirmed == [
+        "https://sns.eu-west-1.amazonaws.com/?Action=ConfirmSubscription"
+    ]
+
+
+def test_http_server_waits_on_a_timer():
+    recorder = Recorder()
+    http_server = server.HTTPServer(0, max_workers=1, handler=recorder.handler)
+    http_server.call_later(
+        0.05, http_server.reinvoke, json.dumps(request).encode("utf-8")
+    )
+    assert recorder.requests == []
+    assert recorder.done.acquire(timeout=5)
+    http_server.shutdown()
+    http_server.http_server.server_close()
+    assert recorder.requests == [request]
+
+
+def test_http_server_reinvokes_in_process():
+    recorder = Recorder()
+    http_server = server.HTTPServer(0, max_workers=1, handler=recorder.handler)
+    http_server.reinvoke(json.dumps(request).encode("utf-8"))
+    http_server.shutdown()
+    http_server.http_server.server_close()
+    assert recorder.requests == [request]
+
+
+def test_requests_are_handled_in_a_fresh_context():
+    caches = []
+    http_server = server.HTTPServer(
+        0,
+        max_workers=1,
+        handler=lambda request, context: caches.append(request_cache.active()),
+    )
+    with request_cache.scope():
+        http_server.reinvoke(json.dumps(request).encode("utf-8"))
+        http_server.shutdown()
+    http_server.http_server.server_close()
+    assert caches == [None]
+
+
+def test_sqs_poller():
+    recorder = Recorder()
+    sent = []
+    queue_url = "https://sqs.eu-west-1.amazonaws.com/123456789012/requests"
+    fake = fake_aws.FakeAWS(
+        {
+            "sqs.ReceiveMessage": {
+                "Messages": [
+                    {
+                        "MessageId": "m1",
+                        "ReceiptHandle": "r1",
+                        "Body": json.dumps(request),
+                    },
+                    {"MessageId": "m2", "ReceiptHandle": "r2", "Body": "{"},
+                ]
+            },
+            "sqs.DeleteMessage": {},
+            "sqs.SendMessage": lambda params: sent.append(params)
+            or {"MessageId": "m3"},
+        }
+    )
+    with fake_aws.scope(fake):
+        poller = server.SQSPoller(queue_url, max_workers=2, handler=recorder.handler)
+        assert poller.poll_once() == 2
+        poller.call_later(30.5, poller.reinvoke, json.dumps(request).encode("utf-8"))
+        poller.shutdown()
+
+    assert recorder.requests == [request]
+    assert [params["DelaySeconds"] for params in sent] == [31]
+    assert fake.call_counts() == {
+        "sqs": 3,
+        "sqs.ReceiveMessage": 1,
+        "sqs.DeleteMessage": 1,
+        "sqs.SendMessage": 1,
+    }
@@ -0,0 +1,155 @@
+import json
+import os
+import uuid
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
+
+import aws_clients
+import caller_identity
+import fake_aws
+import replay_benchmark
+import request_cache
+import ses
+from aws_clients import get_client
+
+corpus = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "corpus.json")
+
+
+def test_prime():
+    caller_identity.clear()
+    fake = fake_aws.FakeAWS(
+        {
+            "sts.GetCallerIdentity": {
+                "UserId": "AROAEXAMPLE:session",
+                "Account": "123456789012",
+                "Arn": "arn:aws:sts::123456789012:assumed-role/provider/session",
+            }
+        }
+    )
+    try:
+        with fake_aws.scope(fake):
+            ses.prime(["eu-west-1", "us-east-1"])
+        assert fake.call_counts() == {"sts": 1, "sts.GetCallerIdentity": 1}
+        assert caller_identity.get_caller_identity().account == "123456789012"
+        assert get_client("ses", region_name="us-east-1").can_paginate(
+            "list_identities"
+        )
+    finally:
+        caller_identity.clear()
+
+
+def notifications_request(identity: str, response_url: str) -> dict:
+    scenario = next(
+        s
+        for s in replay_benchmark.load_corpus(corpus)
+        if s.name == "IdentityNotifications create"
+    )
+    request = deepcopy(scenario.request)
+    request["RequestId"] = str(uuid.uuid4())
+    request["ResponseURL"] = response_url
+    request["ResourceProperties"]["Identity"] = identity
+    return request
+
+
+def test_batch_shares_reads(fresh_providers):
+    responses = replay_benchmark.load_corpus(corpus)[0].responses
+    with replay_benchmark.ResponseServer() as server:
+        records = [
+            {
+                "messageId": identity,
+                "body": json.dumps(notifications_request(identity, server.url)),
+            }
+            for identity in ["example.com", "example.org", "example.net"]
+        ]
+        records.append({"messageId": "invalid", "body": "{"})
+        with fake_aws.scope(fake_aws.FakeAWS(responses)) as fake:
+            response = ses.batch_handler({"Records": records}, {})
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "invalid"}]}
+    assert fake.call_counts()["ses.GetIdentityNotificationAttributes"] == 1
+    assert fake.call_counts()["ses.SetIdentityNotificationTopic"] == 9
+
+
+def test_batch_of_sns_notifications(fresh_providers):
+    responses = replay_benchmark.load_corpus(corpus)[0].responses
+    with replay_benchmark.ResponseServer() as server:
+        request = notifications_request("example.com", server.url)
+        records = [{"Sns": {"MessageId": "1", "Message": json.dumps(request)}}]
+        with fake_aws.scope(fake_aws.FakeAWS(responses)) as fake:
+            response = ses.batch_handler({"Records": records}, {})
+
+    assert response == {"batchItemFailures": []}
+    assert fake.call_counts()["ses.GetIdentityNotificationAttributes"] == 1
+
+
+def test_batch_with_roles(fresh_providers):
+    responses = dict(replay_benchmark.load_corpus(corpus)[0].responses)
+    responses["sts.AssumeRole"] = {
+        "Credentials": {
+            "AccessKeyId": "ASIAEXAMPLE",
+            "SecretAccessKey": "secret",
+            "SessionToken": "token",
+            "Expiration": datetime.now(timezone.utc) + timedelta(hours=1),
+        }
+    }
+    roles = {
+        "example.com": "arn:aws:iam::111111111111:role/ses",
+        "example.org": "arn:aws:iam::111111111111:role/ses",
+        "example.net": "arn:aws:iam::222222222222:role/ses",
+    }
+    try:
+        with replay_benchmark.ResponseServer() as server:
+            records = []
+            for identity, role_arn in roles.items():
+                request = notifications_request(identity, server.url)
+                request["ResourceProperties"]["RoleArn"] = role_arn
+                records.append({"messageId": identity, "body": json.dumps(request)})
+            with fake_aws.scope(fake_aws.FakeAWS(responses)) as fake:
+                response = ses.batch_handler({"Records": records}, {})
+    finally:
+        aws_clients.clear()
+
+    assert response == {"batchItemFailures": []}
+    assert fake.call_counts()["sts.AssumeRole"] == 2
+    assert fake.call_counts()["ses.GetIdentityNotificationAttributes"] == 2
+
+
+def test_requests_do_not_share_cached_reads(fresh_providers):
+    request = {
+        "RequestType": "Create",
+        "ResourceType": "Custom::VerifiedIdentity",
+        "StackId": "arn:aws:cloudformation:eu-west-1:123456789012:stack/demo/guid",
+        "RequestId": str(uuid.uuid4()),
+        "LogicalResourceId": "VerifiedIdentity",
+        "ResourceProperties": {"Identity": "example.com", "Region": "eu-west-1"},
+    }
+    cache = request_cache.RequestCache()
+    cache.seed(
+        "ses",
+        "eu-west-1",
+        "GetIdentityVerificationAttributes",
+        {"Identities": ["example.com"]},
+        {"VerificationAttributes": {"example.com": {"VerificationStatus": "Pending"}}},
+    )
+    fake = fake_aws.FakeAWS(
+        {
+            "ses.GetIdentityVerificationAttributes": {
+                "VerificationAttributes": {
+                    "example.com": {"VerificationStatus": "Success"}
+                }
+            }
+        }
+    )
+    with replay_benchmark.ResponseServer() as server:
+        request["ResponseURL"] = server.url
+        with fake_aws.scope(fake), request_cache.scope(cache):
+            response = ses.handler(request, {})
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert fake.call_counts()["ses.GetIdentityVerificationAttributes"] == 1
+
+
+def test_parse_message():
+    request = {"RequestType": "Create", "ResourceType": "Custom::VerifiedIdentity"}
+    assert ses.parse_message(json.dumps(request)) == request
+    notification = {"Type": "Notification", "Message": json.dumps(request)}
+    assert ses.parse_message(json.dumps(notification)) == request
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import sns_signature
+from conftest import SNS_CERTIFICATE
+
+notification = {
+    "Type": "Notification",
+    "MessageId": "22b80b92-fdea-4c2c-8f9d-bdfb0c7bf324",
+    "TopicArn": "arn:aws:sns:eu-west-1:123456789012:cfn-ses-provider",
+    "Message": json.dumps({"RequestType": "Create"}),
+    "Timestamp": "2026-10-19T12:00:00.000Z",
+}
+
+
+def test_public_key():
+    key = sns_signature.public_key(SNS_CERTIFICATE)
+    assert key.exponent == 65537
+    assert key.modulus.bit_length() == 1024
+    with pytest.raises(ValueError):
+        sns_signature.public_key("")
+
+
+def test_string_to_sign():
+    message = dict(notification, Subject="create", UnsignedKey="value")
+    assert sns_signature.string_to_sign(message).decode("utf-8").split("\n")[::2] == [
+        "Message",
+        "MessageId",
+        "Subject",
+        "Timestamp",
+        "TopicArn",
+        "Type",
+        "",
+    ]
+
+
+@pytest.mark.parametrize("version", ["1", "2"])
+def test_verify(sign_sns_message, version):
+    message = sign_sns_message(notification, version)
+    assert sns_signature.verify(message)
+    assert not sns_signature.verify(dict(message, Message="{}"))
+    assert not sns_signature.verify(dict(message, SignatureVersion="3"))
+    assert not sns_signature.verify(dict(message, Signature="invalid"))
+    assert not sns_signature.verify({k: message[k] for k in message if k != "Type"})
+
+
+def test_verify_only_trusts_sns_certificates(sign_sns_message):
+    message = sign_sns_message(notification)
+    for url in [
+        "http://sns.eu-west-1.amazonaws.com/cert.pem",
+        "https://sns.eu-west-1.amazonaws.com.example.com/cert.pem",
+        "https://example.com/sns.eu-west-1.amazonaws.com/cert.pem",
+    ]:
+        assert not sns_signature.verify(dict(message, SigningCertURL=url))
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://sns.eu-west-1.amazonaws.com/?Action=ConfirmSubscription", True),
+        ("https://sns.cn-north-1.amazonaws.com.cn/cert.pem", True),
+        ("https://sns.eu-west-1.amazonaws.com:8443/", False),
+        ("http://sns.eu-west-1.amazonaws.com/", False),
+        ("https://169.254.169.254/latest/meta-data/", False),
+        ("https://sqs.eu-west-1.amazonaws.com/", False),
+        (None, False),
+    ],
+)
+def test_is_sns_url(url, expected):
+    assert sns_signature.is_sns_url(url) == expected
@@ -0,0 +1,105 @@
+import json
+import socket
+import uuid
+
+import botocore
+from botocore.stub import Stubber
+
+import tracing
+from active_rule_set_provider import handler, provider
+from aws_clients import instrument
+
+
+def test_spans_are_nested():
+    collector = tracing.InMemoryCollector()
+    with tracing.trace("ses", exporter=collector) as root:
+        with tracing.span("execute"):
+            with tracing.span("precondition"):
+                pass
+        with tracing.span("send_response"):
+            pass
+
+    assert collector.spans == [root]
+    assert [s.name for s in root.children] == ["execute", "send_response"]
+    assert [s.name for s in root.children[0].children] == ["precondition"]
+    assert all(s.end_time for s in root.children)
+
+
+def test_span_outside_a_trace_does_nothing():
+    with tracing.span("execute") as span:
+        assert span is None
+
+    @tracing.traced("precondition")
+    def check():
+        return True
+
+    assert check()
+
+
+def test_request_phases_are_traced():
+    ses = instrument(botocore.session.get_session().create_client("ses"))
+    stubber = Stubber(ses)
+    stubber.add_response("describe_active_receipt_rule_set", {})
+    stubber.add_response(
+        "set_active_receipt_rule_set", {}, {"RuleSetName": "lists.binx.io"}
+    )
+    stubber.activate()
+    provider._ses = ses
+
+    collector = tracing.InMemoryCollector()
+    with tracing.trace("ses", exporter=collector) as root:
+        response = handler(Request("Create", "lists.binx.io"), {})
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    stubber.assert_no_pending_responses()
+
+    assert [s.name for s in root.children] == ["execute", "send_response"]
+    execute = root.children[0]
+    assert execute.annotations == {"RequestType": "Create", "Status": "SUCCESS"}
+    assert [s.name for s in execute.children] == ["validate", "validate", "SES", "SES"]
+    assert [s.aws["operation"] for s in execute.find("SES")] == [
+        "DescribeActiveReceiptRuleSet",
+        "SetActiveReceiptRuleSet",
+    ]
+
+
+def test_xray_export():
+    daemon = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    daemon.bind(("127.0.0.1", 0))
+    daemon.settimeout(2)
+    host, port = daemon.getsockname()
+
+    exporter = tracing.XRayExporter(f"{host}:{port}")
+    exporter.trace_header = lambda: {
+        "Root": "1-5759e988-bd862e3fe1be46a994272793",
+        "Parent": "53995c3f42cd8ad8",
+        "Sampled": "1",
+    }
+    with tracing.trace("ses", exporter=exporter, ResourceType="Custom::Test"):
+        with tracing.span("execute"):
+            pass
+
+    header, body = daemon.recv(65536).decode("utf-8").split("\n", 1)
+    daemon.close()
+    assert json.loads(header) == {"format": "json", "version": 1}
+    document = json.loads(body)
+    assert document["type"] == "subsegment"
+    assert document["trace_id"] == "1-5759e988-bd862e3fe1be46a994272793"
+    assert document["parent_id"] == "53995c3f42cd8ad8"
+    assert document["annotations"] == {"ResourceType": "Custom::Test"}
+    assert [s["name"] for s in document["subsegments"]] == ["execute"]
+
+
+class Request(dict):
+    def __init__(self, request_type, rule_set_name, region="eu-west-1"):
+        request_id = "request-%s" % uuid.uuid4()
+        self.update(
+            {
+                "RequestType": request_type,
+                "ResponseURL": "https://httpbin.org/put",
+                "StackId": "arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid",
+                "RequestId": request_id,
+                "ResourceType": "Custom::ActiveReceiptRuleSet",
+                "LogicalResourceId": "MyActiveReceiptRuleSet",
+                "ResourceProperties": {"RuleSetName": rule_set_name, "Region": region},
+            }
+        )
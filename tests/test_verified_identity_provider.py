@@ -1,9 +1,20 @@
+import json
 import uuid
 import botocore
+import pytest
 from botocore.stub import Stubber, ANY
+import clock
+import polling
+import verified_provider
+from dns_check import Answer
 from verified_identity_provider import handler, provider
 
 
+def test_check_is_abstract():
+    with pytest.raises(TypeError):
+        verified_provider.VerifiedProvider()
+
+
 def test_no_such_identity():
     ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
     stubber = Stubber(ses)
@@ -20,7 +31,7 @@ def test_no_such_identity():
     request = Request("Create", "lists.binx.io", "eu-west-1")
     response = handler(request, ())
     assert response["Status"] == "FAILED", response["Reason"]
-    assert not provider.asynchronous
+    assert counter.count == 0
     stubber.assert_no_pending_responses()
 
 
@@ -43,17 +54,16 @@ def test_verification_failed():
     provider._ses = ses
     counter = Counter()
     provider.invoke_lambda = counter.increment
-    assert provider.interval_in_seconds == 15
-    provider.interval_in_seconds = 1
+    assert str(provider.polling_policy) == "fixed:15"
 
     request = Request("Create", "lists.binx.io", "eu-west-1")
     response = handler(request, ())
     assert response["Status"] == "FAILED", response["Reason"]
-    assert not provider.asynchronous
+    assert counter.count == 0
     stubber.assert_no_pending_responses()
 
 
-def test_await_pending_completion():
+def test_await_pending_completion(monkeypatch):
     ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
     stubber = Stubber(ses)
     stubber.add_response(
@@ -84,21 +94,153 @@ def test_await_pending_completion():
     provider._ses = ses
     counter = Counter()
     provider.invoke_lambda = counter.increment
+    scheduler = clock.SleepingScheduler(clock.VirtualClock())
+    monkeypatch.setattr(provider, "scheduler", scheduler)
 
     request = Request("Create", "lists.binx.io", "eu-west-1")
     response = handler(request, ())
-    assert provider.asynchronous, response["Status"]
     assert counter.count == 1
+    assert scheduler.clock.now() == 15
 
     request = Request("Create", "lists.binx.io", "eu-west-1")
     response = handler(request, ())
     assert response["Status"] == "SUCCESS", response["Reason"]
     stubber.assert_no_pending_responses()
-
-    assert not provider.asynchronous, response["Reason"]
     assert counter.count == 1
 
 
+def test_poll_once_dns_resolves(monkeypatch):
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    for status in ["Pending", "Success"]:
+        stubber.add_response(
+            "get_identity_verification_attributes",
+            GetIdentityVerificationAttributesReponse(
+                {
+                    "lists.binx.io": {
+                        "VerificationStatus": status,
+                        "VerificationToken": "123",
+                    }
+                }
+            ),
+            {"Identities": ["lists.binx.io"]},
+        )
+    stubber.activate()
+    provider._ses = ses
+    payloads = []
+    provider.invoke_lambda = payloads.append
+    scheduler = clock.SleepingScheduler(clock.VirtualClock())
+    monkeypatch.setattr(provider, "scheduler", scheduler)
+    answers = {}
+    monkeypatch.setattr(provider, "resolver", Resolver(answers))
+
+    response = handler(Request("Create", "lists.binx.io", "eu-west-1"), ())
+    request = json.loads(payloads[-1])
+    assert request["ResourceProperties"]["VerificationToken"] == "123"
+    assert scheduler.clock.now() == 15
+
+    answers[("_amazonses.lists.binx.io", "TXT")] = Answer([], 120)
+    response = handler(request, ())
+    request = json.loads(payloads[-1])
+    assert len(payloads) == 2
+    assert scheduler.clock.now() == 135
+
+    answers[("_amazonses.lists.binx.io", "TXT")] = Answer(["123"], 300)
+    response = handler(request, ())
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert len(payloads) == 2
+    stubber.assert_no_pending_responses()
+
+
+def test_wait_is_capped_at_remaining_time(monkeypatch):
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    stubber.add_response(
+        "get_identity_verification_attributes",
+        GetIdentityVerificationAttributesReponse(
+            {
+                "lists.binx.io": {
+                    "VerificationStatus": "Pending",
+                    "VerificationToken": "123",
+                }
+            }
+        ),
+        {"Identities": ["lists.binx.io"]},
+    )
+    stubber.activate()
+    provider._ses = ses
+    payloads = []
+    provider.invoke_lambda = payloads.append
+    scheduler = clock.SleepingScheduler(clock.VirtualClock())
+    monkeypatch.setattr(provider, "scheduler", scheduler)
+    answers = {("_amazonses.lists.binx.io", "TXT"): Answer([], 120)}
+    monkeypatch.setattr(provider, "resolver", Resolver(answers))
+
+    handler(Request("Create", "lists.binx.io", "eu-west-1"), ())
+    request = json.loads(payloads[-1])
+    handler(request, Context(remaining=20000))
+    assert len(payloads) == 2
+    assert scheduler.clock.now() == 30
+
+    handler(json.loads(payloads[-1]), Context(remaining=2000))
+    assert len(payloads) == 3
+    assert scheduler.clock.now() == 30
+    stubber.assert_no_pending_responses()
+
+
+def test_observe_time_to_success(monkeypatch):
+    ses = botocore.session.get_session().create_client("ses", region_name="eu-west-1")
+    stubber = Stubber(ses)
+    for status in ["Pending", "Success"]:
+        stubber.add_response(
+            "get_identity_verification_attributes",
+            GetIdentityVerificationAttributesReponse(
+                {
+                    "lists.binx.io": {
+                        "VerificationStatus": status,
+                        "VerificationToken": "123",
+                    }
+                }
+            ),
+            {"Identities": ["lists.binx.io"]},
+        )
+    stubber.activate()
+    provider._ses = ses
+    payloads = []
+    provider.invoke_lambda = payloads.append
+    scheduler = clock.SleepingScheduler(clock.VirtualClock(1000))
+    monkeypatch.setattr(provider, "scheduler", scheduler)
+    times = polling.VerificationTimes()
+    policy = polling.create_policy(
+        "adaptive:2,60", provider.custom_cfn_resource_name, times
+    )
+    monkeypatch.setattr(provider, "polling_policy", policy)
+
+    handler(Request("Create", "lists.binx.io", "eu-west-1"), ())
+    request = json.loads(payloads[-1])
+    assert request["ResourceProperties"]["PendingSince"] == 1000
+    response = handler(request, ())
+    assert response["Status"] == "SUCCESS", response["Reason"]
+    assert times.samples("Custom::VerifiedIdentity") == [2]
+    stubber.assert_no_pending_responses()
+
+
+class Resolver(object):
+    def __init__(self, answers):
+        self.answers = answers
+
+    def resolve(self, name, type):
+        return self.answers[(name, type)]
+
+
+class Context(object):
+    def __init__(self, remaining):
+        self.remaining = remaining
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining
+
+
 class Counter(object):
     def __init__(self):
         self.count = 0
@@ -0,0 +1,28 @@
+import time
+
+from worker_pool import RateLimiter, chunked, run_concurrently
+
+
+def test_run_concurrently_returns_results_in_order():
+    def square(x):
+        if x == 3:
+            raise ValueError("three")
+        return x * x
+
+    results = run_concurrently(square, range(5), max_workers=3)
+    assert [r.item for r in results] == [0, 1, 2, 3, 4]
+    assert [r.value for r in results] == [0, 1, 4, None, 16]
+    assert isinstance(results[3].error, ValueError)
+    assert run_concurrently(square, []) == []
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.1
+
+
+def test_chunked():
+    assert list(chunked(list(range(5)), 2)) == [[0, 1], [2, 3], [4]]
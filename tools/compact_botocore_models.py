@@ -0,0 +1,87 @@
+"""
+writes a compact copy of the botocore models of the services used by the provider to a
+directory, to be used as AWS_DATA_PATH. The documentation and examples are left out and
+the JSON is minified, so that the models load faster and take less memory. With --prune,
+the models of all other services are removed from the botocore installation, so that
+botocore does not scan them when the first client is created.
+
+usage: python tools/compact_botocore_models.py [--prune] [--services ses,...] directory
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+
+import botocore
+
+SERVICES = ["ses", "sesv2", "route53", "lambda", "sts", "sqs"]
+MODEL_TYPES = ["service-2", "paginators-1", "waiters-2", "endpoint-rule-set-1"]
+DOCUMENTATION_KEYS = {"documentation", "documentationUrl"}
+
+data_path = os.path.join(os.path.dirname(botocore.__file__), "data")
+
+
+def strip_documentation(value):
+    """
+    returns `value` without the documentation strings.
+    """
+    if isinstance(value, dict):
+        return {
+            k: strip_documentation(v)
+            for k, v in value.items()
+            if not (k in DOCUMENTATION_KEYS and isinstance(v, str))
+        }
+    if isinstance(value, list):
+        return [strip_documentation(v) for v in value]
+    return value
+
+
+def load(filename: str):
+    if os.path.exists(filename + ".json"):
+        with open(filename + ".json", "rb") as f:
+            return json.loads(f.read().decode("utf-8"))
+    if os.path.exists(filename + ".json.gz"):
+        with gzip.open(filename + ".json.gz", "rb") as f:
+            return json.loads(f.read().decode("utf-8"))
+    return None
+
+
+def compact(services, directory: str):
+    for service in services:
+        api_version = sorted(os.listdir(os.path.join(data_path, service)))[-1]
+        target = os.path.join(directory, service, api_version)
+        os.makedirs(target, exist_ok=True)
+        for model_type in MODEL_TYPES:
+            model = load(os.path.join(data_path, service, api_version, model_type))
+            if model is None:
+                continue
+            with open(os.path.join(target, f"{model_type}.json"), "w") as f:
+                json.dump(strip_documentation(model), f, separators=(",", ":"))
+
+
+def prune(services):
+    for name in os.listdir(data_path):
+        path = os.path.join(data_path, name)
+        if os.path.isdir(path) and name not in services:
+            shutil.rmtree(path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="compact the botocore models")
+    parser.add_argument("--services", default=",".join(SERVICES))
+    parser.add_argument("--prune", action="store_true")
+    parser.add_argument("directory")
+    args = parser.parse_args(argv)
+
+    services = list(filter(None, args.services.split(",")))
+    compact(services, args.directory)
+    if args.prune:
+        prune(services)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())